@@ -0,0 +1,234 @@
+import argparse
+import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError as e: # Optional: only batch evaluation needs it, never the game or engine
+    raise ImportError("batcheval.py needs NumPy, an optional dependency: pip install numpy") from e
+
+from chessengine import PIECES, SNAPSHOT_BLACK_TO_MOVE, SNAPSHOT_SIZE, GameState
+from evaluation import (MOBILITY_DIRECTIONS, MOBILITY_WEIGHT, PIECE_SQUARE_TABLES, PIECE_VALUES, evaluate,
+                        evaluateWithMobility)
+
+
+# One plane per piece, in PIECES order without the empty square:
+# white P G V A N B S, then black P G V A N B S. Plane i holds the squares
+# with snapshot code i + 1.
+PLANES = PIECES[1:]
+NUM_PLANES = len(PLANES)
+
+
+def _buildWeights():
+    """
+    Per-plane weights with Black's negated, so every term is a sum over
+    the planes: material per piece and the piece-square bonus per square
+    (Black's tables flipped top to bottom).
+    """
+    material = np.zeros(NUM_PLANES, dtype=np.int32)
+    piece_square = np.zeros((NUM_PLANES, 9, 9), dtype=np.int32)
+    for plane, piece in enumerate(PLANES):
+        sign = 1 if piece[0] == 'w' else -1
+        table = np.array(PIECE_SQUARE_TABLES[piece[1]], dtype=np.int32)
+        material[plane] = sign * PIECE_VALUES[piece[1]]
+        piece_square[plane] = sign * (table if piece[0] == 'w' else table[::-1])
+    return material, piece_square
+
+
+_MATERIAL, _PIECE_SQUARE = _buildWeights()
+# Material and piece-square bonus of a piece on a square, per plane and square
+_SQUARE_WEIGHTS = (_MATERIAL[:, None, None] + _PIECE_SQUARE).reshape(-1).astype(np.float32)
+_FULL_ROW = 0x1FF
+_COLUMN_BITS = (1 << np.arange(9)).astype(np.float32)
+# Set bits per 9-bit row mask, for NumPy 1.x, which has no bitwise_count
+_ROW_POPCOUNT = np.array([bin(mask).count("1") for mask in range(_FULL_ROW + 1)], dtype=np.uint8)
+
+
+def encodeSnapshots(data):
+    """
+    Planes for positions stored back to back as GameState.snapshot()
+    bytes (a bytes object, bytearray, mmap...). Returns (planes, white_to_move):
+    a uint8 array of shape (N, NUM_PLANES, 9, 9) with 1 where the piece
+    stands, and a bool array of shape (N,).
+    """
+    codes = np.frombuffer(data, dtype=np.uint8)
+    if codes.size % SNAPSHOT_SIZE:
+        raise ValueError(f"Snapshot data must be a multiple of {SNAPSHOT_SIZE} bytes, got {codes.size}")
+    codes = codes.reshape(-1, SNAPSHOT_SIZE)
+    white_to_move = (codes[:, 0] & SNAPSHOT_BLACK_TO_MOVE) == 0
+    # Only the first byte carries the side to move
+    codes = codes.copy()
+    codes[:, 0] &= 0xFF ^ SNAPSHOT_BLACK_TO_MOVE
+    if (codes >= len(PIECES)).any():
+        raise ValueError("Invalid piece code in snapshot data")
+    planes = codes[:, None, :] == np.arange(1, NUM_PLANES + 1, dtype=np.uint8)[None, :, None]
+    return planes.view(np.uint8).reshape(-1, NUM_PLANES, 9, 9), white_to_move
+
+
+def encodePositions(game_states):
+    """
+    encodeSnapshots() for a sequence of GameStates.
+    """
+    data = bytearray(SNAPSHOT_SIZE * len(game_states))
+    for i, game_state in enumerate(game_states):
+        game_state.writeSnapshot(data, i * SNAPSHOT_SIZE)
+    return encodeSnapshots(data)
+
+
+def materialScores(planes):
+    """
+    White material minus black material for every position, shape (N,).
+    """
+    return planes.sum(axis=(2, 3), dtype=np.int32) @ _MATERIAL
+
+
+def pieceSquareScores(planes):
+    """
+    White piece-square bonuses minus black ones for every position.
+    """
+    return np.einsum("npij,pij->n", planes, _PIECE_SQUARE, dtype=np.int32)
+
+
+def _shift(rows, d_row, d_col):
+    """
+    Row masks (bit col of row) moved so each square holds what is d_row,
+    d_col away from it; squares off the board read as 0.
+    """
+    shifted = np.zeros_like(rows)
+    if d_row >= 0:
+        shifted[..., :9 - d_row] = rows[..., d_row:]
+    else:
+        shifted[..., -d_row:] = rows[..., :9 + d_row]
+    if d_col >= 0:
+        return shifted >> d_col
+    return (shifted << -d_col) & _FULL_ROW
+
+
+def _popcount(masks):
+    """
+    Set bits of each 9-bit row mask: np.bitwise_count on NumPy >= 2.0,
+    a table lookup before that.
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(masks)
+    return _ROW_POPCOUNT[masks]
+
+
+def _rowMasks(values):
+    """
+    (N, NUM_PLANES, 9) uint16: bit col of each row is set where the plane
+    has a piece. values are the planes as float32, which makes this one
+    matrix-vector product.
+    """
+    return (values.reshape(-1, 9) @ _COLUMN_BITS).astype(np.uint16).reshape(values.shape[:3])
+
+
+def mobilityScores(planes, rows=None):
+    """
+    evaluation.mobilityScore() for every position. Each plane is turned
+    into one 9-bit mask per row; for every direction the pieces' masks are
+    matched against their own color's free squares shifted that way.
+    rows are the planes' _rowMasks() if already computed.
+    """
+    if rows is None:
+        rows = _rowMasks(planes.astype(np.float32))
+    count = np.zeros(planes.shape[0], dtype=np.int32)
+    half = NUM_PLANES // 2
+    for first, is_white in ((0, True), (half, False)):
+        own = np.bitwise_or.reduce(rows[:, first:first + half], axis=1)
+        free = ~own & _FULL_ROW
+        shifted = {}
+        total = np.zeros(planes.shape[0], dtype=np.int32)
+        for plane in range(first, first + half):
+            for d_row, d_col in MOBILITY_DIRECTIONS[is_white].get(PLANES[plane][1], ()):
+                if (d_row, d_col) not in shifted:
+                    shifted[d_row, d_col] = _shift(free, d_row, d_col)
+                total += _popcount(rows[:, plane] & shifted[d_row, d_col]).sum(axis=1, dtype=np.int32)
+        count += total if is_white else -total
+    return count * MOBILITY_WEIGHT
+
+
+def evaluateBatch(planes, white_to_move, mobility=False):
+    """
+    evaluation.evaluate() (or evaluateWithMobility() with mobility) for
+    every position of an encoded batch, from each side to move's point of
+    view. Returns an int32 array of shape (N,).
+    """
+    values = planes.astype(np.float32)
+    # float32 is exact here: the totals are far below 2**24
+    score = (values.reshape(planes.shape[0], -1) @ _SQUARE_WEIGHTS).astype(np.int32)
+    if mobility:
+        score += mobilityScores(planes, _rowMasks(values))
+    return np.where(white_to_move, score, -score)
+
+
+def randomPositions(count, seed=0, max_plies=80):
+    """
+    Snapshots of positions from random games, back to back in a bytearray.
+    """
+    rng = random.Random(seed)
+    data = bytearray(SNAPSHOT_SIZE * count)
+    game_state = GameState()
+    plies = 0
+    for i in range(count):
+        moves = game_state.getValidMoves()
+        if not moves or plies == max_plies:
+            game_state = GameState()
+            plies = 0
+            moves = game_state.getValidMoves()
+        game_state.makeMove(rng.choice(moves))
+        plies += 1
+        game_state.writeSnapshot(data, i * SNAPSHOT_SIZE)
+    return data
+
+
+def benchmark(count=20000, batch_size=4096, seed=0, mobility=False):
+    """
+    Evaluate the same random positions one at a time with evaluate() (or
+    evaluateWithMobility()) and in batches with evaluateBatch(), check
+    they agree and print positions per second for both.
+    Returns (scalar, batch) positions per second.
+    """
+    scalar = evaluateWithMobility if mobility else evaluate
+    data = randomPositions(count, seed)
+    game_states = [GameState.fromSnapshot(data[i:i + SNAPSHOT_SIZE]) for i in range(0, len(data), SNAPSHOT_SIZE)]
+
+    begin = time.perf_counter()
+    expected = [scalar(game_state) for game_state in game_states]
+    scalar_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    scores = []
+    encode_time = 0.0
+    step = batch_size * SNAPSHOT_SIZE
+    for start in range(0, len(data), step):
+        encode_begin = time.perf_counter()
+        planes, white_to_move = encodeSnapshots(data[start:start + step])
+        encode_time += time.perf_counter() - encode_begin
+        scores.extend(evaluateBatch(planes, white_to_move, mobility).tolist())
+    batch_time = time.perf_counter() - begin
+
+    mismatches = sum(score != value for score, value in zip(scores, expected))
+    scalar_rate, batch_rate = count / scalar_time, count / batch_time
+    print(f"scalar  {count} positions  {scalar_time:7.3f}s  {scalar_rate:10.0f} positions/s")
+    print(f"batch   {count} positions  {batch_time:7.3f}s  {batch_rate:10.0f} positions/s"
+          f"  (encoding {encode_time / batch_time:.0%}, batches of {batch_size})  {batch_rate / scalar_rate:.1f}x")
+    if mismatches:
+        print(f"{mismatches} positions score differently")
+    return scalar_rate, batch_rate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch evaluation throughput against the scalar evaluator.")
+    parser.add_argument("-n", "--positions", type=int, default=20000)
+    parser.add_argument("-b", "--batch-size", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mobility", action="store_true", help="include the mobility term")
+    args = parser.parse_args(argv)
+    benchmark(args.positions, args.batch_size, args.seed, args.mobility)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
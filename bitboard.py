@@ -0,0 +1,534 @@
+import copy
+import random
+import sys
+import time
+
+from chessengine import PIECE_CODES, PIECES, GameState, Move, _piecePatterns
+
+
+# Square index is row * 9 + col, bit (1 << index) in an 81-bit int
+SQUARES = [(row, col) for row in range(9) for col in range(9)]
+FULL_BOARD = (1 << 81) - 1
+
+DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def _rayMask(row, col, d_row, d_col):
+    """
+    Bitboard of the squares from (row, col) in direction (d_row, d_col),
+    not including (row, col) itself.
+    """
+    mask = 0
+    row += d_row
+    col += d_col
+    while 0 <= row < 9 and 0 <= col < 9:
+        mask |= 1 << (row * 9 + col)
+        row += d_row
+        col += d_col
+    return mask
+
+
+# RAY_MASKS[direction][square]
+RAY_MASKS = {d: [_rayMask(row, col, d[0], d[1]) for row, col in SQUARES] for d in DIRECTIONS}
+
+
+def _stepMasks(step_dirs):
+    """
+    Per-square bitboard of the on-board targets of the given steps/jumps.
+    """
+    masks = []
+    for row, col in SQUARES:
+        mask = 0
+        for d_row, d_col in step_dirs:
+            if 0 <= row + d_row < 9 and 0 <= col + d_col < 9:
+                mask |= 1 << ((row + d_row) * 9 + col + d_col)
+        masks.append(mask)
+    return masks
+
+
+def _slideEntries(square, slide_dirs):
+    """
+    (ray, ray table, positive) for each non-empty slide ray from square.
+    Positive rays run toward higher square indices, so their nearest
+    blocker is the lowest set bit; the others meet the highest bit first.
+    """
+    return tuple(
+        (RAY_MASKS[d][square], RAY_MASKS[d], d[0] * 9 + d[1] > 0)
+        for d in slide_dirs if RAY_MASKS[d][square]
+    )
+
+
+def _buildBitboardTables(is_white):
+    """
+    Build the bitboard tables for one color. Returns
+    (slides, steps, reverse_slides, reverse_steps):
+    slides[piece][square] holds its slide entries (see _slideEntries),
+    steps[piece][square] the bitboard of its step/jump targets,
+    reverse_slides a (ray table, positive, pieces) entry per slide direction
+    for walking back from a target square, and
+    reverse_steps[piece][square] the squares it could step to square from.
+    """
+    color = 'w' if is_white else 'b'
+    slides = {}
+    steps = {}
+    reverse_steps = {}
+    slide_pieces = {}
+    for piece_type, (slide_dirs, step_dirs) in _piecePatterns(is_white).items():
+        slides[piece_type] = [_slideEntries(square, slide_dirs) for square in range(81)]
+        steps[piece_type] = _stepMasks(step_dirs)
+        reverse_steps[piece_type] = _stepMasks([(-d[0], -d[1]) for d in step_dirs])
+        for d in slide_dirs:
+            slide_pieces.setdefault(d, []).append(color + piece_type)
+    reverse_slides = [
+        (RAY_MASKS[(-d[0], -d[1])], -d[0] * 9 - d[1] > 0, tuple(pieces))
+        for d, pieces in slide_pieces.items()
+    ]
+    return slides, steps, reverse_slides, reverse_steps
+
+
+# All tables are indexed by color first (True for white)
+BITBOARD_TABLES = {True: _buildBitboardTables(True), False: _buildBitboardTables(False)}
+SOLDIER_PUSH_MASKS = {True: _stepMasks([(-1, 0)]), False: _stepMasks([(1, 0)])}
+SOLDIER_START_ROW = {True: 7, False: 1}
+
+# Move objects by packed code, shared between positions: a code fixes
+# every field of a Move and nothing changes a Move once made, so each
+# one is only built the first time it is generated
+_MOVES = {}
+
+
+def _toMoves(codes):
+    """
+    The Move for each packed code.
+    """
+    moves = []
+    for code in codes:
+        move = _MOVES.get(code)
+        if move is None:
+            move = _MOVES[code] = Move.fromPacked(code)
+        moves.append(move)
+    return moves
+
+
+class BitboardGameState(GameState):
+    """
+    GameState backed by one 81-bit bitboard per piece, plus occupancy masks
+    and a piece code per square. self.board is kept in sync so Move and the
+    UI work unchanged, but move generation, pins and attacks use bitwise
+    operations.
+
+    The hot path works on moves packed as ints (Move.pack() format):
+    getValidMoveCodes() generates them without a Move per move, and
+    perft() plays them with makeCode()/undoCode(), which only update the
+    bitboards, and counts the last ply without generating it at all.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rebuildBitboards()
+
+    def rebuildBitboards(self):
+        """
+        Recompute every bitboard from self.board.
+        Needed only after self.board is edited directly.
+        """
+        self.bitboards = {color + piece_type: 0 for color in "wb" for piece_type in "PGVANBS"}
+        for index, (row, col) in enumerate(SQUARES):
+            piece = self.board[row][col]
+            if piece != "--":
+                self.bitboards[piece] |= 1 << index
+        self.occupancy = {
+            True: sum(bb for piece, bb in self.bitboards.items() if piece[0] == 'w'),
+            False: sum(bb for piece, bb in self.bitboards.items() if piece[0] == 'b'),
+        }
+        self.square_codes = bytearray(PIECE_CODES[self.board[row][col]] for row, col in SQUARES)
+
+    def _positionLoaded(self):
+        super()._positionLoaded()
+        self.rebuildBitboards()
+
+    def makeMove(self, move):
+        """
+        Execute a move, updating the bitboards.
+        """
+        super().makeMove(move)
+        self._toggleMove(move)
+        self.square_codes[move.start_row * 9 + move.start_col] = 0
+        self.square_codes[move.end_row * 9 + move.end_col] = PIECE_CODES[move.piece_moved]
+
+    def undoMove(self):
+        """
+        Undo the last move, updating the bitboards.
+        """
+        if len(self.move_log) != 0:
+            move = self.move_log[-1]
+            super().undoMove()
+            self._toggleMove(move)
+            self.square_codes[move.start_row * 9 + move.start_col] = PIECE_CODES[move.piece_moved]
+            self.square_codes[move.end_row * 9 + move.end_col] = PIECE_CODES[move.piece_captured]
+
+    def _toggleMove(self, move):
+        """
+        XOR a move in or out of the bitboards; it is its own inverse.
+        """
+        start_bit = 1 << (move.start_row * 9 + move.start_col)
+        end_bit = 1 << (move.end_row * 9 + move.end_col)
+        is_white = move.piece_moved[0] == 'w'
+        self.bitboards[move.piece_moved] ^= start_bit | end_bit
+        self.occupancy[is_white] ^= start_bit | end_bit
+        if move.piece_captured != "--":
+            self.bitboards[move.piece_captured] ^= end_bit
+            self.occupancy[not is_white] ^= end_bit
+
+    def makeCode(self, code):
+        """
+        Play a move packed as an int (Move.pack()) on the bitboards only:
+        self.board, the move log, the Zobrist key and the scores are left
+        as they are, so it must be undone with undoCode() before any of
+        those are used.
+        """
+        start = code & 0x7F
+        end = code >> 7 & 0x7F
+        moved = code >> 14 & 0xF
+        captured = code >> 18 & 0xF
+        is_white = self.white_to_move
+        bits = 1 << start | 1 << end
+        self.bitboards[PIECES[moved]] ^= bits
+        self.occupancy[is_white] ^= bits
+        if captured:
+            self.bitboards[PIECES[captured]] ^= 1 << end
+            self.occupancy[not is_white] ^= 1 << end
+        self.square_codes[start] = 0
+        self.square_codes[end] = moved
+        if PIECES[moved][1] == "P":
+            if is_white:
+                self.white_president_location = SQUARES[end]
+            else:
+                self.black_president_location = SQUARES[end]
+        self.white_to_move = not is_white
+
+    def undoCode(self, code):
+        """
+        Take back a makeCode() move.
+        """
+        start = code & 0x7F
+        end = code >> 7 & 0x7F
+        moved = code >> 14 & 0xF
+        captured = code >> 18 & 0xF
+        is_white = not self.white_to_move
+        bits = 1 << start | 1 << end
+        self.bitboards[PIECES[moved]] ^= bits
+        self.occupancy[is_white] ^= bits
+        if captured:
+            self.bitboards[PIECES[captured]] ^= 1 << end
+            self.occupancy[not is_white] ^= 1 << end
+        self.square_codes[start] = moved
+        self.square_codes[end] = captured
+        if PIECES[moved][1] == "P":
+            if is_white:
+                self.white_president_location = SQUARES[start]
+            else:
+                self.black_president_location = SQUARES[start]
+        self.white_to_move = is_white
+
+    def perft(self, depth):
+        """
+        Leaf nodes of the legal move tree to the given depth, played with
+        makeCode()/undoCode(); the last ply is counted from the target
+        bitboards instead of being generated.
+        """
+        if depth <= 0:
+            return 1
+        if depth == 1:
+            return self._generateValidMoves(FULL_BOARD, FULL_BOARD, count_only=True)[0]
+        nodes = 0
+        for code in self._generateValidMoves(FULL_BOARD, FULL_BOARD)[0]:
+            self.makeCode(code)
+            nodes += self.perft(depth - 1)
+            self.undoCode(code)
+        return nodes
+
+    def isSquareAttacked(self, row, col, by_white):
+        """
+        Determine if the square (row, col) is attacked by the given color.
+        """
+        occupied = self.occupancy[True] | self.occupancy[False]
+        return self._attacked(row * 9 + col, by_white, occupied, self._sliders(by_white))
+
+    def _sliders(self, by_white):
+        """
+        For each slide direction of the given color:
+        (ray table, positive, bitboard of the pieces sliding that way).
+        """
+        bitboards = self.bitboards
+        sliders = []
+        for table, positive, pieces in BITBOARD_TABLES[by_white][2]:
+            attackers = 0
+            for piece in pieces:
+                attackers |= bitboards[piece]
+            if attackers:
+                sliders.append((table, positive, attackers))
+        return sliders
+
+    def _attacked(self, square, by_white, occupied, sliders):
+        """
+        Attack test against an explicit occupancy mask,
+        so the President can be lifted off the board without touching it.
+        """
+        color = 'w' if by_white else 'b'
+        bitboards = self.bitboards
+        for piece_type, masks in BITBOARD_TABLES[by_white][3].items():
+            if masks[square] & bitboards[color + piece_type]:
+                return True
+        for table, positive, attackers in sliders:
+            blockers = table[square] & occupied
+            if blockers:
+                if positive:
+                    if blockers & -blockers & attackers:
+                        return True
+                elif (1 << (blockers.bit_length() - 1)) & attackers:
+                    return True
+        return False
+
+    def _getPinMasks(self, sliders):
+        """
+        Bitboard version of GameState._getPinsAndChecks, given the
+        opponent's _sliders(). Returns (pins, checks, check_mask):
+        pins maps a pinned piece's square index to the mask of squares it may
+        still move to, and check_mask holds the checker plus any blocking
+        squares (single check only).
+        """
+        is_white = self.white_to_move
+        enemy_color = 'b' if is_white else 'w'
+        row, col = self.white_president_location if is_white else self.black_president_location
+        square = row * 9 + col
+        own = self.occupancy[is_white]
+        occupied = own | self.occupancy[not is_white]
+        bitboards = self.bitboards
+
+        pins = {}
+        checks = 0
+        check_mask = 0
+
+        for piece_type, masks in BITBOARD_TABLES[not is_white][3].items():
+            checkers = masks[square] & bitboards[enemy_color + piece_type]
+            while checkers:
+                checks += 1
+                check_mask |= checkers & -checkers
+                checkers &= checkers - 1
+
+        for table, positive, attackers in sliders:
+            ray = table[square]
+            blockers = ray & occupied
+            if not blockers:
+                continue
+            first = blockers & -blockers if positive else 1 << (blockers.bit_length() - 1)
+            if first & attackers:
+                checks += 1
+                check_mask |= ray ^ table[first.bit_length() - 1]
+            elif first & own:
+                blockers ^= first
+                if blockers:
+                    second = blockers & -blockers if positive else 1 << (blockers.bit_length() - 1)
+                    if second & attackers:
+                        pins[first.bit_length() - 1] = ray ^ table[second.bit_length() - 1]
+
+        return pins, checks, check_mask
+
+    def getValidMoves(self):
+        """
+        Get all valid moves considering checks.
+        """
+        codes, checks = self._generateValidMoves(FULL_BOARD, FULL_BOARD)
+        moves = _toMoves(codes)
+
+        # Checkmate is no legal move while in check; stalemate is not tracked
+        if len(moves) == 0 and checks > 0:
+            self.checkmate = True
+        else:
+            self.checkmate = False
+
+        return moves
+
+    def pinsAndChecks(self):
+        """
+        The opponent's _sliders() and the position's _getPinMasks(), to
+        pass to the staged generators (see GameState.pinsAndChecks).
+        """
+        sliders = self._sliders(not self.white_to_move)
+        return sliders, self._getPinMasks(sliders)
+
+    def getValidCaptures(self, pins_and_checks=None):
+        """
+        Get only the valid capturing moves.
+        """
+        enemy = self.occupancy[not self.white_to_move]
+        return _toMoves(self._generateValidMoves(FULL_BOARD, enemy, pins_and_checks=pins_and_checks)[0])
+
+    def getValidQuietMoves(self, pins_and_checks=None):
+        """
+        Get only the valid non-capturing moves.
+        """
+        empty = FULL_BOARD & ~(self.occupancy[True] | self.occupancy[False])
+        return _toMoves(self._generateValidMoves(FULL_BOARD, empty, pins_and_checks=pins_and_checks)[0])
+
+    def getValidMovesFrom(self, row, col, pins_and_checks=None):
+        """
+        Get the valid moves of the current player's piece on (row, col).
+        """
+        return _toMoves(self._generateValidMoves(1 << (row * 9 + col), FULL_BOARD,
+                                                 pins_and_checks=pins_and_checks)[0])
+
+    def getValidMoveCodes(self):
+        """
+        getValidMoves() as packed ints (Move.pack()), without building a
+        Move per move. Does not touch self.checkmate.
+        """
+        return self._generateValidMoves(FULL_BOARD, FULL_BOARD)[0]
+
+    def _generateValidMoves(self, from_mask, to_mask, count_only=False, pins_and_checks=None):
+        """
+        Valid moves of the current player's pieces on from_mask
+        to squares on to_mask, packed as ints (Move.pack()).
+        pins_and_checks is pinsAndChecks() if already computed.
+        Returns (moves, number of checkers), or (number of moves, number
+        of checkers) with count_only.
+        """
+        is_white = self.white_to_move
+        color = 'w' if is_white else 'b'
+        own = self.occupancy[is_white]
+        enemy = self.occupancy[not is_white]
+        occupied = own | enemy
+        slides, steps, _, _ = BITBOARD_TABLES[is_white]
+        bitboards = self.bitboards
+        codes = self.square_codes
+        if pins_and_checks is None:
+            pins_and_checks = self.pinsAndChecks()
+        sliders, (pins, checks, check_mask) = pins_and_checks
+
+        moves = []
+        count = 0
+
+        # President: every target needs an attack test with the President lifted
+        row, col = self.white_president_location if is_white else self.black_president_location
+        president = row * 9 + col
+        lifted = occupied ^ (1 << president)
+        targets = steps["P"][president] & ~own & to_mask if from_mask >> president & 1 else 0
+        base = president | PIECE_CODES[color + "P"] << 14
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            end = bit.bit_length() - 1
+            if not self._attacked(end, not is_white, lifted, sliders):
+                moves.append(base | end << 7 | codes[end] << 18)
+        if count_only:
+            count = len(moves)
+
+        if checks < 2:
+            allowed = (check_mask if checks == 1 else FULL_BOARD) & to_mask
+            not_own = ~own
+            for piece_type in "GVANBS":
+                pieces = bitboards[color + piece_type] & from_mask
+                piece_slides = slides[piece_type]
+                piece_steps = steps[piece_type]
+                piece_code = PIECE_CODES[color + piece_type] << 14
+                while pieces:
+                    bit = pieces & -pieces
+                    pieces ^= bit
+                    start = bit.bit_length() - 1
+                    if piece_type == "S":
+                        targets = piece_steps[start] & enemy
+                        push = SOLDIER_PUSH_MASKS[is_white][start] & ~occupied
+                        if push:
+                            targets |= push
+                            if SQUARES[start][0] == SOLDIER_START_ROW[is_white]:
+                                targets |= SOLDIER_PUSH_MASKS[is_white][push.bit_length() - 1] & ~occupied
+                    else:
+                        targets = piece_steps[start]
+                        for ray, table, positive in piece_slides[start]:
+                            blockers = ray & occupied
+                            if not blockers:
+                                targets |= ray
+                            elif positive:
+                                targets |= ray ^ table[(blockers & -blockers).bit_length() - 1]
+                            else:
+                                targets |= ray ^ table[blockers.bit_length() - 1]
+                        targets &= not_own
+                    targets &= allowed
+                    if start in pins:
+                        targets &= pins[start]
+                    if count_only:
+                        count += targets.bit_count()
+                        continue
+                    base = start | piece_code
+                    while targets:
+                        end_bit = targets & -targets
+                        targets ^= end_bit
+                        end = end_bit.bit_length() - 1
+                        moves.append(base | end << 7 | codes[end] << 18)
+
+        return (count if count_only else moves), checks
+
+
+def benchmark(positions=600, rounds=15, seed=0, perft_depth=3):
+    """
+    Compare the list-of-strings and bitboard backends on the same
+    random-game positions: getValidMoves() on both, the bitboard's
+    getValidMoveCodes(), and perft to perft_depth (perft.perft() on the
+    list backend, BitboardGameState.perft() on bitboards) from the start
+    position. Each round times every position once per backend, and the
+    best round counts, so background load doesn't skew it.
+    Returns {name: calls/sec, or nodes/sec for perft}.
+    """
+    from perft import perft
+
+    rng = random.Random(seed)
+    states = {"list": [], "bitboard": []}
+    list_state = GameState()
+    bitboard_state = BitboardGameState()
+    for _ in range(positions):
+        moves = list_state.getValidMoves()
+        if not moves or len(list_state.move_log) == 40:
+            list_state = GameState()
+            bitboard_state = BitboardGameState()
+            continue
+        move = rng.choice(moves)
+        list_state.makeMove(move)
+        bitboard_state.makeMove(move)
+        states["list"].append(copy.deepcopy(list_state))
+        states["bitboard"].append(copy.deepcopy(bitboard_state))
+
+    runs = {
+        "list getValidMoves": (states["list"], GameState.getValidMoves),
+        "bitboard getValidMoves": (states["bitboard"], BitboardGameState.getValidMoves),
+        "bitboard getValidMoveCodes": (states["bitboard"], BitboardGameState.getValidMoveCodes),
+    }
+    best = {name: float("inf") for name in runs}
+    for _ in range(rounds):
+        for name, (snapshot, generate) in runs.items():
+            begin = time.perf_counter()
+            for state in snapshot:
+                generate(state)
+            best[name] = min(best[name], time.perf_counter() - begin)
+    rates = {name: len(runs[name][0]) / elapsed for name, elapsed in best.items()}
+
+    for name, count in (("list perft", lambda: perft(GameState(), perft_depth)),
+                        ("bitboard perft", lambda: BitboardGameState().perft(perft_depth))):
+        elapsed = float("inf")
+        for _ in range(max(rounds // 5, 1)):
+            begin = time.perf_counter()
+            nodes = count()
+            elapsed = min(elapsed, time.perf_counter() - begin)
+        rates[name] = nodes / elapsed
+    return rates
+
+
+if __name__ == "__main__":
+    positions = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    results = benchmark(positions)
+    for name, rate in results.items():
+        unit = "nodes/sec" if name.endswith("perft") else "calls/sec"
+        print(f"{name:>26}: {rate:10.0f} {unit}")
+    print(f"  getValidMoves speedup: {results['bitboard getValidMoves'] / results['list getValidMoves']:.2f}x, "
+          f"packed codes: {results['bitboard getValidMoveCodes'] / results['list getValidMoves']:.2f}x, "
+          f"perft: {results['bitboard perft'] / results['list perft']:.2f}x")
@@ -0,0 +1,245 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+from chessengine import GameState
+from gamerecord import RESULT_BLACK_WINS, RESULT_WHITE_WINS, checkFormat, playRecord, readRecords
+
+
+# File layout: a 16-byte header (MAGIC, padding, uint64 entry count), then
+# 12-byte entries sorted by key: uint64 Zobrist key, uint16 moveID, uint16 weight.
+MAGIC = b"MCBK\x01"
+_HEADER = struct.Struct("<5s3xQ")
+_ENTRY = struct.Struct("<QHH")
+_KEY = struct.Struct("<Q")
+HEADER_SIZE = _HEADER.size
+ENTRY_SIZE = _ENTRY.size
+MAX_WEIGHT = 0xFFFF
+
+DEFAULT_MAX_PLIES = 16
+DEFAULT_MIN_GAMES = 3
+
+
+class OpeningBook:
+    """
+    Read-only opening book. The file is memory-mapped with ACCESS_READ,
+    so every process that opens it (or inherits it through fork) shares
+    the same page-cache pages instead of holding its own copy; lookups
+    are a binary search in place.
+    """
+
+    def __init__(self, path, rng=None):
+        self.path = path
+        self.rng = rng if rng is not None else random.Random()
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.num_entries = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or len(self.map) != HEADER_SIZE + self.num_entries * ENTRY_SIZE:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.num_entries
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def lookup(self, key):
+        """
+        [(moveID, weight)] for the position with this Zobrist key,
+        empty if it is not in the book.
+        """
+        low, high = 0, self.num_entries
+        while low < high:
+            middle = (low + high) // 2
+            if _KEY.unpack_from(self.map, HEADER_SIZE + middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        while low < self.num_entries:
+            entry_key, move_id, weight = _ENTRY.unpack_from(self.map, HEADER_SIZE + low * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            moves.append((move_id, weight))
+            low += 1
+        return moves
+
+    def choose(self, game_state):
+        """
+        A book move for the position, picked at random in proportion to
+        its weight, or None if the position is not in the book. Only
+        moves that are legal here are considered, in case of a key collision.
+        """
+        moves = self.lookup(game_state.zobrist_key)
+        if not moves:
+            return None
+        valid = {move.moveID: move for move in game_state.getValidMoves()}
+        legal = []
+        weights = []
+        for move_id, weight in moves:
+            if move_id in valid:
+                legal.append(valid[move_id])
+                weights.append(weight)
+        if not legal:
+            return None
+        return self.rng.choices(legal, weights)[0]
+
+
+def collectMoves(records, max_plies=DEFAULT_MAX_PLIES):
+    """
+    Replay records and score every move played in the first max_plies
+    plies for the side that played it: 2 per win, 1 per draw or unknown
+    result, 0 per loss. Returns {(key, moveID): [games, score]}.
+    """
+    counts = {}
+    game_state = GameState()
+    start_position = game_state.snapshot()
+    for record, error in checkFormat(records):
+        if error is not None:
+            continue
+        played = []
+        try:
+            for move in playRecord(game_state, record, start_position):
+                if len(played) == max_plies:
+                    break
+                if record.result == RESULT_WHITE_WINS:
+                    score = 2 if game_state.white_to_move else 0
+                elif record.result == RESULT_BLACK_WINS:
+                    score = 0 if game_state.white_to_move else 2
+                else:
+                    score = 1
+                played.append(((game_state.zobrist_key, move.moveID), score))
+        except ValueError:
+            continue
+        for entry, score in played:
+            stats = counts.get(entry)
+            if stats is None:
+                stats = counts[entry] = [0, 0]
+            stats[0] += 1
+            stats[1] += score
+    return counts
+
+
+def writeBook(path, counts, min_games=DEFAULT_MIN_GAMES):
+    """
+    Write a book from collectMoves() counts, keeping moves played at least
+    min_games times that scored something. Weights are the scores, scaled
+    down per position if they would not fit 16 bits. Returns entries written.
+    """
+    positions = {}
+    for (key, move_id), (games, score) in counts.items():
+        if games >= min_games and score > 0:
+            positions.setdefault(key, []).append((move_id, score))
+    temporary = path + ".tmp"
+    written = 0
+    with open(temporary, "wb") as output:
+        output.write(_HEADER.pack(MAGIC, 0))
+        for key in sorted(positions):
+            moves = positions[key]
+            scale = max(score for _, score in moves) / MAX_WEIGHT
+            for move_id, score in sorted(moves):
+                weight = max(1, round(score / scale)) if scale > 1 else score
+                output.write(_ENTRY.pack(key, move_id, weight))
+                written += 1
+        output.seek(0)
+        output.write(_HEADER.pack(MAGIC, written))
+    os.replace(temporary, path)
+    return written
+
+
+def buildBook(path, record_paths, max_plies=DEFAULT_MAX_PLIES, min_games=DEFAULT_MIN_GAMES):
+    """
+    Build a book from game record files (archived or self-play games).
+    Returns entries written.
+    """
+    counts = {}
+    for record_path in record_paths:
+        for entry, (games, score) in collectMoves(readRecords(record_path), max_plies).items():
+            stats = counts.setdefault(entry, [0, 0])
+            stats[0] += games
+            stats[1] += score
+    return writeBook(path, counts, min_games)
+
+
+def selfPlay(path, games, concurrency, nodes, opening_plies=2, max_plies=DEFAULT_MAX_PLIES,
+             min_games=DEFAULT_MIN_GAMES, records=None):
+    """
+    Play engine-vs-engine games with match.py and build a book from them.
+    The games are kept in records if given, otherwise in a temporary file.
+    """
+    from match import DEFAULT_ADJUDICATION, DEFAULT_ENGINE, runMatch
+
+    engines = [dict(DEFAULT_ENGINE, nodes=nodes, name=name) for name in "AB"]
+    temporary = None
+    if records is None:
+        handle, temporary = tempfile.mkstemp(suffix=".mcgr")
+        os.close(handle)
+        os.remove(temporary)
+        records = temporary
+    try:
+        runMatch(engines, games, concurrency, opening_plies, DEFAULT_ADJUDICATION, records=records,
+                 seed=random.randrange(1 << 32))
+        return buildBook(path, [records], max_plies, min_games)
+    finally:
+        if temporary is not None and os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Opening book: build from games or self-play, probe.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from game record files")
+    build.add_argument("book")
+    build.add_argument("records", nargs="+")
+    play = commands.add_parser("selfplay", help="play games with match.py and build a book from them")
+    play.add_argument("book")
+    play.add_argument("-n", "--games", type=int, default=100)
+    play.add_argument("-c", "--concurrency", type=int, default=os.cpu_count())
+    play.add_argument("--nodes", type=int, default=5000, help="nodes per move")
+    play.add_argument("--opening-plies", type=int, default=2, help="random plies for variety")
+    play.add_argument("--records", help="also keep the games in this record file")
+    for command in (build, play):
+        command.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="book depth in plies")
+        command.add_argument("--min-games", type=int, default=DEFAULT_MIN_GAMES,
+                             help="games a move needs to be in the book")
+    probe = commands.add_parser("probe", help="show the book moves for a position")
+    probe.add_argument("book")
+    probe.add_argument("fen", nargs="?", help="position (default: start position)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(f"{buildBook(args.book, args.records, args.max_plies, args.min_games)} entries written")
+        return 0
+    if args.command == "selfplay":
+        entries = selfPlay(args.book, args.games, args.concurrency, args.nodes, args.opening_plies,
+                           args.max_plies, args.min_games, args.records)
+        print(f"{entries} entries written")
+        return 0
+
+    game_state = GameState.fromFEN(args.fen) if args.fen else GameState()
+    with OpeningBook(args.book) as book:
+        begin = time.perf_counter()
+        moves = book.lookup(game_state.zobrist_key)
+        elapsed = time.perf_counter() - begin
+        total = sum(weight for _, weight in moves) or 1
+        print(f"{len(moves)} book moves ({len(book)} entries, lookup {elapsed * 1e6:.0f}us)")
+        for move_id, weight in sorted(moves, key=lambda m: m[1], reverse=True):
+            print(f"{move_id:04d}  weight {weight:>5}  {weight / total:6.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
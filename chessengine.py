@@ -1,4 +1,172 @@
+def _piecePatterns(is_white):
+    """
+    Movement patterns for one color.
+    Maps piece type to (slide directions, single-step/jump directions).
+    Soldier steps are its diagonal captures; pushes are handled separately.
+    """
+    fwd = -1 if is_white else 1  # Forward
+    back = 1 if is_white else -1 # Backward
+    return {
+        "P": ([], [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]),
+        "G": ([(fwd, 0), (fwd, 1), (fwd, -1), (0, 1)], [(back, 0)]),
+        "V": ([(back, 0), (back, 1), (back, -1), (0, 1), (0, -1)], [(fwd, 0)]),
+        "A": ([(fwd, 1), (fwd, -1), (back, 1), (back, -1), (fwd, 0)], []),
+        "N": ([], [(-2, 2), (2, 2), (2, -2), (-2, -2)]),
+        "B": ([(-1, 0), (1, 0), (0, 1), (0, -1)], []),
+        "S": ([], [(fwd, -1), (fwd, 1)]),
+    }
+
+
+def _ray(row, col, d_row, d_col):
+    """
+    Squares from (row, col) in direction (d_row, d_col), nearest first,
+    not including (row, col) itself.
+    """
+    squares = []
+    row += d_row
+    col += d_col
+    while 0 <= row < 9 and 0 <= col < 9:
+        squares.append((row, col))
+        row += d_row
+        col += d_col
+    return tuple(squares)
+
+
+def _buildMoveTables(is_white):
+    """
+    Build the move tables for one color.
+    table[piece_type][row][col] is (rays, steps): the rays of squares a
+    slider walks until a blocker, and the on-board step/jump targets.
+    """
+    tables = {}
+    for piece_type, (slide_dirs, step_dirs) in _piecePatterns(is_white).items():
+        tables[piece_type] = [
+            [
+                (tuple(ray for ray in (_ray(row, col, d[0], d[1]) for d in slide_dirs) if ray),
+                 tuple((row + d[0], col + d[1]) for d in step_dirs
+                       if 0 <= row + d[0] < 9 and 0 <= col + d[1] < 9))
+                for col in range(9)
+            ]
+            for row in range(9)
+        ]
+    return tables
+
+
+def _buildSoldierPushes(is_white):
+    """
+    table[row][col] is the Soldier's push squares, nearest first:
+    two from its starting row, one elsewhere, none on the last row.
+    """
+    fwd = -1 if is_white else 1
+    start_row = 7 if is_white else 1
+    return [
+        [_ray(row, col, fwd, 0)[:2 if row == start_row else 1] for col in range(9)]
+        for row in range(9)
+    ]
+
+
+def _buildAttackTables(is_white):
+    """
+    Build the reverse-attack tables for one attacking color.
+    table[row][col] is (rays, steps) for a target square: rays walk outward
+    from the target opposite to each slide direction, paired with the pieces
+    that attack along them; steps pair each square a piece could step or
+    jump from with the pieces that can.
+    """
+    color = 'w' if is_white else 'b'
+    slides = {}
+    steps = {}
+    for piece_type, (slide_dirs, step_dirs) in _piecePatterns(is_white).items():
+        for d in slide_dirs:
+            slides.setdefault(d, set()).add(color + piece_type)
+        for d in step_dirs:
+            steps.setdefault(d, set()).add(color + piece_type)
+
+    return [
+        [
+            (tuple((ray, frozenset(pieces)) for ray, pieces in
+                   ((_ray(row, col, -d[0], -d[1]), pieces) for d, pieces in slides.items()) if ray),
+             tuple(((row - d[0], col - d[1]), frozenset(pieces)) for d, pieces in steps.items()
+                   if 0 <= row - d[0] < 9 and 0 <= col - d[1] < 9))
+            for col in range(9)
+        ]
+        for row in range(9)
+    ]
+
+
+# All tables are indexed by color first (True for white)
+MOVE_TABLES = {True: _buildMoveTables(True), False: _buildMoveTables(False)}
+SOLDIER_PUSHES = {True: _buildSoldierPushes(True), False: _buildSoldierPushes(False)}
+ATTACK_TABLES = {True: _buildAttackTables(True), False: _buildAttackTables(False)}
+
+
+def _splitmix64(seed):
+    """
+    Deterministic stream of 64-bit values (SplitMix64), so Zobrist keys
+    are the same in every process and every run.
+    """
+    while True:
+        seed = (seed + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        z = seed
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        yield z ^ (z >> 31)
+
+
+_zobrist_stream = _splitmix64(0x9C3E55)
+# ZOBRIST_PIECES[piece][row * 9 + col], XORed in for every occupied square
+ZOBRIST_PIECES = {
+    color + piece_type: [next(_zobrist_stream) for _ in range(81)]
+    for color in "wb" for piece_type in "PGVANBS"
+}
+# XORed in when black is to move
+ZOBRIST_BLACK_TO_MOVE = next(_zobrist_stream)
+del _zobrist_stream
+
+# Piece codes used by Move.pack() and snapshots; index 0 is the empty square
+PIECES = ["--"] + [color + piece_type for color in "wb" for piece_type in "PGVANBS"]
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECES)}
+
+# Snapshots are one piece code per square, row by row; the high bit of
+# the first byte is set when black is to move. Byte value -> piece,
+# None for bytes that are not a valid code (the first byte is looked up
+# with SNAPSHOT_BLACK_TO_MOVE cleared).
+SNAPSHOT_SIZE = 81
+SNAPSHOT_BLACK_TO_MOVE = 0x80
+_SNAPSHOT_PIECES = tuple(PIECES[value] if value < len(PIECES) else None for value in range(256))
+
+# FEN-style text: ranks from row 0 (black's side) to row 8 separated by '/',
+# uppercase for white and lowercase for black, digits for runs of empty
+# squares, then 'w' or 'b' for the side to move.
+START_FEN = "anvbpgvna/sssssssss/9/9/9/9/9/SSSSSSSSS/ANVBPGVNA w"
+
+
+def _presidentLocations(squares):
+    """
+    (white, black) President locations as (row, col) from the 81 pieces
+    of a board, row by row. Raises ValueError unless each side has
+    exactly one President, so loaders can check before changing anything.
+    """
+    locations = []
+    for piece in ("wP", "bP"):
+        if squares.count(piece) != 1:
+            raise ValueError(f"Position needs exactly one President for each side, "
+                             f"{piece} has {squares.count(piece)}")
+        locations.append(divmod(squares.index(piece), 9))
+    return tuple(locations)
+
+
 class GameState:
+    # Debug mode: after every makeMove/undoMove, assert that the running
+    # material and piece-square totals match computeScores()
+    check_scores = False
+    # evaluation.py's PIECE_VALUES and PIECE_SQUARE_VALUES, looked up on
+    # first use since evaluation.py imports this module
+    _piece_values = None
+    _piece_square_values = None
+    # Positions whose getValidMoveIndex() is kept, oldest dropped first
+    move_index_cache_size = 256
+
     def __init__(self):
         """
         Board is a 9x9 2D list. Each element has 2 characters.
@@ -33,7 +201,227 @@ class GameState:
         self.black_president_location = (0, 4)
         
         self.checkmate = False
-        # self.stalemate = False # <-- Removed to match index.html
+
+        # Optional positiondb.PositionDatabase, see getPositionStats()
+        self.position_db = None
+        # MoveIndex per Zobrist key, see getValidMoveIndex()
+        self._move_indexes = {}
+
+        self._zobrist_key = self.computeZobristKey()
+        self.resetScores()
+
+    @property
+    def zobrist_key(self):
+        """
+        64-bit Zobrist key of the position (pieces on squares and side to move).
+        Kept up to date by makeMove/undoMove.
+        """
+        return self._zobrist_key
+
+    def computeZobristKey(self):
+        """
+        Compute the Zobrist key from scratch by scanning the board.
+        """
+        key = 0 if self.white_to_move else ZOBRIST_BLACK_TO_MOVE
+        for row in range(9):
+            for col in range(9):
+                piece = self.board[row][col]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][row * 9 + col]
+        return key
+
+    def resetZobristKey(self):
+        """
+        Recompute the stored key. Only needed after editing
+        self.board or self.white_to_move directly.
+        """
+        self._zobrist_key = self.computeZobristKey()
+
+    def computeScores(self):
+        """
+        Material and piece-square totals per color ({'w': ..., 'b': ...}
+        each, from evaluation.py's tables) computed from scratch.
+        """
+        from evaluation import PIECE_SQUARE_VALUES, PIECE_VALUES
+
+        if GameState._piece_values is None:
+            GameState._piece_values = PIECE_VALUES
+            GameState._piece_square_values = PIECE_SQUARE_VALUES
+        material = {'w': 0, 'b': 0}
+        piece_square = {'w': 0, 'b': 0}
+        for row in range(9):
+            for col in range(9):
+                piece = self.board[row][col]
+                if piece != "--":
+                    material[piece[0]] += PIECE_VALUES[piece[1]]
+                    piece_square[piece[0]] += PIECE_SQUARE_VALUES[piece][row * 9 + col]
+        return material, piece_square
+
+    def resetScores(self):
+        """
+        Recompute self.material and self.piece_square, the running totals
+        kept by makeMove/undoMove. Like resetZobristKey(), only needed
+        after editing self.board directly.
+        """
+        self.material, self.piece_square = self.computeScores()
+
+    def _updateScores(self, move, sign):
+        """
+        Add a move to the running totals (sign 1) or take it back (sign -1).
+        """
+        table = self._piece_square_values[move.piece_moved]
+        end = move.end_row * 9 + move.end_col
+        self.piece_square[move.piece_moved[0]] += sign * (table[end] - table[move.start_row * 9 + move.start_col])
+        captured = move.piece_captured
+        if captured != "--":
+            color = captured[0]
+            self.material[color] -= sign * self._piece_values[captured[1]]
+            self.piece_square[color] -= sign * self._piece_square_values[captured][end]
+
+    def _checkScores(self):
+        material, piece_square = self.computeScores()
+        assert (self.material, self.piece_square) == (material, piece_square), (
+            f"Incremental scores {self.material} {self.piece_square} != {material} {piece_square} "
+            f"after {self.move_log[-1] if self.move_log else 'no moves'}")
+
+    def getPositionStats(self):
+        """
+        Moves played from the current position in the attached position
+        database (MoveStats, most played first); empty without one.
+        """
+        if self.position_db is None:
+            return []
+        return self.position_db.lookup(self._zobrist_key)
+
+    def toFEN(self):
+        """
+        The position as FEN-style text (see START_FEN).
+        """
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1] if piece[0] == 'w' else piece[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        return "/".join(ranks) + (" w" if self.white_to_move else " b")
+
+    def loadFEN(self, fen):
+        """
+        Set up the position from toFEN() text. The move log is cleared.
+        Raises ValueError if the text is not a valid position.
+        """
+        fields = fen.split()
+        if len(fields) != 2 or fields[1] not in ("w", "b"):
+            raise ValueError(f"Invalid FEN '{fen}': expected '<ranks> w|b'")
+        ranks = fields[0].split("/")
+        if len(ranks) != 9:
+            raise ValueError(f"Invalid FEN '{fen}': expected 9 ranks, got {len(ranks)}")
+        board = []
+        for rank in ranks:
+            row = []
+            for char in rank:
+                if char in "123456789":
+                    row.extend(["--"] * int(char))
+                elif char.upper() in "PGVANBS":
+                    row.append(("w" if char.isupper() else "b") + char.upper())
+                else:
+                    raise ValueError(f"Invalid FEN '{fen}': unknown piece '{char}'")
+            if len(row) != 9:
+                raise ValueError(f"Invalid FEN '{fen}': rank '{rank}' is not 9 squares")
+            board.append(row)
+        self.white_president_location, self.black_president_location = _presidentLocations(
+            [piece for row in board for piece in row])
+        self.board = board
+        self.white_to_move = fields[1] == "w"
+        self._positionLoaded()
+
+    @classmethod
+    def fromFEN(cls, fen):
+        game_state = cls()
+        game_state.loadFEN(fen)
+        return game_state
+
+    def snapshot(self):
+        """
+        The position as SNAPSHOT_SIZE (81) bytes: one piece code per square,
+        with the side to move in the high bit of the first byte.
+        """
+        data = bytearray(SNAPSHOT_SIZE)
+        self.writeSnapshot(data)
+        return bytes(data)
+
+    def writeSnapshot(self, buffer, offset=0):
+        """
+        Write the snapshot into a larger writable buffer (bytearray, mmap,
+        shared memory) at offset, so many positions can be stored back to
+        back without an object per position.
+        """
+        codes = PIECE_CODES
+        i = offset
+        for row in self.board:
+            for piece in row:
+                buffer[i] = codes[piece]
+                i += 1
+        if not self.white_to_move:
+            buffer[offset] |= SNAPSHOT_BLACK_TO_MOVE
+
+    def loadSnapshot(self, data, offset=0):
+        """
+        Restore a position from snapshot bytes at offset in data (bytes,
+        bytearray, memoryview or mmap). The board rows are refilled in
+        place with the shared piece strings, so nothing is allocated per
+        square. The move log is cleared. Raises ValueError, leaving the
+        position as it was, if the bytes are not a valid position.
+        """
+        view = memoryview(data)[offset:offset + SNAPSHOT_SIZE]
+        if len(view) != SNAPSHOT_SIZE:
+            raise ValueError(f"Snapshot needs {SNAPSHOT_SIZE} bytes, got {len(view)}")
+        squares = list(map(_SNAPSHOT_PIECES.__getitem__, view))
+        squares[0] = _SNAPSHOT_PIECES[view[0] & ~SNAPSHOT_BLACK_TO_MOVE]
+        if None in squares:
+            raise ValueError(f"Invalid piece code in snapshot square {squares.index(None)}")
+        self.white_president_location, self.black_president_location = _presidentLocations(squares)
+        for row in range(9):
+            self.board[row][:] = squares[row * 9:row * 9 + 9]
+        self.white_to_move = not view[0] & SNAPSHOT_BLACK_TO_MOVE
+        self._positionLoaded()
+
+    @classmethod
+    def fromSnapshot(cls, data, offset=0):
+        game_state = cls()
+        game_state.loadSnapshot(data, offset)
+        return game_state
+
+    def _positionLoaded(self):
+        """
+        Bring the derived state in line after a whole new position was
+        loaded into self.board, self.white_to_move and the President
+        locations (see _presidentLocations).
+        """
+        self.move_log = []
+        self.checkmate = False
+        self.resetZobristKey()
+        self.resetScores()
+
+    def _updateZobristKey(self, move):
+        """
+        XOR a move in or out of the key; it is its own inverse.
+        """
+        zobrist = ZOBRIST_PIECES[move.piece_moved]
+        end = move.end_row * 9 + move.end_col
+        key = self._zobrist_key ^ zobrist[move.start_row * 9 + move.start_col] ^ zobrist[end] ^ ZOBRIST_BLACK_TO_MOVE
+        if move.piece_captured != "--":
+            key ^= ZOBRIST_PIECES[move.piece_captured][end]
+        self._zobrist_key = key
 
     def makeMove(self, move):
         """
@@ -43,6 +431,10 @@ class GameState:
         self.board[move.end_row][move.end_col] = move.piece_moved
         self.move_log.append(move)
         self.white_to_move = not self.white_to_move
+        self._updateZobristKey(move)
+        self._updateScores(move, 1)
+        if self.check_scores:
+            self._checkScores()
         
         # Update president location
         if move.piece_moved == "wP":
@@ -59,6 +451,10 @@ class GameState:
             self.board[move.start_row][move.start_col] = move.piece_moved
             self.board[move.end_row][move.end_col] = move.piece_captured
             self.white_to_move = not self.white_to_move
+            self._updateZobristKey(move)
+            self._updateScores(move, -1)
+            if self.check_scores:
+                self._checkScores()
             
             # Update president location
             if move.piece_moved == "wP":
@@ -67,7 +463,6 @@ class GameState:
                 self.black_president_location = (move.start_row, move.start_col)
                 
             self.checkmate = False
-            # self.stalemate = False # <-- Removed to match index.html
 
     def inCheck(self):
         """
@@ -82,29 +477,253 @@ class GameState:
         """
         Determine if the square (row, col) is under attack by the opponent.
         """
-        opponent_moves = self._getAllPossibleMovesUnchecked(not self.white_to_move)
-        for move in opponent_moves:
-            if move.end_row == row and move.end_col == col:
+        return self.isSquareAttacked(row, col, not self.white_to_move)
+
+    def isSquareAttacked(self, row, col, by_white):
+        """
+        Determine if the square (row, col) is attacked by the given color.
+        Looks outward from the square along every piece pattern and stops
+        at the first blocker, so no moves are generated.
+        Each attacking piece moves in its own color's forward direction.
+        """
+        board = self.board
+        rays, steps = ATTACK_TABLES[by_white][row][col]
+
+        for (r, c), pieces in steps:
+            if board[r][c] in pieces:
                 return True
+
+        for ray, pieces in rays:
+            for r, c in ray:
+                piece = board[r][c]
+                if piece != "--":
+                    if piece in pieces:
+                        return True
+                    break
         return False
 
     def getValidMoves(self):
         """
         Get all valid moves considering checks.
+        Pins, checkers and blocking squares are computed once per position,
+        so only President moves need an attack test.
         """
-        # self.checkmate = False # <-- Removed to match JS logic (set at end)
-        # self.stalemate = False # <-- Removed
-        
-        moves = self._getAllPossibleMovesUnchecked(self.white_to_move) # Get all moves
-        
-        # For each move, make the move, check if it's valid (not in check), then undo
-        for i in range(len(moves) - 1, -1, -1): # Iterate backwards
-            move = moves[i]
-            
+        pins, checks, check_squares = self._getPinsAndChecks()
+        moves = self._filterLegal(self._getAllPossibleMovesUnchecked(self.white_to_move),
+                                  pins, checks, check_squares)
+
+        # Checkmate is no legal move while in check; stalemate is not tracked
+        if len(moves) == 0 and checks > 0:
+            self.checkmate = True
+        else:
+            self.checkmate = False
+
+        return moves
+
+    def getValidMoveIndex(self):
+        """
+        getValidMoves() as a MoveIndex, for looking moves up by square.
+        Indexes are kept per Zobrist key, so going back to a position
+        (undoMove, then makeMove again) reuses its index instead of
+        generating the moves again. Sets self.checkmate like getValidMoves().
+        """
+        key = self._zobrist_key
+        index = self._move_indexes.get(key)
+        if index is None:
+            index = MoveIndex(self.getValidMoves(), self.checkmate)
+            if len(self._move_indexes) >= self.move_index_cache_size:
+                del self._move_indexes[next(iter(self._move_indexes))]
+            self._move_indexes[key] = index
+        self.checkmate = index.checkmate
+        return index
+
+    def pinsAndChecks(self):
+        """
+        The position's pins and checks, to pass to getValidCaptures(),
+        getValidQuietMoves() and getValidMovesFrom() when several of them
+        are used on one position, so they are only worked out once.
+        """
+        return self._getPinsAndChecks()
+
+    def getValidCaptures(self, pins_and_checks=None):
+        """
+        Get only the valid capturing moves. Captures are found by looking
+        outward from each enemy piece, so quiet moves are never generated.
+        Does not touch self.checkmate.
+        """
+        if pins_and_checks is None:
+            pins_and_checks = self._getPinsAndChecks()
+        return self._filterLegal(self._getPossibleCaptures(), *pins_and_checks)
+
+    def getValidQuietMoves(self, pins_and_checks=None):
+        """
+        Get only the valid non-capturing moves; captures are never
+        generated. Does not touch self.checkmate.
+        """
+        if pins_and_checks is None:
+            pins_and_checks = self._getPinsAndChecks()
+        return self._filterLegal(self._getPossibleQuietMoves(), *pins_and_checks)
+
+    def getValidMovesFrom(self, row, col, pins_and_checks=None):
+        """
+        Get the valid moves of the current player's piece on (row, col).
+        Does not touch self.checkmate.
+        """
+        piece = self.board[row][col]
+        if piece == "--" or (piece[0] == 'w') != self.white_to_move:
+            return []
+        moves = []
+        self.moveFunctions[piece[1]](row, col, moves)
+        if pins_and_checks is None:
+            pins_and_checks = self._getPinsAndChecks()
+        return self._filterLegal(moves, *pins_and_checks)
+
+    def _filterLegal(self, moves, pins, checks, check_squares):
+        """
+        Keep the moves that don't leave the current player's President
+        attacked, given the position's _getPinsAndChecks().
+        """
+        if self.white_to_move:
+            president_row, president_col = self.white_president_location
+        else:
+            president_row, president_col = self.black_president_location
+
+        legal = []
+        for move in moves:
+            if move.start_row == president_row and move.start_col == president_col:
+                # The President is lifted so it can't block a slider's ray onto its own destination
+                self.board[president_row][president_col] = "--"
+                attacked = self.isSquareAttacked(move.end_row, move.end_col, not self.white_to_move)
+                self.board[president_row][president_col] = move.piece_moved
+                if not attacked:
+                    legal.append(move)
+            elif checks < 2:
+                end_square = (move.end_row, move.end_col)
+                if checks == 1 and end_square not in check_squares:
+                    continue
+                pin_line = pins.get((move.start_row, move.start_col))
+                if pin_line is not None and end_square not in pin_line:
+                    continue
+                legal.append(move)
+        return legal
+
+    def _getPossibleCaptures(self):
+        """
+        Captures without considering checks, found from each enemy piece
+        with the reverse-attack tables.
+        """
+        board = self.board
+        enemy = 'b' if self.white_to_move else 'w'
+        tables = ATTACK_TABLES[self.white_to_move]
+        moves = []
+        for row in range(9):
+            for col in range(9):
+                if board[row][col][0] != enemy:
+                    continue
+                target = (row, col)
+                rays, steps = tables[row][col]
+                for square, pieces in steps:
+                    if board[square[0]][square[1]] in pieces:
+                        moves.append(Move(square, target, board))
+                for ray, pieces in rays:
+                    for square in ray:
+                        piece = board[square[0]][square[1]]
+                        if piece != "--":
+                            if piece in pieces:
+                                moves.append(Move(square, target, board))
+                            break
+        return moves
+
+    def _getPossibleQuietMoves(self):
+        """
+        Non-capturing moves without considering checks: slides up to the
+        first piece, steps and jumps onto empty squares, Soldier pushes.
+        """
+        board = self.board
+        color = 'w' if self.white_to_move else 'b'
+        tables = MOVE_TABLES[self.white_to_move]
+        pushes = SOLDIER_PUSHES[self.white_to_move]
+        moves = []
+        for row in range(9):
+            for col in range(9):
+                piece = board[row][col]
+                if piece[0] != color:
+                    continue
+                start = (row, col)
+                if piece[1] == "S":
+                    for end in pushes[row][col]:
+                        if board[end[0]][end[1]] != "--":
+                            break
+                        moves.append(Move(start, end, board))
+                    continue
+                rays, steps = tables[piece[1]][row][col]
+                for ray in rays:
+                    for end in ray:
+                        if board[end[0]][end[1]] != "--":
+                            break
+                        moves.append(Move(start, end, board))
+                for end in steps:
+                    if board[end[0]][end[1]] == "--":
+                        moves.append(Move(start, end, board))
+        return moves
+
+    def _getPinsAndChecks(self):
+        """
+        Look outward from the current player's President.
+        Returns (pins, checks, check_squares):
+        pins maps a pinned piece's square to the squares it may still move to,
+        checks is the number of pieces giving check, and check_squares holds
+        the checker's square plus any blocking squares (single check only).
+        """
+        if self.white_to_move:
+            row, col = self.white_president_location
+        else:
+            row, col = self.black_president_location
+        own_color = 'w' if self.white_to_move else 'b'
+        rays, steps = ATTACK_TABLES[not self.white_to_move][row][col]
+        board = self.board
+
+        pins = {}
+        checks = 0
+        check_squares = set()
+
+        for square, pieces in steps:
+            if board[square[0]][square[1]] in pieces:
+                checks += 1
+                check_squares.add(square)
+
+        for ray, pieces in rays:
+            pinned = None
+            for i, (r, c) in enumerate(ray):
+                piece = board[r][c]
+                if piece != "--":
+                    if piece[0] == own_color:
+                        if pinned is not None: # Two friendly pieces, no pin
+                            break
+                        pinned = (r, c)
+                    else:
+                        if piece in pieces:
+                            if pinned is None:
+                                checks += 1
+                                check_squares.update(ray[:i + 1])
+                            else:
+                                pins[pinned] = set(ray[:i + 1])
+                        break
+
+        return pins, checks, check_squares
+
+    def _getValidMovesReference(self):
+        """
+        Reference implementation of getValidMoves: play each move,
+        test for check, and undo it. Slow, but kept to cross-check
+        the pin-aware generator. Does not touch self.checkmate.
+        """
+        moves = []
+        for move in self._getAllPossibleMovesUnchecked(self.white_to_move):
             # Simulate the move
             self.board[move.start_row][move.start_col] = "--"
             self.board[move.end_row][move.end_col] = move.piece_moved
-            
+
             old_president_loc = None
             if move.piece_moved == "wP":
                 old_president_loc = self.white_president_location
@@ -113,223 +732,166 @@ class GameState:
                 old_president_loc = self.black_president_location
                 self.black_president_location = (move.end_row, move.end_col)
 
-            if self.inCheck(): 
-                moves.remove(move) # If it's in check, it's not a valid move
+            if not self.inCheck():
+                moves.append(move)
 
             # Undo the simulated move
             self.board[move.start_row][move.start_col] = move.piece_moved
             self.board[move.end_row][move.end_col] = move.piece_captured
-            
+
             if move.piece_moved == "wP":
                 self.white_president_location = old_president_loc
             elif move.piece_moved == "bP":
                 self.black_president_location = old_president_loc
-        
-        # --- Logic to match index.html ---
-        if len(moves) == 0 and self.inCheck():
-            self.checkmate = True
-        else:
-            self.checkmate = False
-        # --- End of matched logic ---
-                
+
         return moves
 
     def _getAllPossibleMovesUnchecked(self, is_white_turn):
         """
-        Get all possible moves without considering checks.
-        Takes a parameter to know whose moves to get,
-        so it doesn't rely on (or change) the main game state.
-        
-        NOTE: This function *intentionally* does not pass 'is_white_turn'
-        to the move functions, to match the (buggy) logic in index.html,
-        which causes them to rely on 'self.white_to_move'.
+        Get all possible moves of is_white_turn's pieces without
+        considering checks. The move functions read their direction tables
+        for self.white_to_move, so every caller passes the side to move;
+        attack tests don't generate moves but use the reverse tables with
+        an explicit color (see isSquareAttacked).
         """
         moves = []
         for row in range(9):
             for col in range(9):
                 piece = self.board[row][col]
-                if piece != "--" and (piece[0] == 'w' if is_white_turn else 'b'):
-                    # --- MODIFIED: Removed 'is_white_turn' to match index.html ---
+                if piece != "--" and (piece[0] == 'w') == is_white_turn:
                     self.moveFunctions[piece[1]](row, col, moves)
         return moves
 
-    # --- MODIFIED: All move functions below now use 'self.white_to_move' ---
+    # The move functions below generate for the side to move
+    # (self.white_to_move). Each one looks up its rays and step targets in
+    # MOVE_TABLES, so no directions or bounds are computed here.
+
+    def _addTableMoves(self, row, col, table, moves):
+        """
+        Add moves along the (rays, steps) table entry for (row, col).
+        Rays stop at the first blocker, which is captured if it's an enemy.
+        """
+        board = self.board
+        color = board[row][col][0]
+        start = (row, col)
+        rays, steps = table[row][col]
+        for ray in rays:
+            for end in ray:
+                end_piece = board[end[0]][end[1]]
+                if end_piece == "--":
+                    moves.append(Move(start, end, board))
+                else:
+                    if end_piece[0] != color:
+                        moves.append(Move(start, end, board))
+                    break
+        for end in steps:
+            end_piece = board[end[0]][end[1]]
+            if end_piece == "--" or end_piece[0] != color:
+                moves.append(Move(start, end, board))
 
     def getPresidentMoves(self, row, col, moves):
         """
         President moves one step in any direction.
-        (No 'is_white_turn' was needed here)
         """
-        directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        for d in directions:
-            end_row = row + d[0]
-            end_col = col + d[1]
-            if 0 <= end_row < 9 and 0 <= end_col < 9:
-                end_piece = self.board[end_row][end_col]
-                if end_piece == "--" or end_piece[0] != self.board[row][col][0]:
-                    moves.append(Move((row, col), (end_row, end_col), self.board))
+        self._addTableMoves(row, col, MOVE_TABLES[self.white_to_move]["P"], moves)
 
     def getGeneralMoves(self, row, col, moves):
         """
         General moves: Forward, Forward-East, Forward-West, East (Absolute),
         and one step Backward.
         """
-        fwd = -1 if self.white_to_move else 1  # Forward
-        back = 1 if self.white_to_move else -1 # Backward
-        
-        # N, NE, NW, E (relative to player, E is absolute)
-        directions = [[fwd, 0], [fwd, 1], [fwd, -1], [0, 1]] 
-        
-        for d in directions:
-            for i in range(1, 9):
-                end_row = row + d[0] * i
-                end_col = col + d[1] * i
-                if 0 <= end_row < 9 and 0 <= end_col < 9:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                    elif end_piece[0] != self.board[row][col][0]:
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                        break
-                    else: # Hit a friendly piece
-                        break
-                else: # Off board
-                    break
-                    
-        # One step S (relative to player)
-        end_row = row + back
-        end_col = col
-        if 0 <= end_row < 9 and 0 <= end_col < 9:
-            end_piece = self.board[end_row][end_col]
-            if end_piece == "--" or end_piece[0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (end_row, end_col), self.board))
+        self._addTableMoves(row, col, MOVE_TABLES[self.white_to_move]["G"], moves)
 
     def getViceGeneralMoves(self, row, col, moves):
         """
-        Vice-General moves: Backward, Backward-East, Backward-West, 
+        Vice-General moves: Backward, Backward-East, Backward-West,
         East (Absolute), West (Absolute), and one step Forward.
         """
-        fwd = -1 if self.white_to_move else 1  # Forward
-        back = 1 if self.white_to_move else -1 # Backward
-        
-        # S, SE, SW, E, W (relative to player, E/W are absolute)
-        directions = [[back, 0], [back, 1], [back, -1], [0, 1], [0, -1]]
-        
-        for d in directions:
-            for i in range(1, 9):
-                end_row = row + d[0] * i
-                end_col = col + d[1] * i
-                if 0 <= end_row < 9 and 0 <= end_col < 9:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                    elif end_piece[0] != self.board[row][col][0]:
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                        break
-                    else: # Hit a friendly piece
-                        break
-                else: # Off board
-                    break
-
-        # One step N (relative to player)
-        end_row = row + fwd
-        end_col = col
-        if 0 <= end_row < 9 and 0 <= end_col < 9:
-            end_piece = self.board[end_row][end_col]
-            if end_piece == "--" or end_piece[0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (end_row, end_col), self.board))
+        self._addTableMoves(row, col, MOVE_TABLES[self.white_to_move]["V"], moves)
 
     def getAirMarshalMoves(self, row, col, moves):
         """
         Air Marshal moves: All 4 diagonals and straight Forward.
         """
-        fwd = -1 if self.white_to_move else 1  # Forward
-        back = 1 if self.white_to_move else -1 # Backward
-        
-        # NE, NW, SE, SW, N (relative to player)
-        directions = [[fwd, 1], [fwd, -1], [back, 1], [back, -1], [fwd, 0]] 
-        
-        for d in directions:
-            for i in range(1, 9):
-                end_row = row + d[0] * i
-                end_col = col + d[1] * i
-                if 0 <= end_row < 9 and 0 <= end_col < 9:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                    elif end_piece[0] != self.board[row][col][0]:
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                        break
-                    else: # Hit a friendly piece
-                        break
-                else: # Off board
-                    break
+        self._addTableMoves(row, col, MOVE_TABLES[self.white_to_move]["A"], moves)
 
     def getNavySealMoves(self, row, col, moves):
         """
         Navy Seal moves: 2 steps diagonally (NE, NW, SE, SW).
-        (No 'is_white_turn' was needed here)
         """
-        directions = [(-2, 2), (2, 2), (2, -2), (-2, -2)]
-        for d in directions:
-            end_row = row + d[0]
-            end_col = col + d[1]
-            if 0 <= end_row < 9 and 0 <= end_col < 9:
-                end_piece = self.board[end_row][end_col]
-                if end_piece == "--" or end_piece[0] != self.board[row][col][0]:
-                    moves.append(Move((row, col), (end_row, end_col), self.board))
+        self._addTableMoves(row, col, MOVE_TABLES[self.white_to_move]["N"], moves)
 
     def getArmyBattalionMoves(self, row, col, moves):
         """
         Army Battalion moves: N, S, E, W.
-        (No 'is_white_turn' was needed here)
-        """
-        directions = [(-1, 0), (1, 0), (0, 1), (0, -1)]
-        for d in directions:
-            for i in range(1, 9):
-                end_row = row + d[0] * i
-                end_col = col + d[1] * i
-                if 0 <= end_row < 9 and 0 <= end_col < 9:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                    elif end_piece[0] != self.board[row][col][0]:
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                        break
-                    else: # Hit a friendly piece
-                        break
-                else: # Off board
-                    break
+        """
+        self._addTableMoves(row, col, MOVE_TABLES[self.white_to_move]["B"], moves)
 
     def getSoldierMoves(self, row, col, moves):
         """
         Soldier (Pawn) moves.
+        One step forward, two from its starting row, captures diagonally forward.
         """
-        if self.white_to_move: # White moves UP (row index decreases)
-            if row - 1 >= 0 and self.board[row - 1][col] == "--":
-                moves.append(Move((row, col), (row - 1, col), self.board))
-                if row == 7 and self.board[row - 2][col] == "--": # 2-step from row 7
-                    moves.append(Move((row, col), (row - 2, col), self.board))
-            if row - 1 >= 0 and col - 1 >= 0:
-                if self.board[row - 1][col - 1][0] == 'b': 
-                    moves.append(Move((row, col), (row - 1, col - 1), self.board))
-            if row - 1 >= 0 and col + 1 < 9:
-                if self.board[row - 1][col + 1][0] == 'b': 
-                    moves.append(Move((row, col), (row - 1, col + 1), self.board))
-        else: # Black moves DOWN (row index increases)
-            if row + 1 < 9 and self.board[row + 1][col] == "--":
-                moves.append(Move((row, col), (row + 1, col), self.board))
-                if row == 1 and self.board[row + 2][col] == "--": # 2-step from row 1
-                    moves.append(Move((row, col), (row + 2, col), self.board))
-            if row + 1 < 9 and col - 1 >= 0:
-                if self.board[row + 1][col - 1][0] == 'w': 
-                    moves.append(Move((row, col), (row + 1, col - 1), self.board))
-            if row + 1 < 9 and col + 1 < 9:
-                if self.board[row + 1][col + 1][0] == 'w': 
-                    moves.append(Move((row, col), (row + 1, col + 1), self.board))
+        board = self.board
+        start = (row, col)
+        for end in SOLDIER_PUSHES[self.white_to_move][row][col]:
+            if board[end[0]][end[1]] != "--":
+                break
+            moves.append(Move(start, end, board))
+        enemy = 'b' if self.white_to_move else 'w'
+        for end in MOVE_TABLES[self.white_to_move]["S"][row][col][1]:
+            if board[end[0]][end[1]][0] == enemy:
+                moves.append(Move(start, end, board))
+
+
+class MoveIndex:
+    """
+    The valid moves of a position, indexed by origin square and by
+    (origin, destination), both as (row, col) tuples. Iterating or
+    len() gives the moves in getValidMoves() order.
+    """
+    __slots__ = ("moves", "by_origin", "by_squares", "checkmate")
+
+    def __init__(self, moves, checkmate=False):
+        self.moves = moves
+        self.checkmate = checkmate
+        self.by_origin = {}
+        self.by_squares = {}
+        for move in moves:
+            start, end = (move.start_row, move.start_col), (move.end_row, move.end_col)
+            self.by_origin.setdefault(start, []).append(move)
+            self.by_squares[start, end] = move
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __iter__(self):
+        return iter(self.moves)
+
+    def movesFrom(self, square):
+        """
+        Valid moves of the piece on square, empty if it has none.
+        """
+        return self.by_origin.get(square, ())
+
+    def find(self, start_square, end_square):
+        """
+        The valid move from start_square to end_square, or None.
+        """
+        return self.by_squares.get((start_square, end_square))
 
 
 class Move:
+    """
+    A move on the 9x9 board. Uses __slots__ since move generation creates
+    thousands of these per position.
+    pack() encodes a move as one int:
+    start square (7 bits) | end square (7 bits) | piece moved (4) | piece captured (4),
+    with squares as row * 9 + col.
+    """
+    __slots__ = ("start_row", "start_col", "end_row", "end_col",
+                 "piece_moved", "piece_captured", "moveID")
+
     def __init__(self, start_sq, end_sq, board):
         self.start_row = start_sq[0]
         self.start_col = start_sq[1]
@@ -342,4 +904,32 @@ class Move:
     def __eq__(self, other):
         if isinstance(other, Move):
             return self.moveID == other.moveID
-        return False
\ No newline at end of file
+        return False
+
+    def __hash__(self):
+        return self.moveID
+
+    def __repr__(self):
+        return f"Move({self.piece_moved} {self.start_row},{self.start_col} -> {self.end_row},{self.end_col})"
+
+    def pack(self):
+        """
+        Encode the move as a single int (see the class docstring).
+        """
+        return ((self.start_row * 9 + self.start_col)
+                | (self.end_row * 9 + self.end_col) << 7
+                | PIECE_CODES[self.piece_moved] << 14
+                | PIECE_CODES[self.piece_captured] << 18)
+
+    @classmethod
+    def fromPacked(cls, packed):
+        """
+        Rebuild a move from pack() without needing the board.
+        """
+        move = cls.__new__(cls)
+        move.start_row, move.start_col = divmod(packed & 0x7F, 9)
+        move.end_row, move.end_col = divmod(packed >> 7 & 0x7F, 9)
+        move.piece_moved = PIECES[packed >> 14 & 0xF]
+        move.piece_captured = PIECES[packed >> 18 & 0xF]
+        move.moveID = move.start_row * 1000 + move.start_col * 100 + move.end_row * 10 + move.end_col
+        return move
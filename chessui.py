@@ -1,17 +1,30 @@
 import tkinter as tk
 from tkinter import messagebox
-from PIL import Image, ImageTk
 from pathlib import Path
+import os
 import time
-import chessengine as ChessEngine
-from chessengine import GameState, Move
+from chessengine import GameState
+from engineworker import EngineWorker
+from gamerecord import GameRecordWriter, RESULT_BLACK_WINS, RESULT_UNKNOWN, RESULT_WHITE_WINS
+from search import Searcher
+from timemanager import TimeManager
 import traceback # <-- Import traceback to show errors
+# PIL, positiondb, book and tablebase are imported only when they are
+# needed, to keep startup fast (see importbudget.py)
 
 BOARD_WIDTH = BOARD_HEIGHT = 576  
 DIMENSION = 9
 SQUARE_SIZE = BOARD_HEIGHT // DIMENSION
 IMAGES = {}
 
+ENGINE_POLL_MS = 50
+
+GAME_ARCHIVE = "games.mcgr" # Every game is appended here (see gamerecord.py)
+POSITION_DB = "positions.db" # Shown in the info panel if present (see positiondb.py)
+OPENING_BOOK = "book.bin" # Used by the engine if present (see book.py)
+TABLEBASES = "tablebases" # Endgame tables used by the engine if present (see tablebase.py)
+SPRITE_CACHE = Path("images") / ".cache" # Piece images resized to SQUARE_SIZE, see cachedSprite
+
 
 # --- FIX: Updated Piece Info descriptions to match index.html ---
 PIECE_INFO = {
@@ -24,14 +37,43 @@ PIECE_INFO = {
     "S": "Soldier (S):\nMoves like a standard Pawn. One step forward, two on first move. Captures diagonally forward."
 }
 
+def cachedSprite(source, square_size):
+    """
+    Path of a PNG holding the piece image source resized for square_size.
+    Resized copies live in SPRITE_CACHE, named after the square size and
+    the source's modification time, so Tk loads them directly on later
+    starts; PIL is only imported to decode and resample on a cache miss.
+    """
+    cached = SPRITE_CACHE / f"{source.stem}-{square_size}-{source.stat().st_mtime_ns}.png"
+    if not cached.exists():
+        from PIL import Image
+
+        SPRITE_CACHE.mkdir(parents=True, exist_ok=True)
+        for stale in SPRITE_CACHE.glob(f"{source.stem}-{square_size}-*.png"):
+            stale.unlink()
+        padding = 4
+        img_size = square_size - padding * 2
+        with Image.open(source) as img:
+            img = img.resize((img_size, img_size), Image.Resampling.LANCZOS)
+        temporary = cached.with_suffix(".tmp")
+        img.save(temporary, format="PNG")
+        os.replace(temporary, cached)
+    return cached
+
 class ChessUI:
     def __init__(self, root):
         self.root = root
         self.root.title("9x9 Chess Game")
         self.root.configure(bg="#696561")
+        self.root.protocol("WM_DELETE_WINDOW", self.onClose)
         
+        self.position_db = None
+        if Path(POSITION_DB).exists():
+            from positiondb import PositionDatabase
+            self.position_db = PositionDatabase(POSITION_DB)
         self.game_state = GameState()
-        self.valid_moves = [] # Start with empty list
+        self.game_state.position_db = self.position_db
+        self.valid_moves = None # MoveIndex of the position, see getValidMoveIndex
         self.state = {"selected": (), "clicks": []}
         self.game_over = False 
         
@@ -43,6 +85,16 @@ class ChessUI:
         self.move_index = -1
         self.first_move_made = False
 
+        book = tablebase = None
+        if Path(OPENING_BOOK).exists():
+            from book import OpeningBook
+            book = OpeningBook(OPENING_BOOK)
+        if Path(TABLEBASES).is_dir():
+            from tablebase import Tablebase
+            tablebase = Tablebase(TABLEBASES)
+        self.engine = EngineWorker(Searcher(book=book, tablebase=tablebase))
+        self.engine_request = None
+
         # Main content frame
         main_frame = tk.Frame(root, bg="#696561")
         main_frame.pack(fill="both", expand=True)
@@ -71,6 +123,12 @@ class ChessUI:
         self.undo_button.pack(pady=5)
         self.redo_button = tk.Button(button_frame, text="Redo", command=self.redoMove, bg="#c27421", fg="#f5dea9")
         self.redo_button.pack(pady=5)
+        self.engine_button = tk.Button(button_frame, text="Engine Move", command=self.engineMove, bg="#c27421", fg="#f5dea9")
+        self.engine_button.pack(pady=5)
+        self.engine_label = tk.Label(button_frame, text="Engine: idle", font=("Arial", 10), bg="#f5dea9", width=30)
+        self.engine_label.pack(pady=5)
+        self.item_count_label = tk.Label(button_frame, text="Canvas items: 0", font=("Arial", 10), bg="#f5dea9")
+        self.item_count_label.pack(pady=5)
 
         #Info Panel
         info_frame = tk.Frame(frame_sidebar, bg="#f5dea9")
@@ -87,13 +145,13 @@ class ChessUI:
             
             # --- DEBUG: Wrap initial logic in try...except ---
             try:
-                self.valid_moves = self.game_state.getValidMoves()
+                self.valid_moves = self.game_state.getValidMoveIndex()
                 # --- MODIFIED: Removed stalemate check ---
                 if self.game_state.checkmate:
                     self.game_over = True
                 
                 self.drawBoard()
-                self.drawPieces(self.game_state.board)
+                self.refreshBoard()
                 self.canvas.bind("<Button-1>", self.onSquareClick_Safe) # Bind to safe wrapper
             except Exception as e:
                 self.show_error(e)
@@ -110,7 +168,7 @@ class ChessUI:
 
     def loadImages(self):
         """
-        Load images for the pieces.
+        Load images for the pieces, already resized from the sprite cache.
         """
         pieces = ['wP', 'wG', 'wV', 'wA', 'wN', 'wS', 'wB',
                   'bP', 'bG', 'bV', 'bA', 'bN', 'bS', 'bB']
@@ -119,11 +177,7 @@ class ChessUI:
             for piece in pieces:
                 img_path = image_path / f"{piece}.png"
                 if img_path.exists():
-                    img = Image.open(img_path)
-                    padding = 4 
-                    img_size = SQUARE_SIZE - padding * 2
-                    img = img.resize((img_size, img_size), Image.Resampling.LANCZOS)
-                    IMAGES[piece] = ImageTk.PhotoImage(img)
+                    IMAGES[piece] = tk.PhotoImage(file=str(cachedSprite(img_path, SQUARE_SIZE)))
                 else:
                     raise FileNotFoundError(f"Image not found: {img_path}")
         except Exception as e:
@@ -136,7 +190,9 @@ class ChessUI:
 
     def drawBoard(self):
         """
-        Draw the 9x9 chessboard.
+        Create the 9x9 chessboard once: 81 squares, then a hidden image
+        item on every square for its piece. Afterwards only drawPieces()
+        and the highlight layer change, so the canvas item count stays fixed.
         """
         colors = ["#f0d9b5", "#b58863"]
         for row in range(DIMENSION):
@@ -145,23 +201,54 @@ class ChessUI:
                 self.canvas.create_rectangle(
                     col * SQUARE_SIZE, row * SQUARE_SIZE,
                     (col + 1) * SQUARE_SIZE, (row + 1) * SQUARE_SIZE,
-                    fill=color, outline=""
+                    fill=color, outline="", tags="squares"
                 )
+        self.piece_items = [
+            [self.canvas.create_image(col * SQUARE_SIZE + SQUARE_SIZE // 2, row * SQUARE_SIZE + SQUARE_SIZE // 2,
+                                      anchor="c", state="hidden", tags="pieces")
+             for col in range(DIMENSION)]
+            for row in range(DIMENSION)
+        ]
+        # What each square's item currently shows
+        self.shown_pieces = [["--"] * DIMENSION for _ in range(DIMENSION)]
 
     def drawPieces(self, board):
         """
-        Draw the pieces on the board.
+        Bring the piece items in line with the board. Only the squares
+        whose piece changed (two or three after a move) are reconfigured.
         """
-        self.canvas.delete("pieces")
         for row in range(DIMENSION):
-            for col in range(DIMENSION):
-                piece = board[row][col]
-                if piece != "--" and piece in IMAGES:
-                    x = col * SQUARE_SIZE + SQUARE_SIZE // 2
-                    y = row * SQUARE_SIZE + SQUARE_SIZE // 2
-                    self.canvas.create_image(
-                        x, y, image=IMAGES[piece], anchor="c", tags="pieces"
-                    )
+            shown = self.shown_pieces[row]
+            for col, piece in enumerate(board[row]):
+                if piece == shown[col]:
+                    continue
+                item = self.piece_items[row][col]
+                if piece in IMAGES:
+                    self.canvas.itemconfigure(item, image=IMAGES[piece], state="normal")
+                else:
+                    self.canvas.itemconfigure(item, state="hidden")
+                shown[col] = piece
+
+    def clearHighlights(self):
+        """
+        Remove the move highlights, which all carry the "highlight" tag.
+        """
+        self.canvas.delete("highlight")
+
+    def refreshBoard(self):
+        """
+        Show the current position without highlights.
+        """
+        self.clearHighlights()
+        self.drawPieces(self.game_state.board)
+        self.updateItemCount()
+
+    def updateItemCount(self):
+        """
+        Show how many items the canvas holds: 81 squares, 81 piece items
+        and the current highlights, however long the game.
+        """
+        self.item_count_label.config(text=f"Canvas items: {len(self.canvas.find_all())}")
 
     def highlightEmptySquares(self, moves):
         """
@@ -178,7 +265,8 @@ class ChessUI:
                     center_x - dot_radius, center_y - dot_radius,
                     center_x + dot_radius, center_y + dot_radius,
                     fill="#bbbbbb", 
-                    outline=""
+                    outline="",
+                    tags="highlight"
                 )
 
     def highlightCaptureSquares(self, moves):
@@ -195,7 +283,8 @@ class ChessUI:
                     (end_col + 1) * SQUARE_SIZE - ring_thickness, 
                     (end_row + 1) * SQUARE_SIZE - ring_thickness,
                     outline="#bbbbbb", 
-                    width=ring_thickness
+                    width=ring_thickness,
+                    tags="highlight"
                 )
             
     def updateInfoPanel(self, piece=None):
@@ -209,9 +298,24 @@ class ChessUI:
             description = PIECE_INFO.get(piece_type, "No description available for this piece.")
             self.info_text.insert("1.0", description)
         else:
-            self.info_text.insert("1.0", "Click on a piece to see its move description.")
+            self.info_text.insert("1.0", "Click on a piece to see its move description." + self.positionStatsText())
         self.info_text.config(state="disabled")
 
+    def positionStatsText(self):
+        """
+        Database statistics for the current position, if a database is loaded.
+        """
+        if self.position_db is None:
+            return ""
+        moves = self.game_state.getPositionStats()
+        if not moves:
+            return "\n\nPosition not in database."
+        text = f"\n\nDatabase: {sum(stats.games for stats in moves)} games"
+        for stats in moves[:5]:
+            text += (f"\n{stats.move_id:04d}: {stats.games} games "
+                     f"+{stats.white_wins} ={stats.draws} -{stats.black_wins}")
+        return text
+
     # --- DEBUG: Create a 'safe' wrapper for the click handler ---
     def onSquareClick_Safe(self, event):
         """Wraps the main click handler in a try...except block."""
@@ -240,69 +344,146 @@ class ChessUI:
             self.state["clicks"] = []
 
             if square == selected_square: # Clicked same square
-                self.drawBoard()
-                self.drawPieces(self.game_state.board)
+                self.refreshBoard()
                 self.updateInfoPanel() # Clear info panel
                 return # Just deselect, board is cleared of highlights
 
             # Check if it's a valid move
-            move = Move(selected_square, square, self.game_state.board)
-            valid_move_found = None
-            for v_move in self.valid_moves:
-                if move == v_move:
-                    valid_move_found = v_move
-                    break
-
+            valid_move_found = self.valid_moves.find(selected_square, square)
             if valid_move_found:
-                self.game_state.makeMove(valid_move_found)
-                self.move_log = self.move_log[:self.move_index + 1]
-                self.move_log.append(valid_move_found)
-                self.move_index += 1
-                if not self.first_move_made:
-                    self.first_move_made = True
-                    self.startTimer()
-                
-                self.valid_moves = self.game_state.getValidMoves() # Get next player's moves
-                self.drawBoard()
-                self.drawPieces(self.game_state.board)
-                self.updateInfoPanel() # Clear info panel
-                
-                if self.game_state.checkmate:
-                    self.game_over = True
-                    self.timer_running = False 
-                    winner = "Black" if self.game_state.white_to_move else "White"
-                    messagebox.showinfo("Game Over", f"Checkmate! {winner} wins.")
-                # --- MODIFIED: Removed stalemate check ---
-                # elif self.game_state.stalemate:
-                #     self.game_over = True
-                #     self.timer_running = False 
-                #     messagebox.showinfo("Game Over", "Stalemate! The game is a draw.")
-                        
+                self.playMove(valid_move_found)
                 return  # Exit after making a move
         
         
         piece = self.game_state.board[row][col]
         
-        if piece != "--" and (piece[0] == 'w' if self.game_state.white_to_move else 'b'):
+        if piece != "--" and (piece[0] == 'w') == self.game_state.white_to_move:
             self.state["selected"] = square
             self.state["clicks"] = [square]
             
-            valid_moves_for_piece = [move for move in self.valid_moves if move.start_row == row and move.start_col == col]
-            
+            valid_moves_for_piece = self.valid_moves.movesFrom(square)
             empty_square_moves = [m for m in valid_moves_for_piece if m.piece_captured == "--"]
             capture_moves = [m for m in valid_moves_for_piece if m.piece_captured != "--"]
 
-            self.drawBoard()
-            self.highlightEmptySquares(empty_square_moves) 
-            self.drawPieces(self.game_state.board)
-            self.highlightCaptureSquares(capture_moves) 
+            self.clearHighlights()
+            self.highlightEmptySquares(empty_square_moves) # Dots go on empty squares, so no piece covers them
+            self.highlightCaptureSquares(capture_moves) # Rings are drawn over the pieces
+            self.updateItemCount()
             self.updateInfoPanel(piece) 
         else:
-            self.drawBoard()
-            self.drawPieces(self.game_state.board)
+            self.refreshBoard()
             self.updateInfoPanel() 
             self.state["selected"] = () 
 
+    def playMove(self, move):
+        """
+        Play a valid move on the board, from a click or from the engine.
+        """
+        self.cancelEngine()
+        self.game_state.makeMove(move)
+        self.move_log = self.move_log[:self.move_index + 1]
+        self.move_log.append(move)
+        self.move_index += 1
+        if not self.first_move_made:
+            self.first_move_made = True
+            self.startTimer()
+
+        self.valid_moves = self.game_state.getValidMoveIndex() # Get next player's moves
+        self.refreshBoard()
+        self.updateInfoPanel() # Clear info panel
+
+        if self.game_state.checkmate:
+            self.game_over = True
+            self.timer_running = False
+            winner = "Black" if self.game_state.white_to_move else "White"
+            messagebox.showinfo("Game Over", f"Checkmate! {winner} wins.")
+        # --- MODIFIED: Removed stalemate check ---
+        # elif self.game_state.stalemate:
+        #     self.game_over = True
+        #     self.timer_running = False
+        #     messagebox.showinfo("Game Over", "Stalemate! The game is a draw.")
+
+    def engineMove(self):
+        """
+        Let the engine pick a move for the side to move.
+        The search runs on the engine worker; pollEngine picks up the result.
+        """
+        try:
+            if self.game_over or self.engine_request is not None or not self.valid_moves:
+                return
+            self.state = {"selected": (), "clicks": []}
+            # The engine budgets its search from the side to move's clock
+            remaining = self.player_time if self.game_state.white_to_move else self.opponent_time
+            self.engine_request = self.engine.analyse(self.game_state, time_manager=TimeManager(max(remaining, 0)))
+            self.engine_label.config(text="Engine: thinking...")
+            self.root.after(ENGINE_POLL_MS, self.pollEngine)
+        except Exception as e:
+            self.show_error(e)
+
+    def pollEngine(self):
+        """
+        Show search progress and play the engine's move once it is done.
+        Runs every ENGINE_POLL_MS while a search is pending.
+        """
+        try:
+            if self.engine_request is None:
+                return
+            for kind, _, result in self.engine.poll():
+                if kind == "progress":
+                    self.engine_label.config(
+                        text=f"Engine: depth {result.depth}  score {result.score / 100:+.2f}  {result.nodes} nodes")
+                else:
+                    self.engine_request = None
+                    if result.from_book:
+                        self.engine_label.config(text="Engine: played a book move")
+                    elif result.from_tablebase:
+                        self.engine_label.config(text="Engine: played from the endgame tables")
+                    else:
+                        self.engine_label.config(text=f"Engine: played at depth {result.depth} ({result.nps:.0f} nodes/s)")
+                    best = result.best_move
+                    move = self.valid_moves.find((best.start_row, best.start_col), (best.end_row, best.end_col))
+                    if move is not None and not self.game_over:
+                        self.playMove(move)
+                    return
+            self.root.after(ENGINE_POLL_MS, self.pollEngine)
+        except Exception as e:
+            self.engine_request = None
+            self.show_error(e)
+
+    def cancelEngine(self):
+        """
+        Stop any pending engine search; its result will be ignored.
+        """
+        if self.engine_request is not None:
+            self.engine.cancel()
+            self.engine_request = None
+            self.engine_label.config(text="Engine: idle")
+
+    def archiveGame(self):
+        """
+        Append the moves played so far to GAME_ARCHIVE before the game is discarded.
+        """
+        moves = self.move_log[:self.move_index + 1]
+        if not moves:
+            return
+        result = RESULT_UNKNOWN
+        if self.game_state.checkmate:
+            result = RESULT_BLACK_WINS if self.game_state.white_to_move else RESULT_WHITE_WINS
+        with GameRecordWriter(GAME_ARCHIVE) as writer:
+            writer.write(moves, result)
+
+    def onClose(self):
+        """
+        Archive the game and stop the engine when the window is closed.
+        """
+        try:
+            self.cancelEngine()
+            self.archiveGame()
+        except Exception as e:
+            self.show_error(e)
+        self.engine.shutdown()
+        self.root.destroy()
+
     def startTimer(self):
         """
         Start the timer.
@@ -345,8 +526,11 @@ class ChessUI:
         """
         # --- DEBUG: Wrap in try...except ---
         try:
+            self.cancelEngine()
+            self.archiveGame()
             self.game_state = GameState()
-            self.valid_moves = self.game_state.getValidMoves()
+            self.game_state.position_db = self.position_db
+            self.valid_moves = self.game_state.getValidMoveIndex()
             self.state = {"selected": (), "clicks": []}
             self.player_time = 600
             self.opponent_time = 600
@@ -362,8 +546,7 @@ class ChessUI:
             else:
                 self.game_over = False 
                 
-            self.drawBoard()
-            self.drawPieces(self.game_state.board)
+            self.refreshBoard()
             self.player_time_label.config(text="Player Time: 10:00")
             self.opponent_time_label.config(text="Opponent Time: 10:00")
             self.updateInfoPanel() 
@@ -377,13 +560,13 @@ class ChessUI:
         # --- DEBUG: Wrap in try...except ---
         try:
             if self.move_index >= 0:
+                self.cancelEngine()
                 self.timer_running = False 
                 
                 self.game_state.undoMove()
                 self.move_index -= 1
-                self.valid_moves = self.game_state.getValidMoves()
-                self.drawBoard()
-                self.drawPieces(self.game_state.board)
+                self.valid_moves = self.game_state.getValidMoveIndex()
+                self.refreshBoard()
                 self.updateInfoPanel() 
                 self.game_over = False 
                 
@@ -401,13 +584,13 @@ class ChessUI:
         # --- DEBUG: Wrap in try...except ---
         try:
             if self.move_index < len(self.move_log) - 1:
+                self.cancelEngine()
                 self.timer_running = False 
                 
                 self.move_index += 1
                 self.game_state.makeMove(self.move_log[self.move_index]) 
-                self.valid_moves = self.game_state.getValidMoves()
-                self.drawBoard()
-                self.drawPieces(self.game_state.board)
+                self.valid_moves = self.game_state.getValidMoveIndex()
+                self.refreshBoard()
                 self.updateInfoPanel() 
                 
                 if not self.game_over:
@@ -0,0 +1,246 @@
+import argparse
+import contextlib
+import queue
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+SERVER = Path(__file__).resolve().with_name("engineserver.py")
+
+
+class EngineClient:
+    """
+    One engineserver.py process, driven over its stdin/stdout. Start-up
+    (interpreter, imports, move tables) is paid once in the constructor,
+    which waits for "uciok"; every bestMove() after that only pays for
+    its search.
+    """
+
+    def __init__(self, server_args=()):
+        self.process = subprocess.Popen([sys.executable, str(SERVER), *server_args], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, text=True, bufsize=1)
+        self.send("uci")
+        self.readUntil("uciok")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def readLine(self):
+        line = self.process.stdout.readline()
+        if not line:
+            raise ValueError(f"Engine process exited with code {self.process.wait()}")
+        return line.rstrip("\n")
+
+    def readUntil(self, prefix, callback=None):
+        """
+        Read lines up to the first that starts with prefix and return it;
+        callback(line) sees every line before it.
+        """
+        while True:
+            line = self.readLine()
+            if line.startswith(prefix):
+                return line
+            if callback is not None:
+                callback(line)
+
+    def ready(self):
+        """
+        Wait until the engine has handled everything sent so far.
+        """
+        self.send("isready")
+        self.readUntil("readyok")
+
+    def newGame(self):
+        self.send("ucinewgame")
+        self.ready()
+
+    def go(self, moves=(), fen=None, depth=None, nodes=None, movetime=None):
+        """
+        Start a search of the start position (or fen) after moves, given
+        as moveIDs; end it with stop() or wait for it with waitBestMove().
+        movetime is in milliseconds. No limit means search until stopped.
+        """
+        position = f"fen {fen}" if fen else "startpos"
+        if moves:
+            position += " moves " + " ".join(f"{move_id:04d}" for move_id in moves)
+        self.send(f"position {position}")
+        limits = [f"{name} {value}" for name, value in (("depth", depth), ("nodes", nodes), ("movetime", movetime))
+                  if value is not None]
+        self.send(" ".join(["go"] + (limits or ["infinite"])))
+
+    def waitBestMove(self, info=None):
+        """
+        The moveID the engine answers a go() with, or None if it has no
+        move. info(line) is called for each line it sends before that.
+        """
+        errors = []
+
+        def collect(line):
+            if line.startswith("info string error"):
+                errors.append(line)
+            if info is not None:
+                info(line)
+
+        move = self.readUntil("bestmove", collect).split()[1]
+        if errors:
+            raise ValueError(errors[0].removeprefix("info string error: "))
+        return None if move == "0000" else int(move)
+
+    def stop(self, info=None):
+        """
+        End the running search; returns its best move like waitBestMove().
+        """
+        self.send("stop")
+        return self.waitBestMove(info)
+
+    def bestMove(self, moves=(), fen=None, depth=None, nodes=None, movetime=None, info=None):
+        """
+        go() and waitBestMove() in one call.
+        """
+        self.go(moves, fen, depth, nodes, movetime)
+        return self.waitBestMove(info)
+
+    def close(self):
+        if self.alive:
+            try:
+                self.send("quit")
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass # Unsent input to a process that is gone
+        self.process.stdout.close()
+
+
+class EnginePool:
+    """
+    Keeps `size` engine processes started and ready, so requests never
+    wait for a process to start. engine() lends one out for a with block;
+    engines that died are replaced on return, everything else goes back
+    to the pool after a ucinewgame. Safe to use from several threads.
+    """
+
+    def __init__(self, size, server_args=()):
+        self.server_args = tuple(server_args)
+        self.idle = queue.Queue()
+        self.engines = []
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._add()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _add(self):
+        engine = EngineClient(self.server_args)
+        with self._lock:
+            self.engines.append(engine)
+        self.idle.put(engine)
+
+    @contextlib.contextmanager
+    def engine(self, timeout=None):
+        """
+        An idle EngineClient for the duration of the with block; waits
+        up to timeout seconds (forever if None) for one to come back.
+        """
+        engine = self.idle.get(timeout=timeout)
+        try:
+            yield engine
+        finally:
+            try:
+                engine.newGame()
+                self.idle.put(engine)
+            except (OSError, ValueError):
+                with self._lock:
+                    self.engines.remove(engine)
+                engine.close()
+                self._add()
+
+    def bestMove(self, moves=(), fen=None, depth=None, nodes=None, movetime=None):
+        with self.engine() as engine:
+            return engine.bestMove(moves, fen, depth, nodes, movetime)
+
+    def close(self):
+        with self._lock:
+            engines, self.engines = self.engines, []
+        for engine in engines:
+            engine.close()
+
+
+def benchmark(requests, pool_size, movetime):
+    """
+    Time the same requests answered by a fresh process each and by a warm
+    pool, and print the mean latency per request for both.
+    Returns (cold, warm) seconds per request.
+    """
+    def timed(ask):
+        begin = time.perf_counter()
+        for _ in range(requests):
+            ask()
+        return (time.perf_counter() - begin) / requests
+
+    def cold():
+        with EngineClient() as engine:
+            engine.bestMove(movetime=movetime)
+
+    cold_latency = timed(cold)
+    begin = time.perf_counter()
+    with EnginePool(pool_size) as pool:
+        warm_up = time.perf_counter() - begin
+        warm_latency = timed(lambda: pool.bestMove(movetime=movetime))
+    print(f"fresh process  {cold_latency * 1000:8.1f} ms/request")
+    print(f"warm pool      {warm_latency * 1000:8.1f} ms/request  "
+          f"({pool_size} processes started in {warm_up * 1000:.0f} ms)")
+    print(f"search time    {movetime:8d} ms/request")
+    return cold_latency, warm_latency
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Stub client for engineserver.py: ask for one move, or compare fresh processes with a warm pool.")
+    parser.add_argument("moves", nargs="*", type=int, help="moveIDs played from the start position")
+    parser.add_argument("--fen", help="start from this position instead")
+    parser.add_argument("-d", "--depth", type=int)
+    parser.add_argument("--nodes", type=int)
+    parser.add_argument("-t", "--movetime", type=int, help="milliseconds per move")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="time N requests cold and from a pool")
+    parser.add_argument("-p", "--pool", type=int, default=2, help="pool size for --benchmark")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.pool, args.movetime or 50)
+        return 0
+    if args.depth is None and args.nodes is None and args.movetime is None:
+        args.depth = 3
+    with EngineClient() as engine:
+        try:
+            move = engine.bestMove(args.moves, args.fen, args.depth, args.nodes, args.movetime, info=print)
+        except ValueError as e:
+            print(f"error: {e}")
+            return 1
+    print(f"bestmove {'none' if move is None else f'{move:04d}'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+import argparse
+import sys
+import threading
+import time
+import traceback
+
+from chessengine import GameState
+from search import DEFAULT_TABLE_MB, MATE_SCORE, MAX_PLY, TABLEBASE_WIN, Searcher, isMateScore, isTablebaseScore
+from timemanager import TimeManager
+from transposition import TranspositionTable
+
+
+ENGINE_NAME = "ModernChess"
+# Seconds between "info nodes ..." lines while an iteration is running
+INFO_INTERVAL = 1.0
+MAX_TABLE_MB = 4096
+
+
+def formatMove(move):
+    """
+    Moves on the wire are their 4-digit moveID: start row, start col,
+    end row, end col (row 0 is Black's back rank). "0000" means no move.
+    """
+    return "0000" if move is None else f"{move.moveID:04d}"
+
+
+def formatScore(score):
+    """
+    "cp N" from the side to move's point of view, or "mate N" in moves
+    (negative when the side to move gets mated). Endgame table scores
+    count their plies from the position that was probed, not the root,
+    so their "mate N" is the nearest the mate can be.
+    """
+    if isMateScore(score):
+        plies = MATE_SCORE - abs(score)
+    elif isTablebaseScore(score):
+        plies = TABLEBASE_WIN - abs(score) + 1  # At least one ply to reach the probed position
+    else:
+        return f"cp {score}"
+    moves = (plies + 1) // 2
+    return f"mate {moves if score > 0 else -moves}"
+
+
+class EngineServer:
+    """
+    The engine behind a line-based protocol modelled on UCI, adapted to
+    the 9x9 board. Commands arrive one per line on input, replies go to
+    output:
+
+        uci                          -> id lines, options, "uciok"
+        isready                      -> "readyok"
+        setoption name Hash value N  transposition table size in MB
+        ucinewgame                   clear the transposition table
+        position startpos [moves M...]
+        position fen FEN [moves M...]
+        go [depth N] [nodes N] [movetime MS] [infinite]
+           [wtime MS btime MS] [winc MS] [binc MS] [movestogo N]
+                                     -> "info ..." lines, then "bestmove M"
+        stop                         end the search, "bestmove" follows
+        quit
+
+    Moves are moveIDs (see formatMove). Errors are reported as
+    "info string error: ..." lines; a "go" after a position that was
+    rejected answers "bestmove 0000" straight away. The search runs on a thread, so
+    stop, isready and quit are answered while it runs. An "info depth"
+    line follows every completed iteration, and an "info nodes" line
+    every INFO_INTERVAL seconds in between.
+    """
+
+    def __init__(self, input=sys.stdin, output=sys.stdout, table_mb=DEFAULT_TABLE_MB, book=None, tablebase=None):
+        self.input = input
+        self.output = output
+        self.searcher = Searcher(table=TranspositionTable(table_mb), book=book, tablebase=tablebase)
+        self.game_state = GameState()
+        self.search_thread = None
+        self._stop_event = threading.Event()
+        self._output_lock = threading.Lock()
+
+    def send(self, line):
+        with self._output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self):
+        """
+        Serve commands until "quit" or the end of input.
+        """
+        for line in self.input:
+            if not self.handle(line):
+                break
+        self.stopSearch()
+
+    def handle(self, line):
+        """
+        Carry out one command line. Returns False on "quit".
+        Errors are reported as "info string" lines, never raised.
+        """
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        try:
+            if command == "quit":
+                return False
+            if command == "uci":
+                self.send(f"id name {ENGINE_NAME}")
+                self.send("id author ModernChess contributors")
+                self.send(f"option name Hash type spin default {DEFAULT_TABLE_MB} min 1 max {MAX_TABLE_MB}")
+                self.send("uciok")
+            elif command == "isready":
+                self.send("readyok")
+            elif command == "setoption":
+                self.stopSearch()
+                self.setOption(args)
+            elif command == "ucinewgame":
+                self.stopSearch()
+                self.searcher.table.clear()
+            elif command == "position":
+                self.stopSearch()
+                # A position that fails to parse leaves none, so the next
+                # "go" is refused instead of searching the previous one
+                self.game_state = None
+                self.game_state = self.parsePosition(args)
+            elif command == "go":
+                self.stopSearch()
+                if self.game_state is None:
+                    self.send("info string error: no valid position set")
+                    self.send("bestmove 0000")
+                else:
+                    self.startSearch(**self.parseGo(args))
+            elif command == "stop":
+                self.stopSearch()
+            else:
+                raise ValueError(f"unknown command '{command}'")
+        except ValueError as e:
+            self.send(f"info string error: {e}")
+        return True
+
+    def setOption(self, args):
+        text = " ".join(args)
+        name, _, value = text.partition(" value ")
+        name = name.removeprefix("name ").strip()
+        if name.lower() != "hash":
+            raise ValueError(f"unknown option '{name}'")
+        table_mb = int(value)
+        if not 1 <= table_mb <= MAX_TABLE_MB:
+            raise ValueError(f"Hash must be between 1 and {MAX_TABLE_MB}")
+        self.searcher.table = TranspositionTable(table_mb)
+
+    def parsePosition(self, args):
+        """
+        A GameState from "startpos [moves ...]" or "fen FEN [moves ...]".
+        """
+        if "moves" in args:
+            split = args.index("moves")
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+        if setup == ["startpos"]:
+            game_state = GameState()
+        elif setup and setup[0] == "fen":
+            game_state = GameState.fromFEN(" ".join(setup[1:]))
+        else:
+            raise ValueError("expected 'position startpos' or 'position fen FEN'")
+        for text in moves:
+            valid = {formatMove(move): move for move in game_state.getValidMoves()}
+            if text not in valid:
+                raise ValueError(f"illegal move {text} after {len(game_state.move_log)} plies")
+            game_state.makeMove(valid[text])
+        # The search only needs the position, not how it was reached
+        return GameState.fromSnapshot(game_state.snapshot())
+
+    def parseGo(self, args):
+        """
+        Search limits from "go" arguments: max_depth, node_limit,
+        time_limit (seconds) and a time_manager for the side to move's
+        clock. No limit at all, or "infinite", searches until "stop":
+        infinite is then set, and "bestmove" waits for the "stop" even if
+        the search ends first (a mate found, MAX_PLY reached).
+        """
+        limits = {"max_depth": MAX_PLY, "node_limit": None, "time_limit": None, "time_manager": None,
+                  "infinite": False}
+        names = {"depth": "max_depth", "nodes": "node_limit", "movetime": "time_limit"}
+        clock = {}
+        words = iter(args)
+        for word in words:
+            if word == "infinite":
+                limits["infinite"] = True
+                continue
+            if word not in names and word not in ("wtime", "btime", "winc", "binc", "movestogo"):
+                raise ValueError(f"unknown go argument '{word}'")
+            value = next(words, None)
+            if value is None or not value.lstrip("-").isdigit():
+                raise ValueError(f"go {word} needs a number")
+            if word in names:
+                if int(value) <= 0:
+                    raise ValueError(f"go {word} needs a positive number")
+                limits[names[word]] = int(value) / 1000 if word == "movetime" else int(value)
+            else:
+                clock[word] = int(value)
+        limits["max_depth"] = min(limits["max_depth"], MAX_PLY)
+        side = "w" if self.game_state.white_to_move else "b"
+        if side + "time" in clock:
+            limits["time_manager"] = TimeManager(max(clock[side + "time"], 0) / 1000,
+                                                 max(clock.get(side + "inc", 0), 0) / 1000,
+                                                 clock.get("movestogo"))
+        if (limits["max_depth"] == MAX_PLY and limits["node_limit"] is None and limits["time_limit"] is None
+                and limits["time_manager"] is None):
+            limits["infinite"] = True
+        return limits
+
+    def startSearch(self, max_depth, time_limit, node_limit, time_manager, infinite=False):
+        self._stop_event.clear()
+        finished = threading.Event()
+        reporter = threading.Thread(target=self._reportProgress, args=(finished, time.perf_counter()),
+                                    name="engine-info", daemon=True)
+        self.search_thread = threading.Thread(
+            target=self._search,
+            args=(self.game_state, max_depth, time_limit, node_limit, time_manager, infinite, finished, reporter),
+            name="engine-search", daemon=True)
+        reporter.start()
+        self.search_thread.start()
+
+    def stopSearch(self):
+        """
+        Stop a running search and wait for its "bestmove".
+        """
+        if self.search_thread is not None:
+            self._stop_event.set()
+            # Asked again until it ends: a stop that lands before the
+            # search has reset its limits would otherwise be lost
+            while self.search_thread.is_alive():
+                self.searcher.stop()
+                self.search_thread.join(0.05)
+            self.search_thread = None
+
+    def _search(self, game_state, max_depth, time_limit, node_limit, time_manager, infinite, finished, reporter):
+        def progress(result):
+            self.send(f"info depth {result.depth} score {formatScore(result.score)} nodes {result.nodes} "
+                      f"nps {result.nps:.0f} time {result.elapsed * 1000:.0f} pv {formatMove(result.best_move)}")
+
+        result = error = None
+        try:
+            result = self.searcher.search(game_state, max_depth, time_limit, node_limit, progress,
+                                          time_manager=time_manager)
+        except Exception as e:
+            # A client waits for "bestmove", so a failed search still answers
+            error = e
+            traceback.print_exc(file=sys.stderr)
+        finally:
+            finished.set()
+            reporter.join() # No progress line after "bestmove"
+        if infinite:
+            self._stop_event.wait() # UCI: "bestmove" only after "stop"
+        if error is not None:
+            self.send(f"info string error: search failed: {error!r}")
+            self.send("bestmove 0000")
+            return
+        if result.from_book or result.from_tablebase:
+            source = "opening book" if result.from_book else "endgame tables"
+            self.send(f"info string move from the {source}")
+        self.send(f"bestmove {formatMove(result.best_move)}")
+
+    def _reportProgress(self, finished, start):
+        while not finished.wait(INFO_INTERVAL):
+            nodes = self.searcher.nodes
+            elapsed = time.perf_counter() - start
+            self.send(f"info nodes {nodes} nps {nodes / elapsed:.0f} time {elapsed * 1000:.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Engine process speaking a UCI-style protocol on stdin/stdout.")
+    parser.add_argument("--table-mb", type=float, default=DEFAULT_TABLE_MB, help="transposition table size")
+    parser.add_argument("--book", help="opening book file, see book.py")
+    parser.add_argument("--tablebases", help="endgame table directory, see tablebase.py")
+    args = parser.parse_args(argv)
+
+    book = tablebase = None
+    if args.book:
+        from book import OpeningBook
+        book = OpeningBook(args.book)
+    if args.tablebases:
+        from tablebase import Tablebase
+        tablebase = Tablebase(args.tablebases)
+    EngineServer(table_mb=args.table_mb, book=book, tablebase=tablebase).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
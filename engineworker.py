@@ -0,0 +1,98 @@
+import copy
+import queue
+import threading
+
+from search import Searcher
+
+
+class EngineWorker:
+    """
+    Runs searches on a background thread so the caller's thread
+    (the Tk event loop) never blocks.
+
+    Requests go in through analyse(); messages come back through poll(),
+    which never blocks and is meant to be called from root.after:
+        ("progress", request_id, SearchResult) after each completed depth
+        ("result", request_id, SearchResult) when the search is done
+    Only the most recent request counts: starting a new one or calling
+    cancel() stops the running search, and messages from older
+    requests are dropped by poll().
+    """
+
+    def __init__(self, searcher=None):
+        self.searcher = searcher if searcher is not None else Searcher()
+        self.requests = queue.Queue()
+        self.responses = queue.Queue()
+        self.current_request = 0
+        self._lock = threading.Lock()
+        self._searching = False
+        self.thread = threading.Thread(target=self._run, name="engine-worker", daemon=True)
+        self.thread.start()
+
+    def analyse(self, game_state, max_depth=64, time_limit=None, node_limit=None, time_manager=None):
+        """
+        Start searching a copy of game_state, cancelling any running search.
+        The copy is rebuilt from a snapshot, so the search starts with an
+        empty move log. time_manager (timemanager.TimeManager) budgets
+        the search from a clock instead of a fixed time.
+        Returns the request id that its messages will carry.
+        """
+        with self._lock:
+            self.current_request += 1
+            request_id = self.current_request
+        self.searcher.stop()
+        position = type(game_state).fromSnapshot(game_state.snapshot())
+        self.requests.put((request_id, position, max_depth, time_limit, node_limit, time_manager))
+        return request_id
+
+    def cancel(self):
+        """
+        Stop the running search and discard anything it still reports.
+        """
+        with self._lock:
+            self.current_request += 1
+        self.searcher.stop()
+
+    @property
+    def busy(self):
+        return not self.requests.empty() or self._searching
+
+    def poll(self):
+        """
+        Messages for the current request received since the last poll.
+        """
+        messages = []
+        while True:
+            try:
+                message = self.responses.get_nowait()
+            except queue.Empty:
+                return messages
+            if message[1] == self.current_request:
+                messages.append(message)
+
+    def shutdown(self):
+        self.cancel()
+        self.requests.put(None)
+
+    def _run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            request_id, game_state, max_depth, time_limit, node_limit, time_manager = request
+            if request_id != self.current_request:
+                continue # Superseded while queued
+
+            def progress(result):
+                if request_id != self.current_request:
+                    # Cancelled just as the search started
+                    self.searcher.stop()
+                self.responses.put(("progress", request_id, copy.copy(result)))
+
+            self._searching = True
+            try:
+                result = self.searcher.search(game_state, max_depth, time_limit, node_limit, progress,
+                                              time_manager=time_manager)
+            finally:
+                self._searching = False
+            self.responses.put(("result", request_id, result))
@@ -0,0 +1,130 @@
+from chessengine import _piecePatterns
+
+
+# Piece values in centipawns (a Soldier is 100).
+# The President is never captured, so it carries no material value.
+PIECE_VALUES = {
+    "P": 0,
+    "G": 700,   # Slides N, NE, NW, E plus one step S
+    "V": 600,   # Slides S, SE, SW, E, W plus one step N, mostly backward
+    "A": 550,   # Slides on all 4 diagonals and N, not bound to one color
+    "N": 250,   # Jumps two squares diagonally, only reaches a quarter of the board
+    "B": 500,   # Slides N, S, E, W like a Rook
+    "S": 100,
+}
+
+# Centipawns per square a piece can step into (see mobilityScore)
+MOBILITY_WEIGHT = 4
+
+
+def _buildPieceSquareTables():
+    """
+    Piece-square bonuses in centipawns, table[piece_type][row][col] from
+    White's side (row 0 is Black's back rank); Black reads them with the
+    rows flipped. Pieces like the centre, the Navy Seal most since it
+    only jumps; Soldiers gain as they advance; the President prefers to
+    stay home.
+    """
+    centre = [[4 - max(abs(row - 4), abs(col - 4)) for col in range(9)] for row in range(9)]
+    bonuses = {
+        "P": lambda row, col: -4 * (8 - row),
+        "G": lambda row, col: 3 * centre[row][col],
+        "V": lambda row, col: 3 * centre[row][col],
+        "A": lambda row, col: 3 * centre[row][col],
+        "N": lambda row, col: 5 * centre[row][col],
+        "B": lambda row, col: 3 * centre[row][col],
+        "S": lambda row, col: 6 * (7 - row) + centre[row][col],
+    }
+    return {piece_type: tuple(tuple(bonus(row, col) for col in range(9)) for row in range(9))
+            for piece_type, bonus in bonuses.items()}
+
+
+PIECE_SQUARE_TABLES = _buildPieceSquareTables()
+# The same for each colored piece by square index (row * 9 + col), as
+# GameState keeps running totals of them
+PIECE_SQUARE_VALUES = {
+    color + piece_type: [table[row if color == 'w' else 8 - row][col] for row in range(9) for col in range(9)]
+    for color in "wb" for piece_type, table in PIECE_SQUARE_TABLES.items()
+}
+
+# Mobility directions per color: the first square of each slide and every
+# step or jump. Soldiers and the President don't count.
+MOBILITY_DIRECTIONS = {
+    is_white: {piece_type: tuple(slides) + tuple(steps)
+               for piece_type, (slides, steps) in _piecePatterns(is_white).items() if piece_type not in "PS"}
+    for is_white in (True, False)
+}
+
+
+def materialScore(board):
+    """
+    White material minus black material.
+    """
+    score = 0
+    for row in board:
+        for piece in row:
+            if piece != "--":
+                if piece[0] == 'w':
+                    score += PIECE_VALUES[piece[1]]
+                else:
+                    score -= PIECE_VALUES[piece[1]]
+    return score
+
+
+def pieceSquareScore(board):
+    """
+    White piece-square bonuses minus black ones.
+    """
+    score = 0
+    for row in range(9):
+        for col, piece in enumerate(board[row]):
+            if piece != "--":
+                if piece[0] == 'w':
+                    score += PIECE_SQUARE_TABLES[piece[1]][row][col]
+                else:
+                    score -= PIECE_SQUARE_TABLES[piece[1]][8 - row][col]
+    return score
+
+
+def mobilityScore(board):
+    """
+    A cheap stand-in for mobility: for every piece, the squares one step
+    along each of its directions (the first square of a slide, a step or
+    a jump) that are on the board and don't hold a piece of its own color.
+    White's count minus Black's, times MOBILITY_WEIGHT.
+    """
+    count = 0
+    for row in range(9):
+        for col, piece in enumerate(board[row]):
+            if piece == "--" or piece[1] in "PS":
+                continue
+            color = piece[0]
+            free = 0
+            for d_row, d_col in MOBILITY_DIRECTIONS[color == 'w'][piece[1]]:
+                end_row, end_col = row + d_row, col + d_col
+                if 0 <= end_row < 9 and 0 <= end_col < 9 and board[end_row][end_col][0] != color:
+                    free += 1
+            count += free if color == 'w' else -free
+    return count * MOBILITY_WEIGHT
+
+
+def evaluate(game_state):
+    """
+    Static evaluation in centipawns from the side to move's point of view:
+    material and piece-square bonuses. Both are the running totals
+    GameState keeps in makeMove/undoMove, so a leaf costs O(1) and never
+    looks at the board.
+    """
+    material, piece_square = game_state.material, game_state.piece_square
+    score = material['w'] - material['b'] + piece_square['w'] - piece_square['b']
+    return score if game_state.white_to_move else -score
+
+
+def evaluateWithMobility(game_state):
+    """
+    evaluate() plus the mobility proxy. Opt-in: mobility scans the whole
+    board, so it costs several times evaluate() per leaf
+    (match.py --engine-a eval=evaluation:evaluateWithMobility).
+    """
+    mobility = mobilityScore(game_state.board)
+    return evaluate(game_state) + (mobility if game_state.white_to_move else -mobility)
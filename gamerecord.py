@@ -0,0 +1,284 @@
+import argparse
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from array import array
+
+from chessengine import GameState, SNAPSHOT_SIZE
+
+
+# File layout: MAGIC, then records back to back. Each record is a header
+#   uint16 number of moves, uint8 result, uint8 flags
+# followed by an 81-byte start snapshot if FLAG_START_POSITION is set,
+# then one little-endian uint16 Move.moveID (at most 8888) per move.
+MAGIC = b"MCGR\x01"
+_HEADER = struct.Struct("<HBB")
+FLAG_START_POSITION = 0x01
+MAX_MOVES = 0xFFFF
+
+RESULT_UNKNOWN = 0
+RESULT_WHITE_WINS = 1
+RESULT_BLACK_WINS = 2
+RESULT_DRAW = 3
+RESULTS = {RESULT_UNKNOWN: "*", RESULT_WHITE_WINS: "1-0", RESULT_BLACK_WINS: "0-1", RESULT_DRAW: "1/2-1/2"}
+RESULT_CODES = {text: code for code, text in RESULTS.items()}
+
+_SWAP_BYTES = sys.byteorder != "little"
+
+# Every moveID between two squares of the board
+_MOVE_IDS = frozenset(start_row * 1000 + start_col * 100 + end_row * 10 + end_col
+                      for start_row in range(9) for start_col in range(9)
+                      for end_row in range(9) for end_col in range(9))
+
+
+class GameRecord:
+    """
+    One stored game: result code, optional start snapshot (None for the
+    normal start position) and the moveIDs as an array('H').
+    index is the record's position in its file.
+    """
+    __slots__ = ("index", "result", "start", "move_ids")
+
+    def __init__(self, index, result, start, move_ids):
+        self.index = index
+        self.result = result
+        self.start = start
+        self.move_ids = move_ids
+
+    def __repr__(self):
+        return f"GameRecord(#{self.index}, {RESULTS.get(self.result, '?')}, {len(self.move_ids)} moves)"
+
+
+class GameRecordWriter:
+    """
+    Appends games to a record file, creating it if needed.
+    Use as a context manager or call close().
+    """
+
+    def __init__(self, path):
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, "rb") as existing:
+                if existing.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} is not a game record file")
+        self.file = open(path, "ab")
+        if not exists:
+            self.file.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, moves, result=RESULT_UNKNOWN, start=None):
+        """
+        Append one game. moves are Move objects or moveIDs; result is a
+        RESULT_* code or its text ("1-0", "0-1", "1/2-1/2", "*"); start is
+        a GameState.snapshot() if the game did not begin from the start
+        position. The record is written with a single write() call.
+        """
+        move_ids = array("H", (move if isinstance(move, int) else move.moveID for move in moves))
+        if len(move_ids) > MAX_MOVES:
+            raise ValueError(f"Game too long for a record: {len(move_ids)} moves")
+        if isinstance(result, str):
+            result = RESULT_CODES[result]
+        if start is not None and len(start) != SNAPSHOT_SIZE:
+            raise ValueError(f"Start position must be a {SNAPSHOT_SIZE}-byte snapshot")
+        if _SWAP_BYTES:
+            move_ids.byteswap()
+        flags = FLAG_START_POSITION if start is not None else 0
+        data = _HEADER.pack(len(move_ids), result, flags) + (bytes(start) if start is not None else b"")
+        self.file.write(data + move_ids.tobytes())
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def readRecords(path, buffer_size=1 << 20):
+    """
+    Yield the GameRecords of a file one at a time. Memory use is one read
+    buffer plus the current record, however large the file. Raises
+    ValueError on a bad header or a truncated last record.
+    """
+    with open(path, "rb", buffering=buffer_size) as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a game record file")
+        index = 0
+        while True:
+            header = file.read(_HEADER.size)
+            if not header:
+                return
+            if len(header) < _HEADER.size:
+                raise ValueError(f"Truncated header in record {index}")
+            count, result, flags = _HEADER.unpack(header)
+            start = None
+            if flags & FLAG_START_POSITION:
+                start = file.read(SNAPSHOT_SIZE)
+                if len(start) < SNAPSHOT_SIZE:
+                    raise ValueError(f"Truncated start position in record {index}")
+            data = file.read(count * 2)
+            if len(data) < count * 2:
+                raise ValueError(f"Truncated moves in record {index}")
+            move_ids = array("H")
+            move_ids.frombytes(data)
+            if _SWAP_BYTES:
+                move_ids.byteswap()
+            yield GameRecord(index, result, start, move_ids)
+            index += 1
+
+
+def checkFormat(records):
+    """
+    Pipeline stage: pass records through, flagging moveIDs that are not
+    two squares on the board. Yields (record, error or None).
+    Fast enough to run at disk speed.
+    """
+    for record in records:
+        error = None
+        if record.result not in RESULTS:
+            error = f"unknown result code {record.result}"
+        elif not _MOVE_IDS.issuperset(record.move_ids):
+            ply = next(ply for ply, move_id in enumerate(record.move_ids) if move_id not in _MOVE_IDS)
+            error = f"ply {ply}: {record.move_ids[ply]} is not a move"
+        yield record, error
+
+
+def playRecord(game_state, record, start_position):
+    """
+    Load the record's start position (start_position is the snapshot to
+    use when it has none) and play its moves on game_state, yielding
+    each move just before it is made. Raises ValueError at the first
+    illegal move.
+    """
+    game_state.loadSnapshot(record.start if record.start is not None else start_position)
+    for ply, move_id in enumerate(record.move_ids):
+        start_row, start_col = move_id // 1000, move_id // 100 % 10
+        move = next((m for m in game_state.getValidMovesFrom(start_row, start_col) if m.moveID == move_id), None)
+        if move is None:
+            raise ValueError(f"ply {ply}: {move_id} is illegal")
+        yield move
+        game_state.makeMove(move)
+
+
+def replay(checked, backend=GameState):
+    """
+    Pipeline stage: replay each well-formed record through makeMove,
+    checking every move is legal in its position. Yields
+    (record, error or None, final GameState); the GameState is reused
+    for the next record, so copy it if it has to be kept.
+    """
+    game_state = backend()
+    start_position = game_state.snapshot()
+    for record, error in checked:
+        if error is None:
+            try:
+                for _ in playRecord(game_state, record, start_position):
+                    pass
+                error = _checkResult(record, game_state)
+            except ValueError as e:
+                error = str(e)
+        yield record, error, game_state
+
+
+def _checkResult(record, game_state):
+    """
+    A game that ends in checkmate must be recorded as won by the
+    side that gave it; other results (adjudications) can't be checked.
+    """
+    game_state.getValidMoves()
+    if not game_state.checkmate:
+        return None
+    expected = RESULT_BLACK_WINS if game_state.white_to_move else RESULT_WHITE_WINS
+    if record.result != expected:
+        return f"ends in checkmate but is recorded as {RESULTS[record.result]}"
+    return None
+
+
+def validate(path, quick=False, report=print):
+    """
+    Check every record in a file and report the bad ones.
+    quick only checks the format, without replaying moves.
+    Returns (games, moves, errors).
+    """
+    games = moves = errors = 0
+    begin = time.perf_counter()
+    stage = checkFormat(readRecords(path))
+    if not quick:
+        stage = ((record, error) for record, error, _ in replay(stage))
+    for record, error in stage:
+        games += 1
+        moves += len(record.move_ids)
+        if error is not None:
+            errors += 1
+            report(f"record {record.index}: {error}")
+    elapsed = time.perf_counter() - begin
+    size = os.path.getsize(path)
+    report(f"{games} games, {moves} moves, {errors} invalid in {elapsed:.2f}s "
+           f"({games / max(elapsed, 1e-9):.0f} games/s, {moves / max(elapsed, 1e-9):.0f} moves/s, "
+           f"{size / max(elapsed, 1e-9) / 1e6:.1f} MB/s)")
+    return games, moves, errors
+
+
+def _validateFile(task):
+    path, quick = task
+    lines = []
+    counts = validate(path, quick, lines.append)
+    return path, counts, lines
+
+
+def convertMatchLog(source, path):
+    """
+    Append the games of a match.py JSON-lines log to a record file.
+    Returns the number of games converted.
+    """
+    count = 0
+    with open(source) as lines, GameRecordWriter(path) as writer:
+        for line in lines:
+            game = json.loads(line)
+            move_ids = [int(move_id) for move_id in (game["opening"] + " " + game["moves"]).split()]
+            writer.write(move_ids, game["result"])
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Game record files: validate, convert, list.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("validate", help="replay every game and report illegal ones")
+    check.add_argument("files", nargs="+")
+    check.add_argument("--quick", action="store_true", help="check the format only, don't replay")
+    check.add_argument("-j", "--jobs", type=int, default=1, help="validate this many files at once")
+    convert = commands.add_parser("convert", help="append the games of a match.py JSON-lines log")
+    convert.add_argument("source")
+    convert.add_argument("destination")
+    listing = commands.add_parser("list", help="print the games of a file")
+    listing.add_argument("file")
+    args = parser.parse_args(argv)
+
+    if args.command == "validate":
+        errors = 0
+        tasks = [(path, args.quick) for path in args.files]
+        with multiprocessing.Pool(min(args.jobs, len(tasks))) as pool:
+            for path, counts, lines in pool.imap(_validateFile, tasks):
+                for line in lines:
+                    print(f"{path}: {line}")
+                errors += counts[2]
+        return 1 if errors else 0
+    if args.command == "convert":
+        print(f"{convertMatchLog(args.source, args.destination)} games appended to {args.destination}")
+        return 0
+    for record in readRecords(args.file):
+        start = f" from {GameState.fromSnapshot(record.start).toFEN()}" if record.start is not None else ""
+        print(f"{record.index} {RESULTS.get(record.result, '?')}{start}: {' '.join(map(str, record.move_ids))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import argparse
+import subprocess
+import sys
+
+
+# Cumulative import time allowed per module in milliseconds, measured
+# with python -X importtime in a fresh interpreter (best of several runs).
+# Most of chessengine's time is building its move tables.
+BUDGETS = {
+    "chessengine": 150,
+    "evaluation": 170,
+    "search": 250,
+    "engineworker": 250,
+    "engineserver": 250,
+    "match": 400,
+    "chessui": 500,
+}
+
+# Modules none of the engine modules may pull in: the GUI and the
+# optional extras are only imported where they are used
+ENGINE_FORBIDDEN = ("tkinter", "_tkinter", "PIL", "numpy", "chessui")
+FORBIDDEN = {
+    "chessengine": ENGINE_FORBIDDEN,
+    "evaluation": ENGINE_FORBIDDEN,
+    "search": ENGINE_FORBIDDEN,
+    "engineworker": ENGINE_FORBIDDEN,
+    "engineserver": ENGINE_FORBIDDEN,
+    "match": ENGINE_FORBIDDEN,
+    "chessui": ("PIL", "numpy", "positiondb", "book", "tablebase"),
+}
+
+
+def measureImport(module, runs=5):
+    """
+    Import the module in `runs` fresh interpreters with -X importtime.
+    Returns (best cumulative time in ms, {imported module: self time in ms})
+    with the self times of the fastest run.
+    """
+    best = None
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                 capture_output=True, text=True)
+        if process.returncode != 0:
+            raise ValueError(f"Importing {module} failed:\n{process.stderr}")
+        self_times = {}
+        total = None
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            if not self_us.strip().isdigit():
+                continue  # the column header
+            name = name.strip()
+            self_times[name] = int(self_us) / 1000
+            if name == module:
+                total = int(cumulative_us) / 1000
+        if total is None:
+            raise ValueError(f"No import time reported for {module}")
+        if best is None or total < best[0]:
+            best = total, self_times
+    return best
+
+
+def checkBudgets(modules, runs=5, top=5):
+    """
+    Measure each module against BUDGETS and FORBIDDEN, printing its time,
+    the slowest modules it imports and any problems. Returns the number
+    of modules over budget or importing something forbidden.
+    """
+    failures = 0
+    for module in modules:
+        total, self_times = measureImport(module, runs)
+        budget = BUDGETS.get(module)
+        forbidden = [name for name in FORBIDDEN.get(module, ()) if name in self_times]
+        over = budget is not None and total > budget
+        status = "OVER BUDGET" if over else "ok"
+        print(f"{module:<14} {total:7.1f}ms  budget {budget if budget is not None else '-':>4}ms  {status}")
+        slowest = sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:top]
+        print("    slowest: " + ", ".join(f"{name} {ms:.1f}ms" for name, ms in slowest))
+        if forbidden:
+            print(f"    imports {', '.join(forbidden)}")
+        failures += over or bool(forbidden)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check module import times against their budgets.")
+    parser.add_argument("modules", nargs="*", help=f"modules to check (default: {' '.join(BUDGETS)})")
+    parser.add_argument("-r", "--runs", type=int, default=5, help="fresh interpreters per module, best run counts")
+    parser.add_argument("--top", type=int, default=5, help="slowest imported modules to show")
+    args = parser.parse_args(argv)
+    failures = checkBudgets(args.modules or list(BUDGETS), args.runs, args.top)
+    if failures:
+        print(f"{failures} modules failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+import argparse
+import importlib
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+from book import OpeningBook
+from chessengine import GameState
+from evaluation import materialScore
+from gamerecord import GameRecordWriter
+from search import DEFAULT_TABLE_MB, MAX_PLY, Searcher
+from timemanager import DEFAULT_OVERHEAD, Clock
+from transposition import TranspositionTable
+
+
+# Keys accepted in --engine-a / --engine-b
+ENGINE_OPTIONS = {
+    "time": float,      # seconds per move
+    "nodes": int,       # nodes per move
+    "depth": int,       # fixed depth per move
+    "table_mb": float,  # transposition table size
+    "eval": str,        # evaluation function as module:function
+    "book": str,        # opening book file, see book.py
+    "tablebases": str,  # endgame table directory, see tablebase.py
+    "clock": float,     # seconds for the whole game, spent by timemanager.py
+    "increment": float, # seconds added to the clock per move
+    "overhead": float,  # seconds the time manager keeps back per move
+    "early_stop": int,  # 0 to always use the full soft limit
+}
+
+DEFAULT_ENGINE = {"time": None, "nodes": None, "depth": None, "table_mb": DEFAULT_TABLE_MB / 4,
+                  "eval": "evaluation:evaluate", "book": None, "tablebases": None,
+                  "clock": None, "increment": 0.0, "overhead": DEFAULT_OVERHEAD, "early_stop": 1}
+
+DEFAULT_ADJUDICATION = {
+    "max_plies": 300,
+    "resign_score": 1000,
+    "resign_moves": 4,
+    "draw_score": 20,
+    "draw_moves": 10,
+    "draw_after": 80,
+}
+
+
+def parseEngine(text, defaults):
+    """
+    Engine settings from "key=value,key=value" (see ENGINE_OPTIONS),
+    on top of the shared defaults.
+    """
+    engine = dict(defaults)
+    for item in filter(None, text.split(",")):
+        key, _, value = item.partition("=")
+        if key not in ENGINE_OPTIONS or not value:
+            raise ValueError(f"Invalid engine option '{item}', expected one of {sorted(ENGINE_OPTIONS)}")
+        engine[key] = ENGINE_OPTIONS[key](value)
+    return engine
+
+
+def _loadEvaluate(spec):
+    module_name, _, function_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), function_name or "evaluate")
+
+
+def randomOpening(rng, plies, max_imbalance=100):
+    """
+    moveIDs of a random opening of the given length that leaves
+    material roughly level and the side to move with a legal move.
+    """
+    while True:
+        game_state = GameState()
+        opening = []
+        for _ in range(plies):
+            moves = game_state.getValidMoves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            game_state.makeMove(move)
+            opening.append(move.moveID)
+        if (len(opening) == plies and game_state.getValidMoves()
+                and abs(materialScore(game_state.board)) <= max_imbalance):
+            return opening
+
+
+def _adjudicate(scores, adjudication):
+    """
+    Result from the recent search scores (white's point of view),
+    or None to play on.
+    """
+    resign_plies = 2 * adjudication["resign_moves"]
+    if resign_plies and len(scores) >= resign_plies:
+        recent = scores[-resign_plies:]
+        if all(score >= adjudication["resign_score"] for score in recent):
+            return "1-0", "adjudicated win"
+        if all(score <= -adjudication["resign_score"] for score in recent):
+            return "0-1", "adjudicated win"
+    draw_plies = 2 * adjudication["draw_moves"]
+    if draw_plies and len(scores) >= max(draw_plies, adjudication["draw_after"]):
+        if all(abs(score) <= adjudication["draw_score"] for score in scores[-draw_plies:]):
+            return "1/2-1/2", "adjudicated draw"
+    return None
+
+
+def playGame(task):
+    """
+    Play one game from an opening; runs in a worker process.
+    Engines with a clock search under a time manager, are charged the
+    wall time of each move and lose on time if their flag falls.
+    Returns the game record as a dict.
+    """
+    index, opening, engines, adjudication = task
+    game_state = GameState()
+    for move_id in opening:
+        game_state.makeMove(next(m for m in game_state.getValidMoves() if m.moveID == move_id))
+
+    players = {}
+    for is_white, engine in zip((True, False), engines):
+        book = OpeningBook(engine["book"]) if engine["book"] else None
+        tablebase = None
+        if engine["tablebases"]:
+            from tablebase import Tablebase
+            tablebase = Tablebase(engine["tablebases"])
+        searcher = Searcher(_loadEvaluate(engine["eval"]), TranspositionTable(engine["table_mb"]), book, tablebase)
+        clock = Clock(engine["clock"], engine["increment"]) if engine["clock"] is not None else None
+        players[is_white] = (searcher, engine, clock)
+
+    seen = {}
+    scores = []
+    moves = []
+    nodes = 0
+    time_used = {True: 0.0, False: 0.0}
+    outcome = None
+    while outcome is None:
+        key = game_state.zobrist_key
+        seen[key] = seen.get(key, 0) + 1
+        if not game_state.getValidMoves():
+            if game_state.checkmate:
+                outcome = ("0-1" if game_state.white_to_move else "1-0"), "checkmate"
+            else:
+                outcome = "1/2-1/2", "no legal moves"
+            break
+        if seen[key] >= 3:
+            outcome = "1/2-1/2", "repetition"
+            break
+        if len(opening) + len(moves) >= adjudication["max_plies"]:
+            outcome = "1/2-1/2", "move limit"
+            break
+
+        searcher, engine, clock = players[game_state.white_to_move]
+        time_manager = None
+        if clock is not None:
+            time_manager = clock.timeManager(overhead=engine["overhead"], stop_early=bool(engine["early_stop"]))
+        begin = time.perf_counter()
+        result = searcher.search(game_state, engine["depth"] or MAX_PLY, engine["time"], engine["nodes"],
+                                 time_manager=time_manager)
+        elapsed = time.perf_counter() - begin
+        time_used[game_state.white_to_move] += elapsed
+        if clock is not None and not clock.punch(elapsed):
+            outcome = ("0-1" if game_state.white_to_move else "1-0"), "time forfeit"
+            break
+        nodes += result.nodes
+        scores.append(result.score if game_state.white_to_move else -result.score)
+        moves.append(result.best_move.moveID)
+        game_state.makeMove(result.best_move)
+        outcome = _adjudicate(scores, adjudication)
+
+    return {
+        "game": index,
+        "white": engines[0]["name"],
+        "black": engines[1]["name"],
+        "result": outcome[0],
+        "reason": outcome[1],
+        "opening": " ".join(map(str, opening)),
+        "moves": " ".join(map(str, moves)),
+        "plies": len(opening) + len(moves),
+        "nodes": nodes,
+        "white_time": round(time_used[True], 3),
+        "black_time": round(time_used[False], 3),
+    }
+
+
+def eloFromScore(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def eloEstimate(wins, draws, losses):
+    """
+    Elo difference and its 95% error margin from a win/draw/loss count.
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0, float("inf")
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return eloFromScore(score), (eloFromScore(score + margin) - eloFromScore(score - margin)) / 2
+
+
+def sprt(wins, draws, losses, elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05):
+    """
+    Sequential probability ratio test of H0: elo = elo0 against
+    H1: elo = elo1, with the normal approximation to the score.
+    Returns (log likelihood ratio, lower bound, upper bound, decision)
+    where decision is "H0", "H1" or None to keep playing.
+    """
+    lower = math.log(beta / (1 - alpha))
+    upper = math.log((1 - beta) / alpha)
+    games = wins + draws + losses
+    llr = 0.0
+    if games:
+        score = (wins + draws / 2) / games
+        variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+        if variance > 0:
+            score0 = 1 / (1 + 10 ** (-elo0 / 400))
+            score1 = 1 / (1 + 10 ** (-elo1 / 400))
+            llr = games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+    decision = "H1" if llr >= upper else "H0" if llr <= lower else None
+    return llr, lower, upper, decision
+
+
+def runMatch(engines, games, concurrency, opening_plies, adjudication, output=None, seed=0, sprt_bounds=None,
+             records=None):
+    """
+    Play engines[0] ("A") against engines[1] ("B") over pairs of games from
+    the same random opening with colours swapped. Game records are
+    appended to output (JSON lines) and/or records (gamerecord binary
+    format) as each game finishes. Stops early if
+    sprt_bounds (elo0, elo1) is given and the test reaches a decision.
+    With clocks, the summary adds each engine's time per game and flags.
+    Returns (wins, draws, losses) for engine A.
+    """
+    rng = random.Random(seed)
+    tasks = []
+    for index in range(games):
+        if index % 2 == 0:
+            opening = randomOpening(rng, opening_plies)
+        pairing = engines if index % 2 == 0 else engines[::-1]
+        tasks.append((index, opening, pairing, adjudication))
+
+    wins = draws = losses = 0
+    plies = 0
+    time_used = {engine["name"]: 0.0 for engine in engines}
+    flags = {engine["name"]: 0 for engine in engines}
+    start = time.perf_counter()
+    record_file = open(output, "a") if output else None
+    record_writer = GameRecordWriter(records) if records else None
+    try:
+        with multiprocessing.Pool(concurrency) as pool:
+            for record in pool.imap_unordered(playGame, tasks):
+                if record_file is not None:
+                    record_file.write(json.dumps(record) + "\n")
+                    record_file.flush()
+                if record_writer is not None:
+                    record_writer.write(map(int, (record["opening"] + " " + record["moves"]).split()),
+                                        record["result"])
+                    record_writer.flush()
+                a_is_white = record["white"] == engines[0]["name"]
+                if record["result"] == "1/2-1/2":
+                    draws += 1
+                elif (record["result"] == "1-0") == a_is_white:
+                    wins += 1
+                else:
+                    losses += 1
+                plies += record["plies"]
+                time_used[record["white"]] += record["white_time"]
+                time_used[record["black"]] += record["black_time"]
+                if record["reason"] == "time forfeit":
+                    flags[record["black"] if record["result"] == "1-0" else record["white"]] += 1
+
+                played = wins + draws + losses
+                elapsed = time.perf_counter() - start
+                elo, margin = eloEstimate(wins, draws, losses)
+                line = (f"game {played:>5}/{games}  A +{wins} ={draws} -{losses}  "
+                        f"elo {elo:+.1f} +/- {margin:.1f}  {played / elapsed * 3600:.0f} games/h")
+                if sprt_bounds is not None:
+                    llr, lower, upper, decision = sprt(wins, draws, losses, *sprt_bounds)
+                    line += f"  LLR {llr:.2f} ({lower:.2f}, {upper:.2f})"
+                    if decision is not None:
+                        print(line + f"  SPRT accepts {decision}")
+                        pool.terminate()
+                        break
+                print(line)
+    finally:
+        if record_file is not None:
+            record_file.close()
+        if record_writer is not None:
+            record_writer.close()
+
+    played = wins + draws + losses
+    elapsed = time.perf_counter() - start
+    print(f"{played} games in {elapsed:.1f}s: {played / elapsed * 3600:.0f} games/hour, "
+          f"{plies / max(played, 1):.0f} plies/game, {concurrency} processes")
+    if any(engine["clock"] is not None for engine in engines):
+        for engine in engines:
+            name = engine["name"]
+            print(f"{name}: {time_used[name] / max(played, 1):.1f}s per game, "
+                  f"{flags[name]} flags ({flags[name] / max(played, 1):.1%} of games)")
+    return wins, draws, losses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Play engine A against engine B without the UI. "
+                    "Engine options: time=, nodes=, depth=, table_mb=, eval=module:function, book=FILE, "
+                    "tablebases=DIR, clock=, increment=, overhead=, early_stop=0|1.")
+    parser.add_argument("-n", "--games", type=int, default=100, help="number of games (played in colour-swapped pairs)")
+    parser.add_argument("-c", "--concurrency", type=int, default=multiprocessing.cpu_count(),
+                        help="games played at once, one process each")
+    parser.add_argument("-t", "--time", type=float, help="seconds per move")
+    parser.add_argument("--nodes", type=int, help="nodes per move")
+    parser.add_argument("-d", "--depth", type=int, help="fixed depth per move")
+    parser.add_argument("--clock", type=float, help="seconds per side for the game, managed by timemanager.py")
+    parser.add_argument("--increment", type=float, default=0.0, help="seconds added per move with --clock")
+    parser.add_argument("--table-mb", type=float, default=DEFAULT_ENGINE["table_mb"], help="table size per engine")
+    parser.add_argument("--engine-a", default="", help="settings for engine A, e.g. nodes=20000")
+    parser.add_argument("--engine-b", default="", help="settings for engine B, e.g. eval=myeval:evaluate")
+    parser.add_argument("--opening-plies", type=int, default=8, help="random plies before the engines take over")
+    parser.add_argument("--seed", type=int, default=0, help="opening seed")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_ADJUDICATION["max_plies"],
+                        help="game length before it is drawn")
+    parser.add_argument("--resign-score", type=int, default=DEFAULT_ADJUDICATION["resign_score"],
+                        help="score that counts as decisive")
+    parser.add_argument("--resign-moves", type=int, default=DEFAULT_ADJUDICATION["resign_moves"],
+                        help="moves each side must see a decisive score for (0 disables)")
+    parser.add_argument("--draw-score", type=int, default=DEFAULT_ADJUDICATION["draw_score"],
+                        help="score that counts as level")
+    parser.add_argument("--draw-moves", type=int, default=DEFAULT_ADJUDICATION["draw_moves"],
+                        help="moves each side must see a level score for (0 disables)")
+    parser.add_argument("--draw-after", type=int, default=DEFAULT_ADJUDICATION["draw_after"],
+                        help="earliest ply for draw adjudication")
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=("ELO0", "ELO1"),
+                        help="stop once an SPRT of ELO0 against ELO1 is decided")
+    parser.add_argument("-o", "--output", help="append game records (JSON lines) to this file")
+    parser.add_argument("--records", help="append games in the binary gamerecord format to this file")
+    args = parser.parse_args(argv)
+
+    if args.time is None and args.nodes is None and args.depth is None and args.clock is None:
+        args.nodes = 5000
+    defaults = dict(DEFAULT_ENGINE, time=args.time, nodes=args.nodes, depth=args.depth, table_mb=args.table_mb,
+                    clock=args.clock, increment=args.increment)
+    engines = []
+    for name, text in (("A", args.engine_a), ("B", args.engine_b)):
+        engine = parseEngine(text, defaults)
+        engine["name"] = name
+        engines.append(engine)
+
+    adjudication = {
+        "max_plies": args.max_plies,
+        "resign_score": args.resign_score,
+        "resign_moves": args.resign_moves,
+        "draw_score": args.draw_score,
+        "draw_moves": args.draw_moves,
+        "draw_after": args.draw_after,
+    }
+    wins, draws, losses = runMatch(engines, args.games, args.concurrency, args.opening_plies,
+                                   adjudication, args.output, args.seed, args.sprt, args.records)
+    elo, margin = eloEstimate(wins, draws, losses)
+    print(f"A vs B: +{wins} ={draws} -{losses}  elo {elo:+.1f} +/- {margin:.1f}")
+    if args.sprt:
+        llr, lower, upper, decision = sprt(wins, draws, losses, *args.sprt)
+        print(f"SPRT [{args.sprt[0]}, {args.sprt[1]}]: LLR {llr:.2f} ({lower:.2f}, {upper:.2f}) "
+              f"{'accepts ' + decision if decision else 'undecided'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+from chessengine import PIECES, PIECE_CODES
+from evaluation import PIECE_VALUES
+
+
+KILLER_SCORE = 1 << 30
+HISTORY_LIMIT = 1 << 24
+
+
+def moveIDSquares(move_id):
+    """
+    (start_row, start_col, end_row, end_col) of a Move.moveID.
+    """
+    return move_id // 1000, move_id // 100 % 10, move_id // 10 % 10, move_id % 10
+
+
+def mvvLva(move):
+    """
+    Most Valuable Victim / Least Valuable Attacker score of a capture.
+    """
+    return PIECE_VALUES[move.piece_captured[1]] * 16 - PIECE_VALUES[move.piece_moved[1]]
+
+
+class MoveOrderer:
+    """
+    Orders moves for alpha-beta and generates them in stages:
+    the transposition-table move, then captures by MVV-LVA, then quiet
+    moves (killers first, then by history score). Pins and checks are
+    worked out once per position and shared by the stages, and each stage
+    is only generated once the previous one is used up, so a cutoff on
+    the table move or a capture skips quiet move generation entirely.
+    """
+
+    def __init__(self, max_ply=64):
+        self.max_ply = max_ply
+        self.killers = [[0, 0] for _ in range(max_ply + 1)]
+        # history[piece code * 81 + end square]
+        self.history = [0] * (len(PIECES) * 81)
+
+    def clear(self):
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+        for i in range(len(self.history)):
+            self.history[i] = 0
+
+    def newSearch(self):
+        """
+        Killers are position-specific, so they are dropped between
+        searches; history is halved so it favours recent results.
+        """
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+        for i in range(len(self.history)):
+            self.history[i] >>= 1
+
+    def orderedMoves(self, game_state, ply, table_move=0):
+        """
+        Yield the valid moves of the position, best candidates first.
+        The position must be restored before the next move is requested.
+        """
+        pins_and_checks = game_state.pinsAndChecks()
+        played = 0
+        if table_move:
+            start_row, start_col, _, _ = moveIDSquares(table_move)
+            for move in game_state.getValidMovesFrom(start_row, start_col, pins_and_checks):
+                if move.moveID == table_move:
+                    played = table_move
+                    yield move
+                    break
+
+        captures = game_state.getValidCaptures(pins_and_checks)
+        captures.sort(key=mvvLva, reverse=True)
+        for move in captures:
+            if move.moveID != played:
+                yield move
+
+        quiets = game_state.getValidQuietMoves(pins_and_checks)
+        first_killer, second_killer = self.killers[ply]
+        history = self.history
+
+        def quietScore(move):
+            if move.moveID == first_killer:
+                return KILLER_SCORE + 1
+            if move.moveID == second_killer:
+                return KILLER_SCORE
+            return history[PIECE_CODES[move.piece_moved] * 81 + move.end_row * 9 + move.end_col]
+
+        quiets.sort(key=quietScore, reverse=True)
+        for move in quiets:
+            if move.moveID != played:
+                yield move
+
+    def recordCutoff(self, move, depth, ply):
+        """
+        Remember a quiet move that caused a beta cutoff.
+        """
+        if move.piece_captured != "--":
+            return
+        killers = self.killers[ply]
+        if killers[0] != move.moveID:
+            killers[1] = killers[0]
+            killers[0] = move.moveID
+        index = PIECE_CODES[move.piece_moved] * 81 + move.end_row * 9 + move.end_col
+        self.history[index] += depth * depth
+        if self.history[index] > HISTORY_LIMIT:
+            for i in range(len(self.history)):
+                self.history[i] >>= 1
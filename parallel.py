@@ -0,0 +1,344 @@
+import argparse
+import multiprocessing
+import queue
+import sys
+import time
+import traceback
+from multiprocessing import shared_memory
+
+from chessengine import GameState
+from ordering import mvvLva
+from search import (CHECK_INTERVAL, DEFAULT_TABLE_MB, INFINITY, MATE_SCORE, MAX_PLY,
+                    Searcher, SearchResult, isMateScore)
+from transposition import TranspositionTable, tableBytes
+
+
+MODES = ("split", "lazy")
+# Seconds between checks that the workers are still alive while waiting
+# for a result
+RESULT_POLL_SECONDS = 1.0
+
+
+class _WorkerSearcher(Searcher):
+    """
+    Searcher that also stops when the pool's stop event is set,
+    checked at the same interval as the clock.
+    """
+
+    def __init__(self, stop_event, table):
+        super().__init__(table=table)
+        self.stop_event = stop_event
+
+    def _checkLimits(self):
+        if self.nodes % CHECK_INTERVAL == CHECK_INTERVAL - 1 and self.stop_event.is_set():
+            self.stop_requested = True
+        super()._checkLimits()
+
+
+def _worker(index, tasks, results, stop_event, table_name):
+    """
+    Worker process loop. Tasks:
+        ("move", search_id, position, move_id, depth, alpha, time_limit, node_limit)
+            score one root move (root splitting)
+        ("search", search_id, position, max_depth, time_limit, node_limit, start_depth)
+            full iterative deepening search (lazy SMP)
+    Replies are (kind, index, search_id, move_id, score, depth, nodes) with
+    kind "move", "progress" or "done"; score is None if the budget ran out.
+    A task that raises is answered with ("error", index, search_id,
+    traceback text, None, 0, 0) and the worker carries on.
+    """
+    shared = shared_memory.SharedMemory(name=table_name)
+    table = TranspositionTable(buffer=shared.buf)
+    searcher = _WorkerSearcher(stop_event, table)
+    last_search = None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            kind, search_id, position = task[:3]
+            try:
+                game_state = GameState.fromSnapshot(position)
+
+                if kind == "move":
+                    move_id, depth, alpha, time_limit, node_limit = task[3:]
+                    if search_id != last_search:
+                        table.newSearch()
+                        searcher.orderer.newSearch()
+                        last_search = search_id
+                    move = next(m for m in game_state.getValidMoves() if m.moveID == move_id)
+                    score = searcher.searchMove(game_state, move, depth, alpha, time_limit, node_limit)
+                    results.put(("move", index, search_id, move_id, score, depth, searcher.nodes))
+                else:
+                    max_depth, time_limit, node_limit, start_depth = task[3:]
+                    last_search = search_id
+
+                    def progress(result):
+                        results.put(("progress", index, search_id, result.best_move.moveID,
+                                     result.score, result.depth, result.nodes))
+
+                    # Only worker 0 must come back with a move; helpers stop on
+                    # the limits even in their first iteration
+                    result = searcher.search(game_state, max_depth, time_limit, node_limit,
+                                             progress if index == 0 else None, start_depth,
+                                             guarantee_move=index == 0)
+                    move_id = result.best_move.moveID if result.best_move is not None else 0
+                    results.put(("done", index, search_id, move_id, result.score, result.depth, result.nodes))
+            except Exception:
+                results.put(("error", index, search_id, traceback.format_exc(), None, 0, 0))
+    finally:
+        del searcher
+        table.table.release()
+        shared.close()
+
+
+class ParallelSearcher:
+    """
+    Searches one position with several worker processes.
+
+    mode "split": iterative deepening driven from this process; at each
+    depth the first (best so far) root move is searched alone, then the
+    remaining root moves are handed out one at a time to whichever worker
+    is free, each searched against the best score found so far.
+
+    mode "lazy" (lazy SMP): every worker runs the same iterative deepening
+    search; they only cooperate through the shared transposition table,
+    so each one finds the others' results. Odd workers start one ply
+    deeper so they don't all follow the same path. Worker 0's result is
+    used unless a helper completed a deeper iteration.
+
+    In both modes the workers share one transposition table in
+    multiprocessing.shared_memory and positions are sent as
+    GameState.snapshot() bytes. Call close() (or use a with block) to stop
+    the workers and free the table.
+    """
+
+    def __init__(self, workers=None, mode="split", table_mb=DEFAULT_TABLE_MB):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+        self.mode = mode
+        self.num_workers = workers or multiprocessing.cpu_count()
+        self.shared_table = shared_memory.SharedMemory(create=True, size=tableBytes(table_mb))
+        self.stop_event = multiprocessing.Event()
+        self.results = multiprocessing.Queue()
+        self.tasks = [multiprocessing.Queue() for _ in range(self.num_workers)]
+        self.processes = [
+            multiprocessing.Process(target=_worker, name=f"search-worker-{i}", daemon=True,
+                                    args=(i, self.tasks[i], self.results, self.stop_event,
+                                          self.shared_table.name))
+            for i in range(self.num_workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.search_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.processes is None:
+            return
+        self.stop_event.set()
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join()
+        self.processes = None
+        self.shared_table.close()
+        self.shared_table.unlink()
+
+    def search(self, game_state, max_depth=MAX_PLY, time_limit=None, node_limit=None, callback=None):
+        """
+        Same contract as Searcher.search(); game_state is not modified.
+        Node counts are summed over all workers. Raises RuntimeError if a
+        worker fails or dies.
+        """
+        start = time.perf_counter()
+        self.search_id += 1
+        self.stop_event.clear()
+        result = SearchResult()
+        root_moves = game_state.getValidMoves()
+        if not root_moves:
+            result.score = -MATE_SCORE if game_state.checkmate else 0
+            return result
+
+        position = game_state.snapshot()
+        if self.mode == "split":
+            self._searchSplit(position, root_moves, result, start, max_depth, time_limit, node_limit, callback)
+        else:
+            self._searchLazy(position, root_moves, result, start, max_depth, time_limit, node_limit, callback)
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def _nextResult(self):
+        """
+        The next reply for the current search; replies left over from an
+        earlier search that failed are skipped. Raises RuntimeError, after
+        stopping the other workers, if a worker reports an error or dies.
+        """
+        while True:
+            try:
+                reply = self.results.get(timeout=RESULT_POLL_SECONDS)
+            except queue.Empty:
+                dead = [process.name for process in self.processes if not process.is_alive()]
+                if dead:
+                    self.stop_event.set()
+                    raise RuntimeError(f"Search worker(s) died: {', '.join(dead)}")
+                continue
+            if reply[2] != self.search_id:
+                continue
+            if reply[0] == "error":
+                self.stop_event.set()
+                raise RuntimeError(f"Search worker {reply[1]} failed:\n{reply[3]}")
+            return reply
+
+    def _searchSplit(self, position, root_moves, result, start, max_depth, time_limit, node_limit, callback):
+        deadline = start + time_limit if time_limit is not None else None
+        root_moves.sort(key=lambda m: mvvLva(m) if m.piece_captured != "--" else -INFINITY, reverse=True)
+        nodes = 0
+
+        for depth in range(1, max_depth + 1):
+            limited = depth > 1
+            scores = {}
+            alpha = -INFINITY
+            best_move = None
+            pending = list(root_moves)
+            idle = list(range(self.num_workers))
+            busy = 0
+            timed_out = False
+
+            while pending or busy:
+                # Only the first move until it has set alpha, then all free workers
+                while pending and idle and not timed_out and (best_move is not None or not busy):
+                    time_left = deadline - time.perf_counter() if limited and deadline is not None else None
+                    nodes_left = node_limit - nodes if limited and node_limit is not None else None
+                    if (time_left is not None and time_left <= 0) or (nodes_left is not None and nodes_left <= 0):
+                        timed_out = True
+                        break
+                    move = pending.pop(0)
+                    self.tasks[idle.pop()].put(("move", self.search_id, position, move.moveID,
+                                                depth, alpha, time_left, nodes_left))
+                    busy += 1
+                if not busy:
+                    break
+
+                _, index, _, move_id, score, _, move_nodes = self._nextResult()
+                busy -= 1
+                idle.append(index)
+                nodes += move_nodes
+                if score is None:
+                    if not timed_out:
+                        timed_out = True
+                        self.stop_event.set()  # The iteration is lost; stop the others
+                    continue
+                scores[move_id] = score
+                if score > alpha:
+                    alpha = score
+                    best_move = next(m for m in root_moves if m.moveID == move_id)
+
+            self.stop_event.clear()
+            result.nodes = nodes
+            if timed_out:
+                break
+            result.best_move = best_move
+            result.score = alpha
+            result.depth = depth
+            result.elapsed = time.perf_counter() - start
+            if callback is not None:
+                callback(result)
+
+            # Best move first, the rest by this iteration's scores
+            root_moves.sort(key=lambda m: scores[m.moveID], reverse=True)
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+            if isMateScore(alpha):
+                break
+
+    def _searchLazy(self, position, root_moves, result, start, max_depth, time_limit, node_limit, callback):
+        moves_by_id = {move.moveID: move for move in root_moves}
+        worker_nodes = node_limit // self.num_workers if node_limit is not None else None
+        for i, tasks in enumerate(self.tasks):
+            tasks.put(("search", self.search_id, position, max_depth, time_limit, worker_nodes,
+                       min(1 + i % 2, max_depth)))
+
+        finished = 0
+        best = None  # (depth, worker 0 first, move_id, score)
+        nodes = 0
+        while finished < self.num_workers:
+            kind, index, _, move_id, score, depth, worker_total = self._nextResult()
+            if kind == "progress":
+                if callback is not None:
+                    result.best_move = moves_by_id[move_id]
+                    result.score = score
+                    result.depth = depth
+                    result.nodes = nodes + worker_total
+                    result.elapsed = time.perf_counter() - start
+                    callback(result)
+                continue
+            finished += 1
+            nodes += worker_total
+            if index == 0:
+                self.stop_event.set()  # Helpers are done once the main worker is
+            if move_id and (best is None or (depth, index == 0) > best[:2]):
+                best = (depth, index == 0, move_id, score)
+        self.stop_event.clear()
+
+        result.nodes = nodes
+        if best is not None:
+            result.depth, _, move_id, result.score = best
+            result.best_move = moves_by_id[move_id]
+
+
+def benchmark(worker_counts=(1, 2, 4, 8), modes=MODES, depth=4, time_limit=None, table_mb=DEFAULT_TABLE_MB):
+    """
+    Search every perft reference position with each mode and worker
+    count and print total time and speedup over the single-process
+    Searcher. With time_limit, compares depth reached and nodes instead.
+    """
+    from perft import POSITIONS, setupPosition
+
+    def run(searcher):
+        total_time = 0.0
+        total_nodes = 0
+        depths = []
+        for name in POSITIONS:
+            game_state = setupPosition(name)
+            if time_limit is None:
+                result = searcher.search(game_state, max_depth=depth)
+            else:
+                result = searcher.search(game_state, time_limit=time_limit)
+            total_time += result.elapsed
+            total_nodes += result.nodes
+            depths.append(result.depth)
+        return total_time, total_nodes, depths
+
+    print(f"{multiprocessing.cpu_count()} CPUs available")
+    base_time, base_nodes, base_depths = run(Searcher(table=TranspositionTable(table_mb)))
+    print(f"{'serial':<8} {1:>2} workers  {base_time:7.2f}s  {base_nodes:>9} nodes"
+          f"  depths {'/'.join(map(str, base_depths))}")
+    for mode in modes:
+        for workers in worker_counts:
+            with ParallelSearcher(workers, mode, table_mb) as searcher:
+                total_time, total_nodes, depths = run(searcher)
+            speedup = base_time / total_time if time_limit is None else total_nodes / base_nodes
+            print(f"{mode:<8} {workers:>2} workers  {total_time:7.2f}s  {total_nodes:>9} nodes"
+                  f"  depths {'/'.join(map(str, depths))}  speedup {speedup:.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel search speedup against worker count.")
+    parser.add_argument("-d", "--depth", type=int, default=4, help="fixed search depth")
+    parser.add_argument("-t", "--time", type=float, help="search each position for this many seconds instead")
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="worker counts")
+    parser.add_argument("-m", "--mode", choices=MODES, action="append", help="search mode(s), default both")
+    parser.add_argument("--table-mb", type=float, default=DEFAULT_TABLE_MB, help="shared transposition table size")
+    args = parser.parse_args(argv)
+    benchmark(args.workers, args.mode or MODES, args.depth, args.time, args.table_mb)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
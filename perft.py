@@ -0,0 +1,252 @@
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+
+from chessengine import GameState
+
+
+# Test positions, as moveID sequences played from the start position
+POSITIONS = {
+    "start": "",
+    "open-captures": "7464 1333 8552 3343 5257 1838 5717 1636 1727 0527 7565 0871 "
+                     "8685 1525 7060 1434 8071 3646 7656 4353 7757 2717 8855 0414",
+    "pinned-piece": "7666 1828 7262 1131 7151 0066 7363 1424 5141 0541 7566 4143 "
+                    "8475 0818 8765 1333 7454 4354 6353 1845 8071 0413 7131 1323",
+    "pin-and-captures": "7363 1222 7767 2232 7161 1727 8008 1626 8844 1525 4462 0123 "
+                        "8373 1030 0826 0515 7050 1526 6232 3040 3223 2680 7565 8081",
+    "in-check": "7262 1828 7050 1232 7151 1636 7858 1434 8878 1030 6252 1323 "
+                "8017 0817 7565 1525 5848 0020 7834 2334 7353 0212 8473 2053",
+}
+
+# Known node counts: EXPECTED[position][depth]
+EXPECTED = {
+    "start": {1: 20, 2: 400, 3: 8956, 4: 199813},
+    "open-captures": {1: 35, 2: 1232, 3: 41669},
+    "pinned-piece": {1: 34, 2: 1399, 3: 42816},
+    "pin-and-captures": {1: 27, 2: 513, 3: 13406},
+    "in-check": {1: 3, 2: 163, 3: 2808},
+}
+
+
+def _backend(name):
+    """
+    GameState class for a --backend name.
+    """
+    if name == "bitboard":
+        from bitboard import BitboardGameState
+        return BitboardGameState
+    return GameState
+
+
+def setupPosition(name, backend=GameState):
+    """
+    Play a named position's moves from the start position.
+    """
+    game_state = backend()
+    for move_id in POSITIONS[name].split():
+        move = next((m for m in game_state.getValidMoves() if m.moveID == int(move_id)), None)
+        if move is None:
+            raise ValueError(f"Illegal move {move_id} in position '{name}'")
+        game_state.makeMove(move)
+    return game_state
+
+
+def _referenceMoveIDs(game_state):
+    """
+    moveIDs from the make/test/undo reference generator, run on a plain
+    GameState copy so other backends' own state is not involved.
+    """
+    reference = GameState()
+    reference.board = [row[:] for row in game_state.board]
+    reference.white_to_move = game_state.white_to_move
+    reference.white_president_location = game_state.white_president_location
+    reference.black_president_location = game_state.black_president_location
+    return {move.moveID for move in reference._getValidMovesReference()}
+
+
+def perft(game_state, depth, verify=False):
+    """
+    Count the leaf nodes of the legal move tree to the given depth.
+    With verify, every position's move set is also checked against
+    the slow make/test/undo reference generator. Backends with their own
+    perft() (BitboardGameState) use it when not verifying.
+    """
+    if not verify and hasattr(game_state, "perft"):
+        return game_state.perft(depth)
+    moves = game_state.getValidMoves()
+    if verify:
+        if {move.moveID for move in moves} != _referenceMoveIDs(game_state):
+            raise AssertionError(f"Move set mismatch after {[m.moveID for m in game_state.move_log]}")
+    if depth == 1 and not verify:
+        return len(moves)
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in moves:
+        game_state.makeMove(move)
+        nodes += perft(game_state, depth - 1, verify)
+        game_state.undoMove()
+    return nodes
+
+
+def checkRandomPositions(count, seed=0, backend=GameState, max_plies=150):
+    """
+    Play random games until count positions have been seen and check each
+    one: getValidMoves() against the reference generator, and the
+    captures + quiet moves and per-square move sets against
+    getValidMoves(). Reproducible for a given seed.
+    Returns the mismatches found, as (moveIDs played, what differs).
+    """
+    rng = random.Random(seed)
+    mismatches = []
+    checked = 0
+    while checked < count:
+        game_state = backend()
+        for _ in range(max_plies):
+            if checked >= count:
+                break
+            checked += 1
+            moves = game_state.getValidMoves()
+            move_ids = [move.moveID for move in moves]
+            played = [move.moveID for move in game_state.move_log]
+            if len(set(move_ids)) != len(move_ids):
+                mismatches.append((played, "duplicate moves"))
+            if set(move_ids) != _referenceMoveIDs(game_state):
+                mismatches.append((played, "getValidMoves vs reference"))
+            staged = [move.moveID for move in game_state.getValidCaptures() + game_state.getValidQuietMoves()]
+            if sorted(staged) != sorted(move_ids):
+                mismatches.append((played, "captures + quiet moves"))
+            by_square = [move.moveID for row in range(9) for col in range(9)
+                         for move in game_state.getValidMovesFrom(row, col)]
+            if sorted(by_square) != sorted(move_ids):
+                mismatches.append((played, "getValidMovesFrom union"))
+            if not moves:
+                break
+            game_state.makeMove(rng.choice(moves))
+    return mismatches
+
+
+def divide(game_state, depth, verify=False):
+    """
+    Node counts below each root move, keyed by moveID.
+    """
+    counts = {}
+    for move in game_state.getValidMoves():
+        game_state.makeMove(move)
+        counts[move.moveID] = perft(game_state, depth - 1, verify) if depth > 1 else 1
+        game_state.undoMove()
+    return counts
+
+
+def _gitRevision():
+    """
+    Short hash of the checked-out revision, or None outside a git tree.
+    """
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, timeout=5)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def _showHistory(path):
+    """
+    Print recorded results grouped by position, depth and backend,
+    oldest first, so throughput changes across revisions stand out.
+    """
+    groups = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            groups.setdefault((record["position"], record["depth"], record["backend"]), []).append(record)
+    for (position, depth, backend), records in sorted(groups.items()):
+        print(f"{position} depth {depth} ({backend})")
+        first = records[0]["nps"]
+        for record in records:
+            print(f"  {record['time']}  {record['revision'] or '-':>10}  {record['nps']:10.0f} nps"
+                  f"  {record['nps'] / first:5.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft node counts and move generation throughput.")
+    parser.add_argument("-d", "--depth", type=int, default=3)
+    parser.add_argument("-p", "--position", action="append", choices=sorted(POSITIONS),
+                        help="position to run (repeatable, default: all)")
+    parser.add_argument("--backend", choices=["list", "bitboard"], default="list")
+    parser.add_argument("--divide", action="store_true", help="print node counts per root move")
+    parser.add_argument("--verify", action="store_true",
+                        help="check every move set against the reference generator (slow)")
+    parser.add_argument("--random", type=int, metavar="N",
+                        help="check the move generators on N positions from random games, on both backends, and exit")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for --random")
+    parser.add_argument("--check-scores", action="store_true",
+                        help="check the incremental material/piece-square totals after every move (slow)")
+    parser.add_argument("--record", metavar="FILE", help="append results to a JSON-lines file")
+    parser.add_argument("--history", metavar="FILE", help="show recorded results and exit")
+    args = parser.parse_args(argv)
+
+    if args.history:
+        _showHistory(args.history)
+        return 0
+
+    if args.random:
+        failed = False
+        for name in ("list", "bitboard"):
+            start = time.perf_counter()
+            mismatches = checkRandomPositions(args.random, args.seed, _backend(name))
+            print(f"{name:<9} {args.random} random positions (seed {args.seed})  {len(mismatches)} mismatches"
+                  f"  {time.perf_counter() - start:.1f}s")
+            for played, what in mismatches[:10]:
+                print(f"  {what} after {' '.join(f'{move_id:04d}' for move_id in played)}")
+            failed = failed or bool(mismatches)
+        return 1 if failed else 0
+
+    backend = _backend(args.backend)
+    backend.check_scores = args.check_scores
+    revision = _gitRevision() if args.record else None
+    failed = False
+    for name in args.position or POSITIONS:
+        game_state = setupPosition(name, backend)
+        start = time.perf_counter()
+        if args.divide:
+            counts = divide(game_state, args.depth, args.verify)
+            nodes = sum(counts.values())
+        else:
+            nodes = perft(game_state, args.depth, args.verify)
+        elapsed = time.perf_counter() - start
+        nps = nodes / elapsed if elapsed > 0 else 0.0
+
+        expected = EXPECTED[name].get(args.depth)
+        if expected is None:
+            status = "(no reference count)"
+        elif expected == nodes:
+            status = "ok"
+        else:
+            status = f"FAIL, expected {expected}"
+            failed = True
+        print(f"{name:<18} depth {args.depth}  {nodes:>10} nodes  {elapsed:8.2f}s  {nps:10.0f} nps  {status}")
+        if args.divide:
+            for move_id, count in sorted(counts.items()):
+                print(f"  {move_id:04d}: {count}")
+
+        if args.record:
+            with open(args.record, "a") as f:
+                f.write(json.dumps({
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "revision": revision,
+                    "backend": args.backend,
+                    "position": name,
+                    "depth": args.depth,
+                    "nodes": nodes,
+                    "seconds": round(elapsed, 4),
+                    "nps": round(nps),
+                }) + "\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
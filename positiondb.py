@@ -0,0 +1,323 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+from chessengine import GameState
+from gamerecord import (RESULT_BLACK_WINS, RESULT_DRAW, RESULT_WHITE_WINS, checkFormat, playRecord,
+                        readRecords)
+
+
+# File layout: a 16-byte header (MAGIC, padding, uint64 entry count), then
+# fixed-size entries sorted by (key, moveID), one per move played from a
+# position:
+#   uint64 Zobrist key, uint16 moveID, 2 bytes padding,
+#   uint32 games, white wins, black wins, draws
+# then, optionally, how many records of each record file are indexed, as
+# JSON, so the progress is replaced together with the entries it counts
+MAGIC = b"MCPD\x01"
+_HEADER = struct.Struct("<5s3xQ")
+_ENTRY = struct.Struct("<QH2xIIII")
+_KEY = struct.Struct("<Q")
+HEADER_SIZE = _HEADER.size
+ENTRY_SIZE = _ENTRY.size
+_COUNT_LIMIT = 0xFFFFFFFF
+
+DEFAULT_MAX_PLIES = 40
+# New (key, moveID) counts held in memory before they are merged into the
+# file; every merge rewrites the whole file, so this bounds the rewrites
+DEFAULT_MERGE_ENTRIES = 2000000
+
+
+class MoveStats:
+    """
+    How often a move was played from a position and how those games ended.
+    """
+    __slots__ = ("move_id", "games", "white_wins", "black_wins", "draws")
+
+    def __init__(self, move_id, games, white_wins, black_wins, draws):
+        self.move_id = move_id
+        self.games = games
+        self.white_wins = white_wins
+        self.black_wins = black_wins
+        self.draws = draws
+
+    def __repr__(self):
+        return (f"MoveStats({self.move_id}: {self.games} games, "
+                f"+{self.white_wins} ={self.draws} -{self.black_wins})")
+
+
+class PositionDatabase:
+    """
+    Read-only view of a position database file. The file is memory-mapped
+    and searched in place with a binary search on the key, so opening it
+    costs nothing however many positions it holds, and several processes
+    can share the same pages.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.num_entries = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or len(self.map) < HEADER_SIZE + self.num_entries * ENTRY_SIZE:
+            self.close()
+            raise ValueError(f"{path} is not a position database")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.num_entries
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def _lowerBound(self, key):
+        """
+        Index of the first entry whose key is not below key.
+        """
+        low, high = 0, self.num_entries
+        while low < high:
+            middle = (low + high) // 2
+            if _KEY.unpack_from(self.map, HEADER_SIZE + middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, key):
+        """
+        MoveStats for every move played from the position with this
+        Zobrist key, most played first. Empty if the position is unknown.
+        """
+        moves = []
+        index = self._lowerBound(key)
+        while index < self.num_entries:
+            entry_key, move_id, games, white_wins, black_wins, draws = _ENTRY.unpack_from(
+                self.map, HEADER_SIZE + index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            moves.append(MoveStats(move_id, games, white_wins, black_wins, draws))
+            index += 1
+        moves.sort(key=lambda stats: stats.games, reverse=True)
+        return moves
+
+    def entries(self):
+        """
+        Every (key, moveID, games, white wins, black wins, draws) in file order.
+        """
+        return _ENTRY.iter_unpack(memoryview(self.map)[HEADER_SIZE:HEADER_SIZE + self.num_entries * ENTRY_SIZE])
+
+    def sources(self):
+        """
+        {record file: records indexed} stored after the entries; empty
+        for a file written without it.
+        """
+        trailer = self.map[HEADER_SIZE + self.num_entries * ENTRY_SIZE:]
+        return json.loads(trailer) if trailer else {}
+
+
+def _resultColumn(result):
+    """
+    Which counter a game result adds to (after the games counter), or None.
+    """
+    return {RESULT_WHITE_WINS: 0, RESULT_BLACK_WINS: 1, RESULT_DRAW: 2}.get(result)
+
+
+def collectPositions(records, max_plies=DEFAULT_MAX_PLIES, counts=None):
+    """
+    Replay records and count every (key, moveID) played within the first
+    max_plies plies, adding to counts if given. Games with an illegal move
+    in those plies are skipped. Returns
+    ({(key, moveID): [games, white wins, black wins, draws]}, games used).
+    """
+    if counts is None:
+        counts = {}
+    games = 0
+    game_state = GameState()
+    start_position = game_state.snapshot()
+    for record, error in checkFormat(records):
+        if error is not None:
+            continue
+        column = _resultColumn(record.result)
+        played = []
+        try:
+            for move in playRecord(game_state, record, start_position):
+                if len(played) == max_plies:
+                    break
+                played.append((game_state.zobrist_key, move.moveID))
+        except ValueError:
+            continue
+        for entry in played:
+            stats = counts.get(entry)
+            if stats is None:
+                stats = counts[entry] = [0, 0, 0, 0]
+            stats[0] += 1
+            if column is not None:
+                stats[column + 1] += 1
+        games += 1
+    return counts, games
+
+
+def mergeCounts(path, counts, sources=None):
+    """
+    Merge new counts into the database at path (created if missing) by
+    streaming the existing sorted entries and the sorted new ones into a
+    new file, which then replaces the old one. sources (see
+    PositionDatabase.sources) goes into the same file, so the swap records
+    the progress with the counts; None keeps the old file's. Readers that
+    already have the old file open keep seeing the old data.
+    """
+    new_entries = sorted(counts.items())
+    old = PositionDatabase(path) if os.path.exists(path) else None
+    old_entries = old.entries() if old is not None else iter(())
+    temporary = path + ".tmp"
+    written = 0
+    try:
+        with open(temporary, "wb") as output:
+            output.write(_HEADER.pack(MAGIC, 0))
+            old_entry = next(old_entries, None)
+            for (key, move_id), stats in new_entries:
+                while old_entry is not None and old_entry[:2] < (key, move_id):
+                    output.write(_ENTRY.pack(*old_entry))
+                    written += 1
+                    old_entry = next(old_entries, None)
+                if old_entry is not None and old_entry[:2] == (key, move_id):
+                    stats = [min(a + b, _COUNT_LIMIT) for a, b in zip(stats, old_entry[2:])]
+                    old_entry = next(old_entries, None)
+                output.write(_ENTRY.pack(key, move_id, *stats))
+                written += 1
+            while old_entry is not None:
+                output.write(_ENTRY.pack(*old_entry))
+                written += 1
+                old_entry = next(old_entries, None)
+            if sources is None and old is not None:
+                sources = old.sources()
+            if sources:
+                output.write(json.dumps(sources, indent=1).encode())
+            output.seek(0)
+            output.write(_HEADER.pack(MAGIC, written))
+            output.flush()
+            os.fsync(output.fileno())  # On disk before it replaces the old file
+    finally:
+        if old is not None:
+            # The entries iterator holds a view of the map
+            del old_entries
+            old.close()
+    os.replace(temporary, path)
+    return written
+
+
+def _legacySourcesPath(path):
+    """
+    Where older versions kept the progress, next to the database.
+    """
+    return path + ".sources.json"
+
+
+def addGames(path, record_paths, max_plies=DEFAULT_MAX_PLIES, batch_games=50000,
+             merge_entries=DEFAULT_MERGE_ENTRIES, report=print):
+    """
+    Index the games of record files into the database at path.
+    The number of records taken from each file is stored in the database
+    itself, so as archives grow only the newly appended games are
+    replayed and merged; nothing is rebuilt. Counts from all files are
+    gathered in memory and only merged into the file once they reach
+    merge_entries (and at the end), so a run rewrites the file rarely.
+    Returns games added.
+    """
+    sources = {}
+    if os.path.exists(path):
+        with PositionDatabase(path) as database:
+            sources = database.sources()
+    legacy_path = _legacySourcesPath(path)
+    if not sources and os.path.exists(legacy_path):
+        with open(legacy_path) as file:
+            sources = json.load(file)
+
+    added = 0
+    counts = {}
+    pending = False
+    begin = time.perf_counter()
+
+    def merge():
+        entries = mergeCounts(path, counts, sources)
+        counts.clear()
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        report(f"{path}: {entries} entries ({time.perf_counter() - begin:.1f}s)")
+
+    for record_path in record_paths:
+        source = os.path.abspath(record_path)
+        done = sources.get(source, 0)
+        records = readRecords(record_path)
+        for _ in zip(range(done), records):
+            pass  # Already indexed
+
+        while True:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) == batch_games:
+                    break
+            if not batch:
+                break
+            games = collectPositions(batch, max_plies, counts)[1]
+            done += len(batch)
+            added += games
+            sources[source] = done
+            pending = True
+            report(f"{record_path}: {done} records replayed, {len(counts)} new entries pending "
+                   f"({time.perf_counter() - begin:.1f}s)")
+            if len(counts) >= merge_entries:
+                merge()
+                pending = False
+    if pending:
+        merge()
+    return added
+
+
+def _formatStats(stats):
+    total = max(stats.games, 1)
+    return (f"{stats.move_id:04d}  {stats.games:>8} games  white {stats.white_wins / total:5.1%}"
+            f"  draw {stats.draws / total:5.1%}  black {stats.black_wins / total:5.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Position database built from game record files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="index new games from record files")
+    add.add_argument("database")
+    add.add_argument("records", nargs="+")
+    add.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="only index this many plies per game")
+    query = commands.add_parser("query", help="show the moves played from a position")
+    query.add_argument("database")
+    query.add_argument("fen", nargs="?", help="position (default: start position)")
+    args = parser.parse_args(argv)
+
+    if args.command == "add":
+        games = addGames(args.database, args.records, args.max_plies)
+        print(f"{games} games added")
+        return 0
+    game_state = GameState.fromFEN(args.fen) if args.fen else GameState()
+    with PositionDatabase(args.database) as database:
+        begin = time.perf_counter()
+        moves = database.lookup(game_state.zobrist_key)
+        elapsed = time.perf_counter() - begin
+        print(f"{sum(stats.games for stats in moves)} games from {game_state.toFEN()} "
+              f"({len(database)} entries, lookup {elapsed * 1e6:.0f}us)")
+        for stats in moves:
+            print(_formatStats(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
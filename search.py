@@ -0,0 +1,440 @@
+import argparse
+import sys
+import time
+
+from evaluation import evaluate
+from ordering import MoveOrderer, mvvLva
+from transposition import BOUND_EXACT, BOUND_LOWER, BOUND_UPPER, TranspositionTable
+
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+MAX_PLY = 64
+# Tablebase wins, less the distance to mate; below any mate the search finds itself
+TABLEBASE_WIN = MATE_SCORE - 2 * MAX_PLY
+# Longer than any table's mate distance, far short of any evaluation
+MAX_TABLEBASE_DISTANCE = 1024
+
+# How many nodes pass between deadline checks
+CHECK_INTERVAL = 1024
+
+DEFAULT_TABLE_MB = 16
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the tree when a time or node budget runs out,
+    or stop() is called; caught at the root.
+    """
+
+
+class SearchResult:
+    """
+    Outcome of the deepest fully completed iteration.
+    """
+
+    def __init__(self):
+        self.best_move = None
+        self.score = 0
+        self.depth = 0
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.from_book = False
+        self.from_tablebase = False
+
+    @property
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return (f"SearchResult(best_move={self.best_move}, score={self.score}, depth={self.depth}, "
+                f"nodes={self.nodes}, elapsed={self.elapsed:.3f})")
+
+
+def isMateScore(score):
+    return abs(score) >= MATE_SCORE - MAX_PLY
+
+
+def isTablebaseScore(score):
+    """
+    A win or loss the endgame tables found rather than the search.
+    """
+    return TABLEBASE_WIN - MAX_TABLEBASE_DISTANCE < abs(score) <= TABLEBASE_WIN
+
+
+def _scoreToTable(score, ply):
+    """
+    Mate scores are stored relative to the node, not the root,
+    so they stay correct when the position is reached at another ply.
+    """
+    if score >= MATE_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _scoreFromTable(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score + ply
+    return score
+
+
+class Searcher:
+    """
+    Negamax alpha-beta search over a GameState with iterative deepening
+    and a quiescence search over captures. Results are cached in a
+    TranspositionTable, kept between searches. The GameState is played on
+    with makeMove/undoMove and handed back unchanged.
+    With an opening book (book.OpeningBook), positions in the book are
+    answered from it without searching. With endgame tables
+    (tablebase.Tablebase), positions they cover are scored by a probe
+    instead of a search, and at the root the move is picked from them.
+    """
+
+    def __init__(self, evaluate=evaluate, table=None, book=None, tablebase=None):
+        self.evaluate = evaluate
+        self.table = table if table is not None else TranspositionTable(DEFAULT_TABLE_MB)
+        self.book = book
+        self.tablebase = tablebase
+        self.orderer = MoveOrderer(MAX_PLY)
+        self.nodes = 0
+        self.stop_requested = False
+        self.deadline = None
+        self.node_limit = None
+        self.check_interval = CHECK_INTERVAL
+        self.root_best = None
+
+    def stop(self):
+        """
+        Ask a running search to return as soon as possible.
+        Safe to call from another thread.
+        """
+        self.stop_requested = True
+
+    def search(self, game_state, max_depth=MAX_PLY, time_limit=None, node_limit=None, callback=None,
+               start_depth=1, time_manager=None, guarantee_move=True):
+        """
+        Search the position with iterative deepening until max_depth is
+        completed or the time (seconds) / node budget runs out.
+        With a time_manager (timemanager.TimeManager) its hard limit is
+        the time budget, and it decides after every iteration whether to
+        start another one.
+        callback(result) is called after every completed iteration.
+        Returns a SearchResult for the deepest completed iteration. The
+        first iteration (start_depth) is completed whatever the node and
+        time budgets, so there is a move whenever one exists, unless a
+        time manager is given or guarantee_move is False (helpers whose
+        result is optional); stop() can end it once a root move has been
+        scored. A first iteration cut short returns the best root move so
+        far (or the first in capture-first order) at depth 0.
+        """
+        start = self._startLimits(time_limit, node_limit, time_manager)
+        self.table.newSearch()
+        self.orderer.newSearch()
+
+        result = SearchResult()
+        root_moves = game_state.getValidMoves()
+        if not root_moves:
+            result.score = -MATE_SCORE if game_state.checkmate else 0
+            return result
+        if self.book is not None:
+            book_move = self.book.choose(game_state)
+            if book_move is not None:
+                result.best_move = book_move
+                result.from_book = True
+                result.elapsed = time.perf_counter() - start
+                return result
+        if self.tablebase is not None and self._searchTablebase(game_state, root_moves, result):
+            result.elapsed = time.perf_counter() - start
+            return result
+        root_moves.sort(key=lambda m: mvvLva(m) if m.piece_captured != "--" else -INFINITY, reverse=True)
+
+        root_length = len(game_state.move_log)
+        for depth in range(start_depth, max(max_depth, start_depth) + 1):
+            try:
+                score, best_move = self._searchRoot(game_state, root_moves, depth,
+                                                    enforce_limits=(depth > start_depth or time_manager is not None
+                                                                    or not guarantee_move))
+            except SearchTimeout:
+                while len(game_state.move_log) > root_length:
+                    game_state.undoMove()
+                if result.best_move is None:
+                    result.best_move = self.root_best or root_moves[0]
+                break
+
+            result.best_move = best_move
+            result.score = score
+            result.depth = depth
+            result.nodes = self.nodes
+            result.elapsed = time.perf_counter() - start
+            if callback is not None:
+                callback(result)
+            if time_manager is not None:
+                if not time_manager.iterationDone(result):
+                    break
+                self.check_interval = time_manager.check_interval
+
+            # Search the previous best move first in the next iteration
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+            if isMateScore(score):
+                break
+
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def searchMove(self, game_state, move, depth, alpha=-INFINITY, time_limit=None, node_limit=None):
+        """
+        Score a single root move to the given depth. Scores above alpha
+        are exact, anything else is only an upper bound, so the moves after
+        the first can be searched separately against the best score so far.
+        Returns None if the budget runs out first. The transposition table
+        and move ordering are not reset; call their newSearch() per search.
+        """
+        self._startLimits(time_limit, node_limit)
+        root_length = len(game_state.move_log)
+        game_state.makeMove(move)
+        try:
+            return -self._negamax(game_state, depth - 1, -INFINITY, -alpha, 1)
+        except SearchTimeout:
+            return None
+        finally:
+            while len(game_state.move_log) > root_length:
+                game_state.undoMove()
+
+    def _probeTablebase(self, game_state):
+        """
+        Score of the position from the endgame tables, or None if they
+        don't cover it.
+        """
+        entry = self.tablebase.probe(game_state)
+        if entry is None:
+            return None
+        result, distance = entry
+        return result * (TABLEBASE_WIN - distance) if result else 0
+
+    def _searchTablebase(self, game_state, root_moves, result):
+        """
+        Pick the root move from the tables: the fastest win, else a draw,
+        else the slowest loss. Returns False, leaving the search to do it,
+        if any position after a move is not covered.
+        """
+        if self.tablebase.probe(game_state) is None:
+            return False
+        best = None
+        for move in root_moves:
+            game_state.makeMove(move)
+            try:
+                score = self._probeTablebase(game_state)
+            finally:
+                game_state.undoMove()
+            if score is None:
+                return False
+            if best is None or -score > best:
+                best = -score
+                result.best_move = move
+        result.score = best
+        result.from_tablebase = True
+        return True
+
+    def _startLimits(self, time_limit, node_limit, time_manager=None):
+        """
+        Reset the node count and budgets; returns the start time.
+        """
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit is not None else None
+        self.check_interval = CHECK_INTERVAL
+        if time_manager is not None:
+            hard_deadline = time_manager.start(start)
+            self.deadline = hard_deadline if self.deadline is None else min(self.deadline, hard_deadline)
+            self.check_interval = time_manager.check_interval
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.stop_requested = False
+        self.root_best = None
+        return start
+
+    def _checkLimits(self):
+        """
+        Count a node and raise SearchTimeout once a budget is spent.
+        The clock is only read every check_interval nodes (CHECK_INTERVAL,
+        or what the time manager asks for).
+        """
+        self.nodes += 1
+        if self.nodes % self.check_interval == 0:
+            if self.stop_requested:
+                raise SearchTimeout()
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchTimeout()
+
+    def _countNode(self):
+        """
+        Count a node of the guaranteed first iteration. The budgets don't
+        apply, but stop() still ends it once a root move has been scored.
+        """
+        self.nodes += 1
+        if self.nodes % self.check_interval == 0 and self.stop_requested and self.root_best is not None:
+            raise SearchTimeout()
+
+    def _searchRoot(self, game_state, root_moves, depth, enforce_limits):
+        alpha = -INFINITY
+        best_move = root_moves[0]
+        for move in root_moves:
+            game_state.makeMove(move)
+            try:
+                score = -self._negamax(game_state, depth - 1, -INFINITY, -alpha, 1, enforce_limits)
+            finally:
+                game_state.undoMove()
+            if score > alpha:
+                alpha = score
+                best_move = move
+            self.root_best = best_move
+        return alpha, best_move
+
+    def _negamax(self, game_state, depth, alpha, beta, ply, enforce_limits=True):
+        if enforce_limits:
+            self._checkLimits()
+        else:
+            self._countNode()
+        if self.tablebase is not None:
+            score = self._probeTablebase(game_state)
+            if score is not None:
+                return score
+        if depth <= 0:
+            return self._quiescence(game_state, alpha, beta, ply, enforce_limits)
+
+        key = game_state.zobrist_key
+        table_move = 0
+        entry = self.table.probe(key)
+        if entry is not None:
+            table_depth, table_score, bound, table_move = entry
+            if table_depth >= depth:
+                table_score = _scoreFromTable(table_score, ply)
+                if (bound == BOUND_EXACT
+                        or (bound == BOUND_LOWER and table_score >= beta)
+                        or (bound == BOUND_UPPER and table_score <= alpha)):
+                    return table_score
+
+        original_alpha = alpha
+        best = -INFINITY
+        best_move = None
+        for move in self.orderer.orderedMoves(game_state, ply, table_move):
+            game_state.makeMove(move)
+            score = -self._negamax(game_state, depth - 1, -beta, -alpha, ply + 1, enforce_limits)
+            game_state.undoMove()
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.orderer.recordCutoff(move, depth, ply)
+                        break
+
+        if best_move is None:
+            return -MATE_SCORE + ply if game_state.inCheck() else 0
+
+        if best >= beta:
+            bound = BOUND_LOWER
+        elif best > original_alpha:
+            bound = BOUND_EXACT
+        else:
+            bound = BOUND_UPPER
+        self.table.store(key, depth, _scoreToTable(best, ply), bound, best_move.moveID)
+        return best
+
+    def _quiescence(self, game_state, alpha, beta, ply, enforce_limits=True):
+        """
+        Search captures only until the position is quiet, so the static
+        evaluation is never taken in the middle of an exchange.
+        Every move is searched when in check.
+        """
+        if enforce_limits:
+            self._checkLimits()
+        else:
+            self._countNode()
+        if self.tablebase is not None:
+            score = self._probeTablebase(game_state)
+            if score is not None:
+                return score
+        in_check = game_state.inCheck()
+        if ply >= MAX_PLY:
+            return self.evaluate(game_state)
+
+        best = -INFINITY
+        if not in_check:
+            best = self.evaluate(game_state)
+            if best >= beta:
+                return best
+            if best > alpha:
+                alpha = best
+
+        if in_check:
+            moves = game_state.getValidMoves()
+            if not moves:
+                return -MATE_SCORE + ply
+        else:
+            moves = game_state.getValidCaptures()
+            moves.sort(key=mvvLva, reverse=True)
+
+        for move in moves:
+            game_state.makeMove(move)
+            score = -self._quiescence(game_state, -beta, -alpha, ply + 1, enforce_limits)
+            game_state.undoMove()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+
+def bench(depth=3, time_limit=None, table_mb=DEFAULT_TABLE_MB):
+    """
+    Search every perft reference position to a fixed depth (or for a
+    fixed time) and print depth, nodes, time and nodes per second.
+    Returns (total nodes, total seconds).
+    """
+    from perft import POSITIONS, setupPosition
+
+    total_nodes = 0
+    total_time = 0.0
+    for name in POSITIONS:
+        searcher = Searcher(table=TranspositionTable(table_mb))
+        game_state = setupPosition(name)
+        if time_limit is None:
+            result = searcher.search(game_state, max_depth=depth)
+        else:
+            result = searcher.search(game_state, time_limit=time_limit)
+        total_nodes += result.nodes
+        total_time += result.elapsed
+        print(f"{name:<18} depth {result.depth:>2}  {result.nodes:>9} nodes  {result.elapsed:7.2f}s"
+              f"  {result.nps:8.0f} nps  best {result.best_move}  score {result.score}")
+        stats = searcher.table.stats()
+        print(f"{'':<18} table {stats['size_mb']:.0f} MB  hit rate {stats['hit_rate']:.1%}"
+              f"  collisions {stats['collisions']}  overwrites {stats['overwrites']}"
+              f"  usage {stats['usage']:.1%}")
+    print(f"{'total':<18}           {total_nodes:>9} nodes  {total_time:7.2f}s"
+          f"  {total_nodes / total_time:8.0f} nps")
+    return total_nodes, total_time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search benchmark on the perft reference positions.")
+    parser.add_argument("-d", "--depth", type=int, default=3, help="fixed search depth")
+    parser.add_argument("-t", "--time", type=float, help="search each position for this many seconds instead")
+    parser.add_argument("--table-mb", type=float, default=DEFAULT_TABLE_MB, help="transposition table size")
+    args = parser.parse_args(argv)
+    bench(args.depth, args.time, args.table_mb)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,583 @@
+import argparse
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import time
+
+from chessengine import MOVE_TABLES, SOLDIER_PUSHES, GameState, _piecePatterns
+
+
+# Endgame tables for a President and one or two pieces against a lone
+# President, built by retrograde analysis.
+#
+# Only White is ever the strong side in a file. Black's patterns are
+# White's mirrored top to bottom (East/West are absolute, Forward is not),
+# so a position with Black as the strong side is probed by flipping the
+# rows and swapping colours and the side to move.
+#
+# A position is the squares (white President, black President, pieces...)
+# indexed as ((wP * 81 + bP) * 81 + piece1) * 81 + piece2, with one value
+# per side to move: distance to mate in plies + 1, or 0 for a draw or an
+# illegal position. With White to move a value is always a White win;
+# with Black to move, a Black loss (the lone President never wins).
+#
+# File layout: a 16-byte header (MAGIC, value width in bits, padding,
+# uint64 positions), then the White-to-move and Black-to-move values,
+# each bit-packed little-endian at that width with one padding byte.
+MAGIC = b"MCTB\x01"
+_HEADER = struct.Struct("<5sB2xQ")
+HEADER_SIZE = _HEADER.size
+
+PIECE_ORDER = "GVANBS"
+MAX_PIECES = 4
+MAX_DTM = 0xFF - 1  # Stored as distance + 1 in a byte while generating
+TABLEBASE_EXTENSION = ".mctb"
+DEFAULT_DIRECTORY = "tablebases"
+
+
+def _square(row, col):
+    return row * 9 + col
+
+
+def _mirror(square):
+    return (8 - square // 9) * 9 + square % 9
+
+
+def _buildWhiteTables():
+    """
+    Square-indexed move data for White's pieces, forward and backward:
+    rays and step targets as in MOVE_TABLES, the same walked from the
+    destination in the opposite direction (the squares a piece could have
+    come from), the Soldier's pushes and their reverse, and the squares
+    each piece attacks by stepping, as a bitmask.
+    """
+    rays, steps, reverse_rays, reverse_steps, step_masks = {}, {}, {}, {}, {}
+    for piece_type, (slide_dirs, step_dirs) in _piecePatterns(True).items():
+        table = MOVE_TABLES[True][piece_type]
+        rays[piece_type] = [tuple(tuple(_square(*end) for end in ray) for ray in table[sq // 9][sq % 9][0])
+                            for sq in range(81)]
+        steps[piece_type] = [tuple(_square(*end) for end in table[sq // 9][sq % 9][1]) for sq in range(81)]
+        step_masks[piece_type] = [sum(1 << end for end in steps[piece_type][sq]) for sq in range(81)]
+        reverse_rays[piece_type] = [
+            tuple(ray for ray in (tuple(row * 9 + col for row, col in _reverseRay(sq, d)) for d in slide_dirs) if ray)
+            for sq in range(81)
+        ]
+        # Soldier steps are captures, which White never makes here
+        reverse_steps[piece_type] = [
+            tuple(_square(sq // 9 - d[0], sq % 9 - d[1]) for d in step_dirs
+                  if 0 <= sq // 9 - d[0] < 9 and 0 <= sq % 9 - d[1] < 9)
+            if piece_type != "S" else ()
+            for sq in range(81)
+        ]
+
+    pushes = [tuple(_square(*end) for end in SOLDIER_PUSHES[True][sq // 9][sq % 9]) for sq in range(81)]
+    reverse_pushes = [[] for _ in range(81)]
+    for origin in range(81):
+        for i, end in enumerate(pushes[origin]):
+            # (origin, squares passed over that must be empty)
+            reverse_pushes[end].append((origin, pushes[origin][:i]))
+    reverse_pushes = [tuple(entries) for entries in reverse_pushes]
+    return rays, steps, reverse_rays, reverse_steps, step_masks, reverse_pushes
+
+
+def _reverseRay(square, direction):
+    row, col = square // 9 - direction[0], square % 9 - direction[1]
+    squares = []
+    while 0 <= row < 9 and 0 <= col < 9:
+        squares.append((row, col))
+        row -= direction[0]
+        col -= direction[1]
+    return squares
+
+
+# Only generation needs these; _loadMoveData() builds them on first use
+# so that importing the module to probe tables stays cheap
+_RAYS = _STEPS = _REVERSE_RAYS = _REVERSE_STEPS = _STEP_MASKS = _REVERSE_PUSHES = None
+_KING = _KING_MASK = None
+
+
+def _loadMoveData():
+    global _RAYS, _STEPS, _REVERSE_RAYS, _REVERSE_STEPS, _STEP_MASKS, _REVERSE_PUSHES, _KING, _KING_MASK
+    if _RAYS is None:
+        _RAYS, _STEPS, _REVERSE_RAYS, _REVERSE_STEPS, _STEP_MASKS, _REVERSE_PUSHES = _buildWhiteTables()
+        _KING = _STEPS["P"]
+        _KING_MASK = _STEP_MASKS["P"]
+
+
+def materialName(piece_types):
+    """
+    Table name for White's extra pieces, e.g. ("S", "A") -> "PAS_P".
+    """
+    return "P" + "".join(sorted(piece_types, key=PIECE_ORDER.index)) + "_P"
+
+
+def _materialTypes(name):
+    types = name[1:name.index("_")]
+    if (not name.startswith("P") or name[name.index("_"):] != "_P" or not 1 <= len(types) <= MAX_PIECES - 2
+            or any(t not in PIECE_ORDER for t in types) or materialName(types) != name):
+        raise ValueError(f"Unknown table '{name}'")
+    return tuple(types)
+
+
+def materialSets(max_pieces=3):
+    """
+    Every table name with at most max_pieces pieces, smaller tables first.
+    """
+    names = [materialName(t) for t in PIECE_ORDER]
+    if max_pieces >= 4:
+        names += [materialName(PIECE_ORDER[i] + PIECE_ORDER[j])
+                  for i in range(len(PIECE_ORDER)) for j in range(i, len(PIECE_ORDER))]
+    return names
+
+
+def _index(squares):
+    index = 0
+    for square in squares:
+        index = index * 81 + square
+    return index
+
+
+def _unindex(index, count):
+    squares = []
+    for _ in range(count):
+        index, square = divmod(index, 81)
+        squares.append(square)
+    return tuple(reversed(squares))
+
+
+class _Attacks:
+    """
+    Bitmask of the squares White attacks, with sliding attacks cached per
+    (piece type, square, blockers). The black President never blocks, so
+    it can't shelter behind itself when it steps along a ray.
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def piece(self, piece_type, square, blockers):
+        key = (piece_type, square, blockers)
+        mask = self.cache.get(key)
+        if mask is None:
+            mask = _STEP_MASKS[piece_type][square]
+            for ray in _RAYS[piece_type][square]:
+                for end in ray:
+                    mask |= 1 << end
+                    if blockers >> end & 1:
+                        break
+            self.cache[key] = mask
+        return mask
+
+    def white(self, white_president, pieces, types):
+        occupied = 1 << white_president
+        for square in pieces:
+            occupied |= 1 << square
+        mask = _KING_MASK[white_president]
+        for square, piece_type in zip(pieces, types):
+            mask |= self.piece(piece_type, square, occupied)
+        return mask
+
+
+def generateTable(name, directory=DEFAULT_DIRECTORY):
+    """
+    Build one table by retrograde analysis and write it to directory.
+    Four-piece tables read the three-piece tables from directory for the
+    positions after Black captures a piece. Returns (name, positions,
+    longest mate in plies, seconds).
+    """
+    begin = time.perf_counter()
+    _loadMoveData()
+    types = _materialTypes(name)
+    count = len(types)
+    size = 81 ** (2 + count)
+    white_values = bytearray(size)
+    black_values = bytearray(size)
+    escapes = bytearray(size)  # Black moves not yet known to lose
+    attacks = _Attacks()
+    subtables = Tablebase(directory) if count > 1 else None
+    # Mate distance of a smaller table's White win -> Black positions
+    # whose capture leads there
+    captures = {}
+
+    # Count Black's legal moves in every Black-to-move position; mates are lost at ply 0
+    lost = []
+    for pieces_index in range(81 ** count):
+        pieces = _unindex(pieces_index, count)
+        if len(set(pieces)) < count:
+            continue
+        for white_president in range(81):
+            if white_president in pieces:
+                continue
+            attacked = attacks.white(white_president, pieces, types)
+            near_white = _KING_MASK[white_president] | 1 << white_president
+            for black_president in range(81):
+                if near_white >> black_president & 1 or black_president in pieces:
+                    continue
+                index = (white_president * 81 + black_president) * 81 ** count + pieces_index
+                legal = 0
+                for end in _KING[black_president]:
+                    if near_white >> end & 1:
+                        continue
+                    if end not in pieces:
+                        if not attacked >> end & 1:
+                            legal += 1
+                        continue
+                    i = pieces.index(end)
+                    rest, rest_types = pieces[:i] + pieces[i + 1:], types[:i] + types[i + 1:]
+                    if attacks.white(white_president, rest, rest_types) >> end & 1:
+                        continue
+                    legal += 1
+                    if rest:
+                        value = subtables.value(rest_types, (white_president, end) + rest, True)
+                        if value:
+                            captures.setdefault(value - 1, []).append(index)
+                if legal:
+                    escapes[index] = legal
+                elif attacked >> black_president & 1:
+                    black_values[index] = 1
+                    lost.append(index)
+
+    ply = 0
+    while lost or captures:
+        if ply + 2 > MAX_DTM:
+            raise ValueError(f"{name}: mate distance does not fit the table format")
+        # White moves into a lost position win one ply further out
+        won = []
+        for index in lost:
+            squares = _unindex(index, 2 + count)
+            for previous in _whiteUnmoves(squares, types):
+                previous_index = _index(previous)
+                if white_values[previous_index]:
+                    continue
+                if attacks.white(previous[0], previous[2:], types) >> previous[1] & 1:
+                    continue  # Black would be in check with White to move
+                white_values[previous_index] = ply + 2
+                won.append(previous_index)
+        ply += 1
+
+        # Black positions lose once every move leads to a White win
+        lost = []
+        predecessors = [_index(previous) for index in won for previous in _blackUnmoves(_unindex(index, 2 + count))]
+        for index in predecessors + captures.pop(ply, []):
+            if black_values[index] or not escapes[index]:
+                continue
+            escapes[index] -= 1
+            if not escapes[index]:
+                black_values[index] = ply + 2
+                lost.append(index)
+        ply += 1
+
+    longest = max(max(white_values), max(black_values)) - 1
+    _writeTable(os.path.join(directory, name + TABLEBASE_EXTENSION), size, white_values, black_values)
+    return name, size, longest, time.perf_counter() - begin
+
+
+def _whiteUnmoves(squares, types):
+    """
+    Positions with White to move from which a White move (never a capture)
+    reaches squares. Presidents are kept apart; check is left to the caller.
+    """
+    white_president, black_president = squares[0], squares[1]
+    pieces = squares[2:]
+    occupied = 0
+    for square in squares:
+        occupied |= 1 << square
+    for origin in _KING[white_president]:
+        if not occupied >> origin & 1 and not _KING_MASK[black_president] >> origin & 1:
+            yield (origin, black_president) + pieces
+    for i, (square, piece_type) in enumerate(zip(pieces, types)):
+        before, after = squares[:2 + i], pieces[i + 1:]
+        if piece_type == "S":
+            for origin, passed in _REVERSE_PUSHES[square]:
+                if not occupied >> origin & 1 and not any(occupied >> s & 1 for s in passed):
+                    yield before + (origin,) + after
+            continue
+        for ray in _REVERSE_RAYS[piece_type][square]:
+            for origin in ray:
+                if occupied >> origin & 1:
+                    break
+                yield before + (origin,) + after
+        for origin in _REVERSE_STEPS[piece_type][square]:
+            if not occupied >> origin & 1:
+                yield before + (origin,) + after
+
+
+def _blackUnmoves(squares):
+    """
+    Positions with Black to move from which a black President move (not a
+    capture) reaches squares, given that squares is a legal position.
+    """
+    white_president, black_president = squares[0], squares[1]
+    pieces = squares[2:]
+    for origin in _KING[black_president]:
+        if origin != white_president and origin not in pieces and not _KING_MASK[white_president] >> origin & 1:
+            yield (white_president, origin) + pieces
+
+
+def _pack(values, width):
+    data = bytearray((len(values) * width + 7) // 8 + 1)
+    for index, value in enumerate(values):
+        if value:
+            bit = index * width
+            word = value << (bit & 7)
+            data[bit >> 3] |= word & 0xFF
+            data[(bit >> 3) + 1] |= word >> 8
+    return data
+
+
+def _writeTable(path, size, white_values, black_values):
+    width = max(max(white_values), max(black_values), 1).bit_length()
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as output:
+        output.write(_HEADER.pack(MAGIC, width, size))
+        output.write(_pack(white_values, width))
+        output.write(_pack(black_values, width))
+    os.replace(temporary, path)
+
+
+class _TableFile:
+    """
+    One memory-mapped table file.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.size = _HEADER.unpack_from(self.map, 0)
+        self.section = (self.size * self.width + 7) // 8 + 1
+        if magic != MAGIC or len(self.map) != HEADER_SIZE + 2 * self.section:
+            self.close()
+            raise ValueError(f"{path} is not a tablebase file")
+        self.mask = (1 << self.width) - 1
+
+    def value(self, index, white_to_move):
+        bit = index * self.width
+        offset = HEADER_SIZE + (0 if white_to_move else self.section) + (bit >> 3)
+        return ((self.map[offset] | self.map[offset + 1] << 8) >> (bit & 7)) & self.mask
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class Tablebase:
+    """
+    Read-only access to the table files in a directory. Files are opened
+    and memory-mapped the first time a position needs them, so only the
+    pages that are probed get read, and processes share them.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for table in self.files.values():
+            if table is not None:
+                table.close()
+        self.files = {}
+
+    def _table(self, name):
+        if name not in self.files:
+            path = os.path.join(self.directory, name + TABLEBASE_EXTENSION)
+            self.files[name] = _TableFile(path) if os.path.exists(path) else None
+        return self.files[name]
+
+    def value(self, types, squares, white_to_move):
+        """
+        Stored value of a position with White as the strong side:
+        squares are (white President, black President, pieces of types).
+        None if the table is missing.
+        """
+        table = self._table(materialName(types))
+        if table is None:
+            return None
+        return table.value(_index(squares), white_to_move)
+
+    def probe(self, game_state):
+        """
+        (result, mate distance in plies) for the side to move: result is
+        1 for a win, -1 for a loss, 0 for a draw. None if the position has
+        more than MAX_PIECES pieces, is not a President-and-pieces against
+        a lone President ending, or its table has not been generated.
+        """
+        board = game_state.board
+        empty = 0
+        for row in board:
+            empty += row.count("--")
+        if 81 - empty > MAX_PIECES:
+            return None
+        white, black = [], []
+        for row in range(9):
+            if board[row].count("--") == 9:
+                continue
+            for col in range(9):
+                piece = board[row][col]
+                if piece != "--":
+                    (white if piece[0] == 'w' else black).append((piece[1], row * 9 + col))
+        if len(white) == 1 and len(black) == 1:
+            return (0, 0)
+        white_to_move = game_state.white_to_move
+        if len(black) > 1:
+            if len(white) > 1:
+                return None
+            # Play it as White: flip the board and swap the colours
+            white, black = ([(piece_type, _mirror(square)) for piece_type, square in pieces]
+                            for pieces in (black, white))
+            white_to_move = not white_to_move
+        white_president = next(square for piece_type, square in white if piece_type == "P")
+        black_president = black[0][1]
+        pieces = sorted((piece for piece in white if piece[0] != "P"), key=lambda piece: PIECE_ORDER.index(piece[0]))
+        value = self.value(tuple(piece_type for piece_type, _ in pieces),
+                           (white_president, black_president) + tuple(square for _, square in pieces), white_to_move)
+        if not value:
+            return None if value is None else (0, 0)
+        # With the strong side to move a value is a win, otherwise a loss
+        return (1 if white_to_move else -1, value - 1)
+
+
+def _positionFEN(pieces, white_to_move):
+    """
+    FEN for [(piece code, square)], e.g. [("wP", 76), ("bP", 4), ("wA", 40)].
+    """
+    board = [["--"] * 9 for _ in range(9)]
+    for piece, square in pieces:
+        board[square // 9][square % 9] = piece
+    ranks = []
+    for row in board:
+        rank, empty = "", 0
+        for piece in row:
+            if piece == "--":
+                empty += 1
+                continue
+            rank += (str(empty) if empty else "") + (piece[1] if piece[0] == 'w' else piece[1].lower())
+            empty = 0
+        ranks.append(rank + (str(empty) if empty else ""))
+    return "/".join(ranks) + (" w" if white_to_move else " b")
+
+
+def verify(tablebase, name, samples=1000, seed=0, report=print):
+    """
+    Check random legal positions of a table against GameState: the probe
+    of each position must follow from the probes of the positions after
+    each of its moves (or from checkmate/stalemate when it has none).
+    Every other sample has Black as the strong side, through the mirror.
+    Returns the number of mismatches.
+    """
+    types = _materialTypes(name)
+    rng = random.Random(seed)
+    errors = checked = 0
+    while checked < samples:
+        squares = rng.sample(range(81), 2 + len(types))
+        strong, weak = ("w", "b") if checked % 2 == 0 else ("b", "w")
+        if strong == "b":
+            squares = [_mirror(square) for square in squares]
+        pieces = [(strong + "P", squares[0]), (weak + "P", squares[1])]
+        pieces += [(strong + piece_type, square) for piece_type, square in zip(types, squares[2:])]
+        white_to_move = rng.random() < 0.5
+        game_state = GameState.fromFEN(_positionFEN(pieces, white_to_move))
+        # The side that just moved can't be in check, nor the Presidents touch
+        other = GameState.fromFEN(_positionFEN(pieces, not white_to_move))
+        if other.inCheck() or max(abs(squares[0] // 9 - squares[1] // 9), abs(squares[0] % 9 - squares[1] % 9)) < 2:
+            continue
+        checked += 1
+
+        moves = game_state.getValidMoves()
+        if not moves:
+            expected = (-1, 0) if game_state.checkmate else (0, 0)
+        else:
+            children = []
+            for move in moves:
+                game_state.makeMove(move)
+                children.append(tablebase.probe(game_state))
+                game_state.undoMove()
+            losses = [distance for result, distance in children if result == -1]
+            if losses:
+                expected = (1, min(losses) + 1)
+            elif all(result == 1 for result, _ in children):
+                expected = (-1, max(distance for _, distance in children) + 1)
+            else:
+                expected = (0, 0)
+        found = tablebase.probe(game_state)
+        if found != expected:
+            errors += 1
+            report(f"{name}: {game_state.toFEN()} probes {found}, its moves give {expected}")
+    return errors
+
+
+def generate(names, directory=DEFAULT_DIRECTORY, jobs=None, report=print):
+    """
+    Generate tables in parallel, one table per worker process. Three-piece
+    tables are all finished before any four-piece table starts, since those
+    read them.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stages = [[name for name in names if len(_materialTypes(name)) == count] for count in (1, 2)]
+    for stage in stages:
+        if not stage:
+            continue
+        with multiprocessing.Pool(min(jobs or os.cpu_count(), len(stage))) as pool:
+            for name, size, longest, elapsed in pool.imap_unordered(
+                    _generateTask, [(name, directory) for name in stage]):
+                mate = f"longest mate {longest} plies" if longest >= 0 else "no wins"
+                report(f"{name}: {size} positions, {mate} ({elapsed:.1f}s)")
+
+
+def _generateTask(task):
+    return generateTable(*task)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Endgame tablebases: generate, verify, probe.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("generate", help="build tables by retrograde analysis")
+    build.add_argument("tables", nargs="*", help="table names such as PA_P (default: all up to --pieces)")
+    build.add_argument("--pieces", type=int, choices=(3, 4), default=3,
+                       help="largest tables to build; four-piece tables take hours")
+    build.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="tables to build at once")
+    check = commands.add_parser("verify", help="check sampled positions against the move generator")
+    check.add_argument("tables", nargs="*", help="table names (default: all three-piece tables)")
+    check.add_argument("-n", "--samples", type=int, default=1000)
+    probe = commands.add_parser("probe", help="look up a position")
+    probe.add_argument("fen")
+    for command in (build, check, probe):
+        command.add_argument("-d", "--directory", default=DEFAULT_DIRECTORY)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generate(args.tables or materialSets(args.pieces), args.directory, args.jobs)
+        return 0
+    with Tablebase(args.directory) as tablebase:
+        if args.command == "verify":
+            errors = 0
+            for name in args.tables or materialSets():
+                begin = time.perf_counter()
+                name_errors = verify(tablebase, name, args.samples)
+                print(f"{name}: {args.samples} positions, {name_errors} mismatches "
+                      f"({time.perf_counter() - begin:.1f}s)")
+                errors += name_errors
+            return 1 if errors else 0
+        game_state = GameState.fromFEN(args.fen)
+        begin = time.perf_counter()
+        entry = tablebase.probe(game_state)
+        elapsed = time.perf_counter() - begin
+        if entry is None:
+            print("not in the tablebases")
+            return 1
+        result, distance = entry
+        text = {1: f"win, mate in {distance} plies", -1: f"loss, mated in {distance} plies", 0: "draw"}[result]
+        print(f"{text} (probe {elapsed * 1e6:.0f}us)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
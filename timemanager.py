@@ -0,0 +1,139 @@
+import argparse
+import os
+import sys
+import time
+
+
+# Moves the rest of the game is assumed to take when the time control
+# doesn't say (no moves-to-go)
+DEFAULT_MOVES_LEFT = 30
+# Seconds kept back per move for everything outside the search:
+# the move reaching the board, the clock being read, process hops
+DEFAULT_OVERHEAD = 0.05
+# The hard limit is at most this many soft limits...
+HARD_FACTOR = 4.0
+# ...and never more than this share of the remaining clock
+MAX_FRACTION = 0.4
+# Share of the increment that is spent on the move it comes with
+INCREMENT_SHARE = 0.75
+# Soft limit scale per completed iteration with the same best move as the
+# one before, down to MIN_STABLE_SCALE; a changed best move resets it
+STABLE_SCALE = 0.75
+MIN_STABLE_SCALE = 0.35
+# Soft limit scale after an iteration that changed the best move
+UNSTABLE_SCALE = 1.3
+# Seconds the search should run between clock reads, and the bounds on
+# the node interval that works out to
+POLL_SECONDS = 0.005
+MIN_CHECK_INTERVAL = 64
+MAX_CHECK_INTERVAL = 1024
+
+
+class TimeManager:
+    """
+    Turns a clock into deadlines for one search (Searcher.search's
+    time_manager). The soft limit is this move's share of the clock: no
+    new iteration starts once it has passed, and it shrinks while the best
+    move stays the same from one iteration to the next. The hard limit
+    ends the search mid-iteration; the searcher checks it every
+    check_interval nodes, an interval sized from the measured nodes per
+    second so the clock is read about every POLL_SECONDS.
+    Times are in seconds.
+    """
+
+    def __init__(self, remaining, increment=0.0, moves_to_go=None, overhead=DEFAULT_OVERHEAD, stop_early=True):
+        if remaining < 0 or increment < 0:
+            raise ValueError("Clock times must not be negative")
+        available = max(remaining - overhead, 0.0)
+        moves_left = moves_to_go if moves_to_go else DEFAULT_MOVES_LEFT
+        self.hard_limit = min(available * MAX_FRACTION if moves_left > 1 else available,
+                              (available / moves_left + increment * INCREMENT_SHARE) * HARD_FACTOR)
+        self.soft_limit = min(available / moves_left + increment * INCREMENT_SHARE, self.hard_limit)
+        self.stop_early = stop_early
+        self.check_interval = MIN_CHECK_INTERVAL
+        self.start_time = None
+        self.best_move = None
+        self.scale = 1.0
+
+    def start(self, start_time=None):
+        """
+        The search starts now (or at start_time, a time.perf_counter()
+        reading). Returns the hard deadline on the same clock.
+        """
+        self.start_time = time.perf_counter() if start_time is None else start_time
+        self.best_move = None
+        self.scale = 1.0
+        return self.start_time + self.hard_limit
+
+    def iterationDone(self, result):
+        """
+        Called with the search.SearchResult of every completed iteration.
+        Returns False when the search should stop instead of starting
+        another one.
+        """
+        if result.nps > 0:
+            interval = 1 << max(0, int(result.nps * POLL_SECONDS)).bit_length()
+            self.check_interval = min(max(interval, MIN_CHECK_INTERVAL), MAX_CHECK_INTERVAL)
+        if self.stop_early and self.best_move is not None:
+            if result.best_move == self.best_move:
+                self.scale = max(min(self.scale, 1.0) * STABLE_SCALE, MIN_STABLE_SCALE)
+            else:
+                self.scale = UNSTABLE_SCALE
+        self.best_move = result.best_move
+        return time.perf_counter() - self.start_time < self.soft_limit * self.scale
+
+
+class Clock:
+    """
+    A chess clock for one side: remaining seconds and the increment
+    added after every move.
+    """
+
+    def __init__(self, remaining, increment=0.0):
+        self.remaining = remaining
+        self.increment = increment
+
+    def timeManager(self, moves_to_go=None, overhead=DEFAULT_OVERHEAD, stop_early=True):
+        return TimeManager(max(self.remaining, 0.0), self.increment, moves_to_go, overhead, stop_early)
+
+    def punch(self, elapsed):
+        """
+        Charge a move that took elapsed seconds; returns False if the
+        flag fell.
+        """
+        self.remaining -= elapsed
+        if self.remaining < 0:
+            return False
+        self.remaining += self.increment
+        return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Clock games between an engine that stops early on a stable best move and one that uses "
+                    "its full soft limit: flag rate, time used and score.")
+    parser.add_argument("-n", "--games", type=int, default=20, help="number of games (colour-swapped pairs)")
+    parser.add_argument("-c", "--concurrency", type=int, default=os.cpu_count(),
+                        help="games at once; each game times itself, so more than the core count skews clocks")
+    parser.add_argument("--clock", type=float, default=10.0, help="seconds per side for the game")
+    parser.add_argument("--increment", type=float, default=0.1, help="seconds added per move")
+    parser.add_argument("--overhead", type=float, default=DEFAULT_OVERHEAD, help="seconds kept back per move")
+    parser.add_argument("--opening-plies", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from match import DEFAULT_ADJUDICATION, DEFAULT_ENGINE, eloEstimate, runMatch
+
+    clock = dict(clock=args.clock, increment=args.increment, overhead=args.overhead)
+    engines = [dict(DEFAULT_ENGINE, **clock, early_stop=1, name="A"),
+               dict(DEFAULT_ENGINE, **clock, early_stop=0, name="B")]
+    print(f"A: early stop on a stable best move, B: full soft limit; {args.clock:g}s + {args.increment:g}s per side")
+    wins, draws, losses = runMatch(engines, args.games, args.concurrency, args.opening_plies, DEFAULT_ADJUDICATION,
+                                   seed=args.seed)
+    elo, margin = eloEstimate(wins, draws, losses)
+    print(f"A vs B: +{wins} ={draws} -{losses}  elo {elo:+.1f} +/- {margin:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
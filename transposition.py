@@ -0,0 +1,165 @@
+from array import array
+
+
+BOUND_EXACT = 1
+BOUND_LOWER = 2  # Score is at least this (fail high)
+BOUND_UPPER = 3  # Score is at most this (fail low)
+
+# Each bucket holds two entries of two 64-bit words (key ^ data, data):
+# slot 0 is depth-preferred, slot 1 is always-replace.
+WORDS_PER_BUCKET = 4
+BUCKET_BYTES = WORDS_PER_BUCKET * 8
+
+# Data word layout
+_MOVE_BITS = 14      # moveID, 0 = no move
+_DEPTH_SHIFT = 14    # 7 bits
+_BOUND_SHIFT = 21    # 2 bits
+_AGE_SHIFT = 23      # 8 bits
+_SCORE_SHIFT = 31    # 21 bits, offset so it is never negative
+_SCORE_OFFSET = 1 << 20
+
+MAX_DEPTH = 127
+
+
+def tableBytes(size_mb):
+    """
+    Bytes a table of size_mb actually uses: a power-of-two bucket count,
+    so the bucket index is a mask.
+    """
+    buckets = max(1, (int(size_mb * 1024 * 1024) // BUCKET_BYTES))
+    return (1 << (buckets.bit_length() - 1)) * BUCKET_BYTES
+
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of search results, keyed by GameState.zobrist_key.
+    Stores depth, score, bound type and best moveID per position in a flat
+    array of 64-bit words, so memory stays at the configured cap however
+    many positions are searched.
+
+    With buffer (e.g. a multiprocessing.shared_memory buffer of
+    tableBytes(size_mb) bytes) the entries live in that memory instead,
+    so several processes can share one table. Each entry is stored as
+    key ^ data next to data, so an entry torn by a concurrent write
+    fails the key check and reads as a miss.
+    """
+
+    def __init__(self, size_mb=16, buffer=None):
+        if buffer is None:
+            self.table = array('Q', bytes(tableBytes(size_mb)))
+        else:
+            self.table = memoryview(buffer).cast('Q')
+        self.num_buckets = len(self.table) // WORDS_PER_BUCKET
+        if self.num_buckets & (self.num_buckets - 1):
+            raise ValueError("Table buffer must hold a power-of-two number of buckets")
+        self.mask = self.num_buckets - 1
+        self.age = 0
+        self.resetStats()
+
+    @property
+    def size_mb(self):
+        return self.num_buckets * BUCKET_BYTES / (1024 * 1024)
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self):
+        """
+        Empty the table and reset the statistics.
+        """
+        # Zeroed through a byte view in one copy, not word by word
+        memoryview(self.table).cast('B')[:] = bytes(len(self.table) * self.table.itemsize)
+        self.age = 0
+        self.resetStats()
+
+    def newSearch(self):
+        """
+        Start a new search; entries from older searches become
+        replaceable in the depth-preferred slot.
+        """
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key):
+        """
+        Look up a position. Returns (depth, score, bound, moveID)
+        or None if it isn't stored.
+        """
+        table = self.table
+        index = (key & self.mask) * WORDS_PER_BUCKET
+        for slot in (index, index + 2):
+            data = table[slot + 1]
+            if data and table[slot] ^ data == key:
+                self.hits += 1
+                return ((data >> _DEPTH_SHIFT) & 0x7F,
+                        (data >> _SCORE_SHIFT) - _SCORE_OFFSET,
+                        (data >> _BOUND_SHIFT) & 0x3,
+                        data & 0x3FFF)
+        self.misses += 1
+        if table[index + 1] or table[index + 3]:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, bound, move_id=0):
+        """
+        Store a search result. The depth-preferred slot is only replaced by
+        the same position, an equal or deeper search, or an entry from a
+        previous search; everything else goes to the always-replace slot.
+        """
+        table = self.table
+        index = (key & self.mask) * WORDS_PER_BUCKET
+        depth = min(max(depth, 0), MAX_DEPTH)
+
+        old_data = table[index + 1]
+        if old_data and table[index] ^ old_data == key:
+            if not move_id:
+                move_id = old_data & 0x3FFF  # Keep the old best move
+            slot = index
+        elif (not old_data
+              or depth >= (old_data >> _DEPTH_SHIFT) & 0x7F
+              or (old_data >> _AGE_SHIFT) & 0xFF != self.age):
+            slot = index
+        else:
+            slot = index + 2
+            old_data = table[slot + 1]
+            if old_data and table[slot] ^ old_data == key and not move_id:
+                move_id = old_data & 0x3FFF
+
+        if old_data and table[slot] ^ old_data != key:
+            self.overwrites += 1
+        data = (move_id
+                | depth << _DEPTH_SHIFT
+                | bound << _BOUND_SHIFT
+                | self.age << _AGE_SHIFT
+                | (score + _SCORE_OFFSET) << _SCORE_SHIFT)
+        table[slot] = key ^ data
+        table[slot + 1] = data
+        self.stores += 1
+
+    def usage(self, sample=1000):
+        """
+        Fraction of entries in use, estimated from the first buckets.
+        """
+        buckets = min(sample, self.num_buckets)
+        used = sum(1 for i in range(buckets * WORDS_PER_BUCKET // 2) if self.table[i * 2 + 1])
+        return used / (buckets * 2)
+
+    def stats(self):
+        """
+        Probe and store counters, for sizing the table.
+        """
+        probes = self.hits + self.misses
+        return {
+            "size_mb": self.size_mb,
+            "probes": probes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "usage": self.usage(),
+        }